@@ -0,0 +1,63 @@
+# admin_api.py
+#
+# Operational endpoints for a single worker. Every route requires the
+# ADMIN_TOKEN in X-Admin-Token and is disabled (404) when no token is configured.
+
+from flask import Blueprint, Response, request, jsonify
+from api_utils import admin_denied
+from artifacts import TAXONOMIES, activate, status as artifact_status
+from memory_report import memory_report, stop_tracing
+from profiling import list_profiles, read_profile
+
+admin_bp = Blueprint("admin", __name__)
+
+@admin_bp.before_request
+def require_admin_token():
+    denied = admin_denied()
+    if denied:
+        message, status = denied
+        return jsonify({"error": message}), status
+
+@admin_bp.route("/admin/memory", methods=["GET"])
+def admin_memory():
+    # ?tracemalloc=N adds the top N allocators (starting tracing on first use); ?tracemalloc=stop ends it
+    tracing = request.args.get("tracemalloc", "0")
+    if tracing == "stop":
+        return jsonify(stop_tracing())
+    try:
+        top = max(0, min(int(tracing), 200))
+    except ValueError:
+        return jsonify({"error": "tracemalloc must be a number or 'stop'"}), 400
+    return jsonify(memory_report(top))
+
+@admin_bp.route("/admin/profiles", methods=["GET"])
+def admin_profiles():
+    return jsonify(list_profiles())
+
+@admin_bp.route("/admin/profiles/<profile_id>", methods=["GET"])
+def admin_profile(profile_id):
+    folded = read_profile(profile_id)
+    if folded is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response(folded, mimetype="text/plain",
+                    headers={"Content-Disposition": f"attachment; filename={profile_id}.folded"})
+
+@admin_bp.route("/admin/artifacts", methods=["GET"])
+def admin_artifacts():
+    return jsonify(artifact_status())
+
+@admin_bp.route("/admin/artifacts/<taxonomy>/activate", methods=["POST"])
+def admin_activate_artifacts(taxonomy):
+    # Loads + validates the version here, swaps it in for this worker and moves CURRENT for the others
+    if taxonomy not in TAXONOMIES:
+        return jsonify({"error": f"Unknown taxonomy {taxonomy}"}), 404
+    version = (request.get_json(silent=True) or {}).get("version") or request.args.get("version")
+    if not version:
+        return jsonify({"error": "version is required"}), 400
+    try:
+        bundle = activate(taxonomy, version)
+    except FileNotFoundError as exc:
+        return jsonify({"error": str(exc)}), 404
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 409
+    return jsonify(bundle.summary())
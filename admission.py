@@ -0,0 +1,225 @@
+# ========================================
+# 🚦 Admission Control for Encoding
+# ========================================
+# SBERT encoding is the one step whose cost grows with load: past a few
+# forward passes' worth of texts in flight the CPU thrashes and every request
+# slows down, including cheap ones. Every encode that misses the cache
+# therefore claims one unit per text first, out of ADMISSION_MAX_CONCURRENT
+# passes × ENCODER_MAX_BATCH texts. Counting texts rather than callers keeps
+# bursts of single-query requests together in one micro-batched pass.
+#   - Waiting requests queue by priority (lower first, FIFO within one):
+#     single-taxonomy search routes, then search-all, then untagged callers,
+#     then background work (warm-up). The head of the queue is admitted as
+#     soon as its texts fit; an encode larger than the whole limit runs alone.
+#   - At most ADMISSION_QUEUE_SIZE wait. When the queue is full a newcomer
+#     that outranks the lowest-priority waiter takes its place; otherwise it
+#     is rejected at once. A waiter gives up after ADMISSION_MAX_WAIT_MS, or
+#     when the search Deadline of the stage it encodes for runs out.
+#   - A rejection raises Overloaded, answered with 503 + Retry-After (in
+#     search-all only the affected branch reports it).
+# Routes that never encode (dropdowns, lookups, hierarchy, typeahead) never
+# enter the queue. Keep the requests that can be admitted at once (up to
+# ADMISSION_MAX_CONCURRENT × ENCODER_MAX_BATCH single-text encodes) plus
+# ADMISSION_QUEUE_SIZE below the worker's thread count so they always find a
+# free thread.
+
+import math
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from flask import request, g, jsonify
+from config import ADMISSION_MAX_CONCURRENT, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT_MS, ENCODER_MAX_BATCH
+from deadline import current_deadline
+
+PRIORITIES = {"search": 0, "search_all": 1, "default": 2, "background": 3}
+
+_priority = contextvars.ContextVar("admission_priority", default=PRIORITIES["default"])
+
+class Overloaded(Exception):
+    def __init__(self, reason, retry_after_s):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after_s}s")
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+class _Waiter:
+    __slots__ = ("priority", "cost", "enqueued", "event", "granted", "rejected")
+
+    def __init__(self, priority, cost):
+        self.priority = priority
+        self.cost = cost
+        self.enqueued = time.perf_counter()
+        self.event = threading.Event()
+        self.granted = False
+        self.rejected = None
+
+class AdmissionLimiter:
+    def __init__(self, limit, queue_size, max_wait_ms):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait_ms / 1000
+        self._lock = threading.Lock()
+        self._active = 0  # units (texts) held
+        self._waiters = []  # heap of (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._hold_s = 0.05  # EWMA of hold time, for Retry-After
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "evicted": 0, "timeout": 0, "deadline": 0}
+        self.max_queue_depth = 0
+        self.waits_ms = deque(maxlen=1000)
+
+    def _retry_after(self):
+        queued = sum(w[2].cost for w in self._waiters) + 1
+        return max(1, math.ceil(queued * self._hold_s / max(1, self.limit)))
+
+    def _fits(self, cost):
+        return self._active + cost <= self.limit or self._active == 0
+
+    def _grant(self):
+        """Admit waiters in priority order while the head fits (caller holds _lock)."""
+        while self._waiters and self._fits(self._waiters[0][2].cost):
+            _, _, waiter = heapq.heappop(self._waiters)
+            self._active += waiter.cost
+            waiter.granted = True
+            self.admitted += 1
+            waiter.event.set()
+
+    def acquire(self, priority, cost=1, max_wait=None):
+        """Claim cost units, waiting at most max_wait seconds (capped at the configured wait)."""
+        wait = self.max_wait if max_wait is None else min(self.max_wait, max_wait)
+        with self._lock:
+            if not self._waiters and self._fits(cost):
+                self._active += cost
+                self.admitted += 1
+                self.waits_ms.append(0.0)
+                return
+            if wait <= 0:
+                self.rejected["deadline"] += 1
+                raise Overloaded("deadline", self._retry_after())
+            waiter = _Waiter(priority, cost)
+            if len(self._waiters) >= self.queue_size:
+                worst = max(self._waiters, key=lambda w: (w[0], w[1])) if self._waiters else None
+                if worst is None or worst[0] <= priority:
+                    self.rejected["queue_full"] += 1
+                    raise Overloaded("queue full", self._retry_after())
+                self._waiters.remove(worst)
+                heapq.heapify(self._waiters)
+                worst[2].rejected = "evicted"
+                worst[2].event.set()
+            heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+            self._grant()  # a newcomer at the head may fit where the previous head did not
+
+        waiter.event.wait(wait)
+        with self._lock:
+            if not waiter.granted:
+                if waiter.rejected is None:
+                    waiter.rejected = "timeout" if wait >= self.max_wait else "deadline"
+                    self._waiters = [w for w in self._waiters if w[2] is not waiter]
+                    heapq.heapify(self._waiters)
+                    self._grant()  # the new head may fit where this one did not
+                self.rejected[waiter.rejected] += 1
+                raise Overloaded(waiter.rejected, self._retry_after())
+            self.waits_ms.append((time.perf_counter() - waiter.enqueued) * 1000)
+
+    def release(self, held_s, cost=1):
+        with self._lock:
+            self._hold_s += 0.2 * (held_s - self._hold_s)
+            self._active -= cost
+            self._grant()
+
+    @contextmanager
+    def slot(self, priority, cost=1, max_wait=None):
+        self.acquire(priority, cost, max_wait)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started, cost)
+
+    def snapshot(self):
+        with self._lock:
+            waits = sorted(self.waits_ms)
+            by_priority = {}
+            for priority, _, _ in self._waiters:
+                by_priority[priority] = by_priority.get(priority, 0) + 1
+            return {
+                "limit_texts": self.limit,
+                "active_texts": self._active,
+                "queue_depth": len(self._waiters),
+                "queue_depth_by_priority": {name: by_priority.get(p, 0) for name, p in PRIORITIES.items()},
+                "queue_capacity": self.queue_size,
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "recent_wait_ms": {
+                    "p50": round(waits[len(waits) // 2], 2) if waits else 0.0,
+                    "p95": round(waits[int(len(waits) * 0.95)], 2) if waits else 0.0,
+                    "max": round(waits[-1], 2) if waits else 0.0,
+                },
+                "retry_after_s": self._retry_after(),
+            }
+
+_limiter = AdmissionLimiter(ADMISSION_MAX_CONCURRENT * ENCODER_MAX_BATCH, ADMISSION_QUEUE_SIZE,
+                            ADMISSION_MAX_WAIT_MS)
+
+@contextmanager
+def admit(texts=1):
+    """Hold room for encoding texts at the current priority (no-op when ADMISSION_MAX_CONCURRENT is 0).
+
+    Inside a Deadline stage the wait never outlasts the time the request has left.
+    """
+    if ADMISSION_MAX_CONCURRENT <= 0:
+        yield
+        return
+    deadline = current_deadline()
+    remaining_ms = deadline.remaining_ms() if deadline is not None else float("inf")
+    max_wait = None if remaining_ms == float("inf") else remaining_ms / 1000
+    with _limiter.slot(_priority.get(), max(1, texts), max_wait):
+        yield
+
+@contextmanager
+def priority(name):
+    token = _priority.set(PRIORITIES[name])
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def admission_metrics():
+    return _limiter.snapshot() if ADMISSION_MAX_CONCURRENT > 0 else {"enabled": False}
+
+# ========================================
+# Flask integration
+# ========================================
+def init_admission(bp, priority_name, *view_names):
+    """Run the named views at a priority. Must be called before the blueprint is registered.
+
+    Work the views hand to other threads keeps the priority only when submitted
+    through contextvars.copy_context().run.
+    """
+    endpoints = {f"{bp.name}.{view}" for view in view_names}
+    level = PRIORITIES[priority_name]
+
+    @bp.before_request
+    def _set_priority():
+        if request.endpoint in endpoints:
+            g.admission_priority = _priority.set(level)
+        return None
+
+    @bp.teardown_request
+    def _reset_priority(exc):
+        # Threads are reused across requests: never leave a route's priority behind
+        if g.pop("admission_priority", None) is not None:
+            _priority.set(PRIORITIES["default"])
+
+    return bp
+
+def overloaded_response(exc):
+    response = jsonify({"error": str(exc), "reason": exc.reason, "retry_after_s": exc.retry_after_s})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(exc.retry_after_s)
+    return response
@@ -0,0 +1,71 @@
+# ========================================
+# 🧰 Shared helpers for the API modules
+# ========================================
+import hmac
+from flask import request
+from config import MAX_BATCH_CODES, ADMIN_TOKEN, HYBRID_FUSIONS
+
+def code_validator(lengths, message):
+    """Check shared by a single-code route and its batch route: digits of an allowed length.
+
+    The returned function gives message for a malformed code, else None.
+    """
+    def invalid(code):
+        return message if not code or not code.isdigit() or len(code) not in lengths else None
+    return invalid
+
+def read_batch_codes(validate=None):
+    """Codes from a JSON body {"codes": [...]} or [...], or a comma-separated ?codes= parameter.
+
+    Returns (codes, error) where error is a message when the request is unusable,
+    including any code rejected by validate (see code_validator).
+    """
+    payload = request.get_json(silent=True) or {}
+    if isinstance(payload, list):
+        codes = payload
+    elif isinstance(payload, dict):
+        codes = payload.get("codes")
+    else:
+        return None, "JSON body must be an object with \"codes\" or a list of codes"
+    if codes is None:
+        raw = request.args.get("codes", "")
+        codes = [c for c in raw.split(",") if c.strip()]
+    if not isinstance(codes, list) or not codes:
+        return None, "A non-empty list of codes is required"
+    if len(codes) > MAX_BATCH_CODES:
+        return None, f"At most {MAX_BATCH_CODES} codes per request"
+    codes = [str(c).strip() for c in codes]
+    if validate:
+        invalid = [c for c in codes if validate(c)]
+        if invalid:
+            return None, f"{validate(invalid[0])}: {', '.join(invalid[:20])}"
+    return codes, None
+
+def read_limit(default, maximum):
+    """?limit= clamped to [1, maximum], falling back to default when absent or malformed."""
+    try:
+        limit = int(request.args.get("limit", default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+SEARCH_MODES = ("cascade", "hybrid")
+
+def read_search_mode():
+    """?mode=cascade|hybrid and ?fusion=rrf|weighted. Returns (mode, fusion, error)."""
+    mode = request.args.get("mode", "cascade").strip() or "cascade"
+    fusion = request.args.get("fusion", "").strip() or None
+    if mode not in SEARCH_MODES:
+        return None, None, f"Mode must be one of {', '.join(SEARCH_MODES)}"
+    if fusion is not None and fusion not in HYBRID_FUSIONS:
+        return None, None, f"Fusion must be one of {', '.join(HYBRID_FUSIONS)}"
+    return mode, fusion, None
+
+def admin_denied():
+    """None when the request carries ADMIN_TOKEN (X-Admin-Token header), else (message, status)."""
+    if not ADMIN_TOKEN:
+        return "Not found", 404
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        return "Forbidden", 403
+    return None
@@ -1,24 +1,91 @@
-from flask import Flask
+from flask import Flask, jsonify
+from flask_cors import CORS
+# First, so MEMORY_TRACEMALLOC_FRAMES tracing sees the loads done by the imports below
+from memory_report import log_memory_summary
 from nic_api import nic_bp
 from nco_api import nco_bp
 from npcms_api import npcms_bp
 from hsn_api import hsn_bp
 from npcms_nic_api import npcms_nic_bp
 from npcms_hsn_api import npcms_hsn_bp
+from search_all_api import search_all_bp
+from export_api import export_bp
+from admin_api import admin_bp
+from encoder_service import encoder_metrics
+from deadline import stage_costs
+from profiling import init_profiling
+from admission import Overloaded, init_admission, overloaded_response, admission_metrics
+from http_cache import init_http_cache, on_taxonomy_change, start_taxonomy_version_refresh
+from crosswalk_index import reload_crosswalk
+from hierarchy_index import reload_loaded_hierarchies
+from typeahead import reload_loaded_typeaheads
+from code_index import reload_loaded_code_indexes
+from warmup import start_warmup, warmup_status, is_ready
+from artifacts import start_artifact_watch
 
 app = Flask(__name__)
+CORS(app)
 
-# Register all route blueprints
-app.register_blueprint(nic_bp, url_prefix="/api/nic")
-app.register_blueprint(nco_bp, url_prefix="/api/nco")
-app.register_blueprint(npcms_bp, url_prefix="/api/npcms")
-app.register_blueprint(hsn_bp, url_prefix="/api/hsn")
-app.register_blueprint(npcms_nic_bp, url_prefix="/api/npcms-to-nic")
-app.register_blueprint(npcms_hsn_bp, url_prefix="/api/npcms-hsn")
+# Version-stamped ETag / Cache-Control on reference-data routes (304 on If-None-Match)
+init_http_cache(nic_bp, "get_dropdown", "get_subclass_description", "nic_lookup", "nic_lookup_batch", "nic_typeahead")
+init_http_cache(nco_bp, "nco_dropdown", "nco_lookup", "nco_lookup_batch", "nco_typeahead")
+init_http_cache(npcms_bp, "npcms_dropdown", "npcms_lookup", "npcms_lookup_batch", "npcms_typeahead")
+init_http_cache(hsn_bp, "hsn_dropdown", "hsn_lookup", "hsn_code_lookup", "hsn_code_lookup_batch", "hsn_typeahead")
+init_http_cache(npcms_nic_bp, "npcms_to_nic", "npcms_to_nic_batch", "nic_to_npcms_batch")
+init_http_cache(npcms_hsn_bp, "npcms_to_hsn", "hsn_to_npcms", "npcms_to_hsn_batch", "hsn_to_npcms_batch")
+# Sampling profiler on the search routes (on demand with the admin token, or PROFILE_SAMPLE_RATE)
+init_profiling(nic_bp, "api_nic_search")
+init_profiling(nco_bp, "nco_search")
+init_profiling(npcms_bp, "npcms_search")
+init_profiling(hsn_bp, "hsn_search")
+init_profiling(search_all_bp, "api_search_all")
+# Encode admission priority: single-taxonomy searches before search-all (other routes never encode)
+init_admission(nic_bp, "search", "api_nic_search")
+init_admission(nco_bp, "search", "nco_search")
+init_admission(npcms_bp, "search", "npcms_search")
+init_admission(hsn_bp, "search", "hsn_search")
+init_admission(search_all_bp, "search_all", "api_search_all")
+# In-memory reference indexes follow the same version as the ETags
+on_taxonomy_change(reload_crosswalk)
+on_taxonomy_change(reload_loaded_hierarchies)
+on_taxonomy_change(reload_loaded_typeaheads)
+on_taxonomy_change(reload_loaded_code_indexes)
+start_taxonomy_version_refresh()
+# Follow the CURRENT artifact version of each taxonomy (swapped without dropping requests)
+start_artifact_watch()
+
+# Register all route blueprints (each route declares its full /api/... path)
+app.register_blueprint(nic_bp)
+app.register_blueprint(nco_bp)
+app.register_blueprint(npcms_bp)
+app.register_blueprint(hsn_bp)
+app.register_blueprint(npcms_nic_bp)
+app.register_blueprint(npcms_hsn_bp)
+app.register_blueprint(search_all_bp)
+app.register_blueprint(export_bp)
+app.register_blueprint(admin_bp)
 
 @app.route("/")
 def home():
     return "🟢 IIOPC Flask Backend is Running Successfully!"
 
+@app.route("/ready")
+def ready():
+    # 503 until warm-up has finished so load balancers hold traffic back
+    return jsonify({"ready": is_ready(), "warmup": warmup_status()}), 200 if is_ready() else 503
+
+@app.errorhandler(Overloaded)
+def overloaded(exc):
+    # Encode queue full or waited too long: shed the request instead of piling onto the CPU
+    return overloaded_response(exc)
+
+@app.route("/metrics")
+def metrics():
+    return jsonify({"encoder": encoder_metrics(), "admission": admission_metrics(), "search_stage_ms": stage_costs()})
+
+# One memory line per worker: after warm-up, or right away when warm-up is off
+if start_warmup() is None:
+    log_memory_summary()
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,411 @@
+# ========================================
+# 🗃️ Versioned Search Artifacts
+# ========================================
+# Each taxonomy's description text, embedding matrix and FAISS index form one
+# bundle whose rows are aligned by construction:
+#
+#   ARTIFACT_DIR/<taxonomy>/CURRENT                   ← name of the active version
+#   ARTIFACT_DIR/<taxonomy>/<version>/manifest.json
+#   ARTIFACT_DIR/<taxonomy>/<version>/descriptions.txt, embeddings.npy, faiss.index
+#                                      (or corpus.bin + faiss.index, see packed_corpus.py)
+#
+# manifest.json records the taxonomy, version, encoder model, dimension, row
+# count and the sha256 / size of every file. A bundle is validated completely
+# when it is loaded (checksums with ARTIFACT_VERIFY, rows of every file equal,
+# dimensions equal, model == ENCODER_MODEL) and is never used if that fails.
+# Taxonomies without a bundle directory fall back to the legacy fixed file
+# names (version "legacy"); their row alignment is still checked.
+#
+# A request takes current_bundle(taxonomy) once and uses it for the vector
+# search and the row → code lookup. activate() loads and validates the new
+# version before it swaps the reference, so requests in flight finish on the
+# old bundle. The ARTIFACT_KEEP_VERSIONS most recently used other versions of
+# each taxonomy stay loaded too: during a switch the model server is asked
+# for the previous and next version by workers that have not all moved yet,
+# and must not reload (and re-verify) a bundle per search. A version loads
+# once (concurrent askers wait for that load) and outside the module lock, so
+# searches on loaded versions never stall behind it. Anything older is
+# released when the last request drops it. Workers follow
+# CURRENT every ARTIFACT_POLL_S seconds; POST /admin/artifacts/<taxonomy>/activate
+# switches the receiving worker immediately and moves CURRENT for the rest.
+#
+#   python artifacts.py build hsn 2026-10-19 [--descriptions F --embeddings F --index F] [--pack] [--activate]
+#   python artifacts.py validate hsn 2026-10-19
+#   python artifacts.py activate hsn 2026-10-19
+#   python artifacts.py list
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+from memory_report import measure_load
+from packed_corpus import read_packed, convert as pack_corpus
+from config import ARTIFACT_DIR, ARTIFACT_MMAP, ARTIFACT_VERIFY, ARTIFACT_POLL_S, ARTIFACT_KEEP_VERSIONS, ENCODER_MODEL
+
+TAXONOMIES = ("nic", "nco", "npcms", "hsn")
+INDEX_NAMES = ("nco", "hsn", "npcms")  # NIC has no FAISS index, only the matrix
+
+# Fixed file names used before bundles existed (role → path)
+LEGACY_FILES = {
+    "nic": {"descriptions": "nic_subclass_descriptions.txt", "embeddings": "nic_subclass_embeddings.npy"},
+    "nco": {"descriptions": "nco_2015_descriptions.txt", "embeddings": "nco_2015_embeddings.npy",
+            "index": "nco_faiss.index"},
+    "npcms": {"descriptions": "npcms_product_descriptions.txt", "index": "npcms_product_faiss.index"},
+    "hsn": {"descriptions": "hsn_concat_descriptions.txt", "embeddings": "hsn_embeddings.npy",
+            "index": "hsn_faiss.index"},
+}
+BUNDLE_FILES = {"descriptions": "descriptions.txt", "embeddings": "embeddings.npy", "index": "faiss.index",
+                "corpus": "corpus.bin"}
+LEGACY_VERSION = "legacy"
+
+# ========================================
+# File readers
+# ========================================
+def read_index(path):
+    import faiss
+    if ARTIFACT_MMAP:
+        # IO_FLAG_MMAP_IFC extends mmap to flat (IndexFlatCodes) indexes on newer FAISS
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError:
+            pass  # index type without mmap support: fall back to a heap copy
+    return faiss.read_index(path)
+
+def read_embeddings(path):
+    return np.load(path, mmap_mode="r" if ARTIFACT_MMAP else None)
+
+def read_descriptions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if " ||| " in line]
+
+def sha256_file(path, chunk=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# ========================================
+# Bundle
+# ========================================
+class ArtifactBundle:
+    """One validated version of a taxonomy's descriptions, embeddings and index."""
+
+    def __init__(self, taxonomy, version, files, manifest=None):
+        self.taxonomy = taxonomy
+        self.version = version
+        self.files = files
+        self.manifest = manifest
+        self.loaded_at = time.time()
+        if "corpus" in files:
+            # Packed: codes, descriptions and embeddings are views of one mapping, decoded on access
+            corpus = read_packed(files["corpus"])
+            self.codes, self.descs, self.lines = corpus.codes, corpus.descs, corpus.lines
+            self.embeddings = corpus.embeddings
+        else:
+            self.lines = read_descriptions(files["descriptions"])
+            self.codes = [line.split(" ||| ")[0] for line in self.lines]
+            self.descs = [line.split(" ||| ")[1] for line in self.lines]
+            self.embeddings = read_embeddings(files["embeddings"]) if "embeddings" in files else None
+        self.index = read_index(files["index"]) if "index" in files else None
+        self._norms = None
+
+    @property
+    def rows(self):
+        return len(self.codes)
+
+    @property
+    def dimension(self):
+        if self.index is not None:
+            return self.index.d
+        return self.embeddings.shape[1] if self.embeddings is not None else None
+
+    @property
+    def norms(self):
+        if self._norms is None and self.embeddings is not None:
+            self._norms = np.linalg.norm(self.embeddings, axis=1).astype("float32")
+        return self._norms
+
+    def cosine_scores(self, query_vec):
+        """Cosine similarity of one query vector against every row of the embedding matrix."""
+        q = np.asarray(query_vec, dtype="float32").ravel()
+        return (self.embeddings @ q) / np.maximum(self.norms * np.linalg.norm(q), 1e-12)
+
+    def search(self, query_vectors, k):
+        return self.index.search(query_vectors, k)
+
+    def summary(self):
+        return {"taxonomy": self.taxonomy, "version": self.version, "rows": self.rows,
+                "dimension": self.dimension, "model": (self.manifest or {}).get("model"),
+                "loaded_at": self.loaded_at, "files": self.files}
+
+def validate_bundle(bundle):
+    """Raise ValueError unless every file of the bundle describes the same rows."""
+    problems = []
+    counts = {"rows": bundle.rows}
+    if bundle.embeddings is not None:
+        counts["embeddings"] = bundle.embeddings.shape[0]
+    if bundle.index is not None:
+        counts["index"] = bundle.index.ntotal
+    if len(set(counts.values())) > 1:
+        problems.append(f"row counts differ: {counts}")
+    if bundle.embeddings is not None and bundle.index is not None and bundle.embeddings.shape[1] != bundle.index.d:
+        problems.append(f"dimension differs: embeddings {bundle.embeddings.shape[1]}, index {bundle.index.d}")
+
+    manifest = bundle.manifest
+    if manifest is not None:
+        if manifest.get("taxonomy") != bundle.taxonomy or manifest.get("version") != bundle.version:
+            problems.append(f"manifest is for {manifest.get('taxonomy')}@{manifest.get('version')}")
+        if manifest.get("rows") != bundle.rows:
+            problems.append(f"manifest rows {manifest.get('rows')}, descriptions {bundle.rows}")
+        if manifest.get("dimension") != bundle.dimension:
+            problems.append(f"manifest dimension {manifest.get('dimension')}, files {bundle.dimension}")
+        if manifest.get("model") != ENCODER_MODEL:
+            problems.append(f"built with {manifest.get('model')}, serving {ENCODER_MODEL}")
+        if set(manifest.get("files", {})) != set(bundle.files):
+            problems.append(f"manifest files {sorted(manifest.get('files', {}))}, present {sorted(bundle.files)}")
+        elif ARTIFACT_VERIFY:
+            for role, path in bundle.files.items():
+                if sha256_file(path) != manifest["files"][role]["sha256"]:
+                    problems.append(f"{role} checksum mismatch ({path})")
+    if problems:
+        raise ValueError(f"{bundle.taxonomy}@{bundle.version} is invalid: " + "; ".join(problems))
+    return bundle
+
+# ========================================
+# Locating and loading versions
+# ========================================
+def taxonomy_dir(taxonomy):
+    return os.path.join(ARTIFACT_DIR, taxonomy)
+
+def version_dir(taxonomy, version):
+    return os.path.join(taxonomy_dir(taxonomy), os.path.basename(version))
+
+def list_versions(taxonomy):
+    root = taxonomy_dir(taxonomy)
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in os.listdir(root) if os.path.exists(os.path.join(root, v, "manifest.json")))
+
+def current_version(taxonomy):
+    """Version named by CURRENT, or "legacy" when the taxonomy has no bundles yet."""
+    try:
+        with open(os.path.join(taxonomy_dir(taxonomy), "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip() or LEGACY_VERSION
+    except FileNotFoundError:
+        return LEGACY_VERSION
+
+def load_bundle(taxonomy, version):
+    if taxonomy not in LEGACY_FILES:
+        raise KeyError(f"Unknown taxonomy {taxonomy}")
+    with measure_load(f"artifacts.{taxonomy}@{version}"):
+        if version == LEGACY_VERSION:
+            bundle = ArtifactBundle(taxonomy, version, dict(LEGACY_FILES[taxonomy]))
+        else:
+            directory = version_dir(taxonomy, version)
+            manifest_path = os.path.join(directory, "manifest.json")
+            if not os.path.exists(manifest_path):
+                raise FileNotFoundError(f"No artifact bundle {taxonomy}@{version} in {ARTIFACT_DIR}")
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            files = {role: os.path.join(directory, spec["name"]) for role, spec in manifest.get("files", {}).items()}
+            bundle = ArtifactBundle(taxonomy, version, files, manifest)
+        return validate_bundle(bundle)
+
+_current = {}
+_loaded = weakref.WeakValueDictionary()  # (taxonomy, version) → bundle still referenced somewhere
+_recent = {}  # taxonomy → OrderedDict(version → bundle), strong refs, most recently used last
+_loading = {}  # (taxonomy, version) → Event set when its (single) load has finished
+_lock = threading.Lock()  # guards the dicts above; never held while a bundle loads
+
+def _keep(bundle):
+    """Pin bundle as recently used; caller holds _lock."""
+    recent = _recent.setdefault(bundle.taxonomy, OrderedDict())
+    recent[bundle.version] = bundle
+    recent.move_to_end(bundle.version)
+    while len(recent) > ARTIFACT_KEEP_VERSIONS + 1:  # + the current one
+        recent.popitem(last=False)
+
+def get_bundle(taxonomy, version):
+    """A specific version (e.g. the one a worker's request is on, asked of the model server)."""
+    key = (taxonomy, version)
+    while True:
+        with _lock:
+            bundle = _loaded.get(key)
+            if bundle is not None:
+                _keep(bundle)
+                return bundle
+            loading = _loading.get(key)
+            if loading is None:
+                loading = _loading[key] = threading.Event()
+                break
+        # Another thread is loading this version: wait for it, then look again
+        # (if its load failed, this thread makes its own attempt)
+        loading.wait()
+    try:
+        bundle = load_bundle(taxonomy, version)  # checksums + FAISS load, outside _lock
+        with _lock:
+            _loaded[key] = bundle
+            _keep(bundle)
+        return bundle
+    finally:
+        with _lock:
+            del _loading[key]
+        loading.set()
+
+def current_bundle(taxonomy):
+    bundle = _current.get(taxonomy)
+    if bundle is None:
+        fresh = get_bundle(taxonomy, current_version(taxonomy))
+        with _lock:
+            bundle = _current.setdefault(taxonomy, fresh)
+    return bundle
+
+def loaded_bundles():
+    return list(_loaded.values())
+
+def write_current(taxonomy, version):
+    path = os.path.join(taxonomy_dir(taxonomy), "CURRENT")
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp, path)
+
+def activate(taxonomy, version, persist=True):
+    """Load + validate a version, then make it this worker's current bundle (and CURRENT on disk)."""
+    bundle = get_bundle(taxonomy, version)  # raises before anything is swapped
+    with _lock:
+        previous = _current.get(taxonomy)
+        _current[taxonomy] = bundle
+    if persist and os.path.isdir(taxonomy_dir(taxonomy)):
+        write_current(taxonomy, version)
+    if previous is not bundle:
+        print(f"🗃️ {taxonomy} artifacts: {previous.version if previous else '-'} → {version}")
+    return bundle
+
+def status():
+    return {
+        taxonomy: {
+            "active": _current[taxonomy].summary() if taxonomy in _current else None,
+            "current_on_disk": current_version(taxonomy),
+            "available": list_versions(taxonomy),
+        }
+        for taxonomy in TAXONOMIES
+    }
+
+# ========================================
+# Following CURRENT in a running worker
+# ========================================
+def sync_current():
+    """Switch every loaded taxonomy whose CURRENT file names another version."""
+    for taxonomy, bundle in list(_current.items()):
+        version = current_version(taxonomy)
+        if version != bundle.version:
+            try:
+                activate(taxonomy, version, persist=False)
+            except Exception as exc:
+                print(f"⚠️ Not switching {taxonomy} artifacts to {version}: {exc!r}")
+
+def _poll():
+    sync_current()
+    timer = threading.Timer(ARTIFACT_POLL_S, _poll)
+    timer.daemon = True
+    timer.start()
+
+def start_artifact_watch():
+    if ARTIFACT_POLL_S > 0:
+        timer = threading.Timer(ARTIFACT_POLL_S, _poll)
+        timer.daemon = True
+        timer.start()
+
+# ========================================
+# Building bundles
+# ========================================
+def build_bundle(taxonomy, version, sources=None, model=ENCODER_MODEL, pack=False):
+    """Copy a set of files into ARTIFACT_DIR/<taxonomy>/<version> and write its manifest.
+
+    With pack=True the descriptions and embeddings are converted into one corpus.bin.
+    """
+    sources = sources or LEGACY_FILES[taxonomy]
+    directory = version_dir(taxonomy, version)
+    if os.path.exists(directory):
+        raise FileExistsError(f"{directory} already exists")
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir)
+    try:
+        files = {}
+        if pack:
+            sources = dict(sources)
+            files["corpus"] = os.path.join(tmp_dir, BUNDLE_FILES["corpus"])
+            pack_corpus(sources.pop("descriptions"), sources.pop("embeddings", None), files["corpus"])
+        for role, source in sources.items():
+            target = os.path.join(tmp_dir, BUNDLE_FILES[role])
+            shutil.copyfile(source, target)
+            files[role] = target
+        probe = ArtifactBundle(taxonomy, version, files)
+        manifest = {
+            "taxonomy": taxonomy,
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model": model,
+            "dimension": probe.dimension,
+            "rows": probe.rows,
+            "files": {role: {"name": BUNDLE_FILES[role], "sha256": sha256_file(path),
+                             "bytes": os.path.getsize(path)} for role, path in files.items()},
+        }
+        del probe
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_dir, directory)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    validate_bundle(ArtifactBundle(taxonomy, version,
+                                   {role: os.path.join(directory, BUNDLE_FILES[role]) for role in files}, manifest))
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build, validate and activate versioned search artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("taxonomy", choices=TAXONOMIES)
+    build.add_argument("version", nargs="?", default=time.strftime("%Y%m%dT%H%M%S"))
+    for role in ("descriptions", "embeddings", "index"):
+        build.add_argument(f"--{role}", help=f"source {role} file (default: the legacy file)")
+    build.add_argument("--model", default=ENCODER_MODEL)
+    build.add_argument("--pack", action="store_true", help="store descriptions + embeddings as a packed corpus.bin")
+    build.add_argument("--activate", action="store_true")
+    for name in ("validate", "activate"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("taxonomy", choices=TAXONOMIES)
+        cmd.add_argument("version")
+    sub.add_parser("list")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        sources = {role: getattr(args, role, None) or LEGACY_FILES[args.taxonomy].get(role) for role in BUNDLE_FILES}
+        sources = {role: path for role, path in sources.items() if path}
+        manifest = build_bundle(args.taxonomy, args.version, sources, args.model, args.pack)
+        print(f"✅ Built {args.taxonomy}@{args.version}: {manifest['rows']} rows, dimension {manifest['dimension']}")
+        if args.activate:
+            write_current(args.taxonomy, args.version)
+    elif args.command == "validate":
+        bundle = load_bundle(args.taxonomy, args.version)
+        print(f"✅ {args.taxonomy}@{args.version} is valid ({bundle.rows} rows)")
+    elif args.command == "activate":
+        load_bundle(args.taxonomy, args.version)
+        write_current(args.taxonomy, args.version)
+        print(f"✅ {args.taxonomy} CURRENT → {args.version}")
+    else:
+        for taxonomy in TAXONOMIES:
+            print(f"{taxonomy}: current {current_version(taxonomy)}, available {list_versions(taxonomy)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# ========================================
+# ⚡ Code-Prefix / Exact-Description Fast Path
+# ========================================
+# Users often paste a (partial) code such as "0111" or "8471.30" or an exact
+# official description. Those are answered here from memory before any
+# FULLTEXT or SBERT stage runs:
+#   - numeric input → the leaves whose code starts with it, in code order
+#     (bisect range over the sorted code array). Codes compare by their
+#     digits on both sides, so "7212.0100" is found as 72120100 while each
+#     row keeps its original value.
+#   - exact description (case / punctuation-insensitive) → hash lookup
+# Both answer at most CODE_PREFIX_MAX_ROWS rows (a short prefix, or a
+# description such as HSN "Other", covers thousands) together with the total,
+# so the response can say it was truncated. An optional row predicate (e.g.
+# the NPCMS category) is applied before the cap.
+
+import re
+import threading
+from bisect import bisect_left
+from config import CODE_PREFIX_MIN_LEN, CODE_PREFIX_MAX_ROWS
+from db import connect
+from text_processing import canonical_key
+
+CODE_QUERY_RE = re.compile(r"^[\d.\s]+$")
+
+# Leaf table, code column and description column of each taxonomy
+LEAF_QUERIES = {
+    "nic": ("subclass_code", "subclass_description",
+            "SELECT subclass_code, subclass_description FROM nic_subclass"),
+    "nco": ("nco_2015", "nco_description",
+            "SELECT nco_2015, nco_description, nco_2004 FROM nco_code"),
+    "npcms": ("product_code", "product_description",
+              "SELECT product_code, product_description, unit, is_cpm FROM npcms_product"),
+    "hsn": ("national_code", "national_description",
+            "SELECT national_code, national_description FROM hsn_national"),
+}
+
+description_key = canonical_key
+
+def code_key(code):
+    """Digits of a stored or queried code ("7212.0100" → "72120100")."""
+    return re.sub(r"\D", "", str(code))
+
+def code_query(query):
+    """Digits of a code-like query ("8471.30" → "847130"), or None for free text."""
+    if not CODE_QUERY_RE.match(query):
+        return None
+    digits = code_key(query)
+    return digits if len(digits) >= CODE_PREFIX_MIN_LEN else None
+
+class CodeIndex:
+    def __init__(self, rows, code_col, desc_col):
+        self.rows = sorted(rows, key=lambda r: code_key(r[code_col]))
+        self.codes = [code_key(r[code_col]) for r in self.rows]
+        self.by_description = {}
+        for row in self.rows:
+            self.by_description.setdefault(description_key(row[desc_col] or ""), []).append(row)
+
+    def descendants(self, prefix, where=None, limit=CODE_PREFIX_MAX_ROWS):
+        """(first limit rows under the code prefix that satisfy where, how many there are)."""
+        lo = bisect_left(self.codes, prefix)
+        hi = bisect_left(self.codes, prefix + ":")  # ":" sorts right after "9"
+        return _capped(self.rows[lo:hi], where, limit)
+
+    def get(self, code):
+        code = code_key(code)
+        i = bisect_left(self.codes, code)
+        return self.rows[i] if i < len(self.codes) and self.codes[i] == code else None
+
+    def exact(self, text, where=None, limit=CODE_PREFIX_MAX_ROWS):
+        """(first limit rows with this description that satisfy where, how many there are)."""
+        return _capped(self.by_description.get(description_key(text), []), where, limit)
+
+    def match(self, query, where=None):
+        """("code_prefix" | "exact_description", rows, total) or (None, [], 0) for genuinely free text."""
+        query = query.strip()
+        prefix = code_query(query)
+        if prefix:
+            rows, total = self.descendants(prefix, where)
+            if rows:
+                return "code_prefix", rows, total
+        rows, total = self.exact(query, where)
+        if rows:
+            return "exact_description", rows, total
+        return None, [], 0
+
+def _capped(rows, where, limit):
+    if where is not None:
+        rows = [r for r in rows if where(r)]
+    return rows[:limit], len(rows)
+
+def truncation(rows, total):
+    """Response fields telling whether a fast-path answer was capped."""
+    return {"total": total, "truncated": total > len(rows)}
+
+def build_code_index(taxonomy):
+    code_col, desc_col, sql = LEAF_QUERIES[taxonomy]
+    conn = connect()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql)
+        return CodeIndex(cursor.fetchall(), code_col, desc_col)
+    finally:
+        conn.close()
+
+_lock = threading.Lock()
+_indexes = {}
+
+def get_code_index(taxonomy):
+    index = _indexes.get(taxonomy)
+    if index is None:
+        with _lock:
+            index = _indexes.get(taxonomy)
+            if index is None:
+                index = _indexes[taxonomy] = build_code_index(taxonomy)
+    return index
+
+def reload_loaded_code_indexes():
+    for taxonomy in list(_indexes):
+        fresh = build_code_index(taxonomy)
+        with _lock:
+            _indexes[taxonomy] = fresh
+
+def fast_path(taxonomy, query, where=None):
+    return get_code_index(taxonomy).match(query, where)
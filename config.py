@@ -8,3 +8,119 @@ DB_CONFIG = {
     "database": os.getenv("DB_NAME"),
     "ssl_ca": os.getenv("CA_CERT_PATH", "ca.pem")
 }
+
+# Upper bound on codes accepted by a single batch endpoint call
+MAX_BATCH_CODES = int(os.getenv("MAX_BATCH_CODES", 10000))
+
+# Shared sentence encoder and its micro-batching window
+ENCODER_MODEL = os.getenv("ENCODER_MODEL", "all-mpnet-base-v2")
+ENCODER_BATCH_WINDOW_MS = float(os.getenv("ENCODER_BATCH_WINDOW_MS", 5))
+ENCODER_MAX_BATCH = int(os.getenv("ENCODER_MAX_BATCH", 32))
+ENCODER_CACHE_SIZE = int(os.getenv("ENCODER_CACHE_SIZE", 4096))
+
+# Out-of-process model server (empty = encode and search in this process). The server
+# unpickles what it receives, so the shared key is required: no default to guess
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "").encode()
+if MODEL_SERVER_SOCKET and len(MODEL_SERVER_AUTHKEY) < 16:
+    raise RuntimeError("MODEL_SERVER_SOCKET is set: MODEL_SERVER_AUTHKEY must be a secret of at least 16 characters "
+                       "shared by the model server and its web workers (e.g. python -c 'import secrets; print(secrets.token_hex(16))')")
+MODEL_SERVER_POOL_SIZE = int(os.getenv("MODEL_SERVER_POOL_SIZE", 8))
+
+# Open FAISS indexes and .npy embeddings memory-mapped (shared page cache across workers)
+ARTIFACT_MMAP = os.getenv("ARTIFACT_MMAP", "1") == "1"
+
+# Versioned artifact bundles (see artifacts.py): checksum verification on load, and how
+# often each worker re-reads the CURRENT pointers (0 = only on /admin activation)
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+ARTIFACT_VERIFY = os.getenv("ARTIFACT_VERIFY", "1") == "1"
+ARTIFACT_POLL_S = float(os.getenv("ARTIFACT_POLL_S", 30))
+# Recently used versions kept loaded per taxonomy besides the current one (the model
+# server answers workers still on the previous version, or already on the next)
+ARTIFACT_KEEP_VERSIONS = int(os.getenv("ARTIFACT_KEEP_VERSIONS", 2))
+
+# Coarse-to-fine vector search (see hierarchical_search.py): taxonomies that use it
+# instead of flat FAISS search, and how many groups survive at each level
+VECTOR_HIERARCHICAL = {t.strip() for t in os.getenv("VECTOR_HIERARCHICAL", "").split(",") if t.strip()}
+if VECTOR_HIERARCHICAL - {"hsn", "npcms"}:  # the taxonomies with code levels in hierarchical_search.LEVELS
+    raise RuntimeError(f"VECTOR_HIERARCHICAL may only list hsn and npcms, got {', '.join(sorted(VECTOR_HIERARCHICAL))}")
+HIERARCHICAL_BEAM = int(os.getenv("HIERARCHICAL_BEAM", 8))
+
+# Unified cross-taxonomy search fan-out
+UNIFIED_SEARCH_WORKERS = int(os.getenv("UNIFIED_SEARCH_WORKERS", 16))
+UNIFIED_SEARCH_TIMEOUT_S = float(os.getenv("UNIFIED_SEARCH_TIMEOUT_S", 10))
+
+# Rows fetched per page by the streaming NDJSON exports
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 1000))
+
+# HTTP conditional caching of reference-data responses
+TAXONOMY_VERSION = os.getenv("TAXONOMY_VERSION", "")
+TAXONOMY_VERSION_TTL_S = float(os.getenv("TAXONOMY_VERSION_TTL_S", 300))
+HTTP_CACHE_MAX_AGE_S = int(os.getenv("HTTP_CACHE_MAX_AGE_S", 3600))
+
+# Background warm-up at startup (query logs mined for the most frequent recent queries)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_LOG_FILES = [p for p in os.getenv("WARMUP_LOG_FILES", "npcms_search_log.jsonl,nco_search_logs.jsonl").split(",") if p]
+WARMUP_QUERY_FILE = os.getenv("WARMUP_QUERY_FILE", "")
+WARMUP_LOG_TAIL = int(os.getenv("WARMUP_LOG_TAIL", 50000))
+WARMUP_TOP_QUERIES = int(os.getenv("WARMUP_TOP_QUERIES", 500))
+
+# Typeahead result size and per-keystroke work caps
+TYPEAHEAD_LIMIT = int(os.getenv("TYPEAHEAD_LIMIT", 10))
+TYPEAHEAD_MAX_LIMIT = int(os.getenv("TYPEAHEAD_MAX_LIMIT", 50))
+TYPEAHEAD_MAX_KEYS = int(os.getenv("TYPEAHEAD_MAX_KEYS", 200))
+TYPEAHEAD_MAX_SCAN = int(os.getenv("TYPEAHEAD_MAX_SCAN", 2000))
+
+# Shortest numeric input treated as a code prefix by the search fast path
+CODE_PREFIX_MIN_LEN = int(os.getenv("CODE_PREFIX_MIN_LEN", 2))
+# Most leaves a code-prefix match returns (a 2-digit HSN prefix spans a whole chapter)
+CODE_PREFIX_MAX_ROWS = int(os.getenv("CODE_PREFIX_MAX_ROWS", 50))
+
+# Per-request search latency budget (X-Search-Budget-Ms header / ?budget_ms= override, <=0 = unlimited)
+SEARCH_BUDGET_MS = float(os.getenv("SEARCH_BUDGET_MS", 1500))
+SEARCH_BUDGET_MAX_MS = float(os.getenv("SEARCH_BUDGET_MAX_MS", 10000))
+SEARCH_STAGE_DEFAULT_MS = float(os.getenv("SEARCH_STAGE_DEFAULT_MS", 50))
+# A stage skipped on its cost estimate still runs once per this many seconds to refresh it
+SEARCH_STAGE_PROBE_S = float(os.getenv("SEARCH_STAGE_PROBE_S", 10))
+
+# Pooled MySQL connections for concurrent work within one request
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 16))
+
+# Run the NPCMS general-item cascade's database stages speculatively in parallel (each
+# holds a pooled connection; the encoding FAISS stage is never speculative)
+NPCMS_PARALLEL_STAGES = os.getenv("NPCMS_PARALLEL_STAGES", "0") == "1"
+NPCMS_STAGE_WORKERS = int(os.getenv("NPCMS_STAGE_WORKERS", 16))
+
+# Typo-tolerant CPM synonym lookup: most character edits forgiven in long names (0 = exact only)
+CPM_FUZZY_MAX_EDITS = int(os.getenv("CPM_FUZZY_MAX_EDITS", 2))
+
+# Hybrid lexical + vector retrieval (?mode=hybrid on the search routes)
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 50))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", 0.5))
+HYBRID_FUSIONS = ("rrf", "weighted")
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")
+
+# Where reads are served from: "mysql" (DB_CONFIG) or "sqlite" (local read-only snapshot,
+# written by `python sqlite_snapshot.py`)
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+SQLITE_SNAPSHOT = os.getenv("SQLITE_SNAPSHOT", "taxonomy_snapshot.sqlite")
+
+# Admission control for cache-missing encodes: forward passes in flight (0 = off; each
+# pass is up to ENCODER_MAX_BATCH texts), waiting requests beyond those, and how long
+# one may wait before a 503 (never past the request's search deadline)
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", 4))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 16))
+ADMISSION_MAX_WAIT_MS = float(os.getenv("ADMISSION_MAX_WAIT_MS", 2000))
+
+# Admin endpoints (/admin/...) require this token in X-Admin-Token; unset = admin routes disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Start tracemalloc at import with this many frames per trace (0 = only when requested on /admin/memory)
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", 0))
+
+# Per-request sampling profiler (X-Profile: 1 + admin token, or a random PROFILE_SAMPLE_RATE share)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 200))
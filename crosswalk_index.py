@@ -0,0 +1,120 @@
+# ========================================
+# NPCMS ↔ NIC / NPCMS ↔ HSN Crosswalk Index
+# ========================================
+# The mapping tables are small reference data, so they are materialized once
+# per process into forward and reverse dictionaries. Every posting list is
+# already sorted the way the old per-request JOINs ordered it. Codes are
+# keyed as str (integer-typed DB columns included) and looked up with str(),
+# matching the codes api_utils.read_batch_codes hands out.
+
+import threading
+from db import connect
+
+_lock = threading.Lock()
+_crosswalk = None
+
+class Crosswalk:
+    def __init__(self):
+        self.npcms_to_hsn = {}      # product_code -> [{national_code, national_description, confidence}]
+        self.hsn_to_npcms = {}      # national_code -> [{product_code, product_description, confidence}]
+        self.product_subclass = {}  # product_code -> npcms subclass_code
+        self.npcms_to_nic = {}      # npcms subclass_code -> [NIC hierarchy rows]
+        self.nic_to_npcms = {}      # NIC subclass_code -> [npcms subclass_code]
+
+    def load(self, cursor):
+        # 🔁 NPCMS ↔ HSN (both directions from one scan)
+        cursor.execute("""
+            SELECT h.product_code, h.national_code, h.confidence,
+                   n.national_code AS linked_national, n.national_description,
+                   p.product_code AS linked_product, p.product_description
+            FROM npcms_hsn h
+            LEFT JOIN hsn_national n ON h.national_code = n.national_code
+            LEFT JOIN npcms_product p ON h.product_code = p.product_code
+        """)
+        for row in cursor.fetchall():
+            product_code, national_code = str(row["product_code"]), str(row["national_code"])
+            # A side is listed when its row exists (as the old INNER JOINs did), even with a NULL description
+            if row["linked_national"] is not None:
+                self.npcms_to_hsn.setdefault(product_code, []).append({
+                    "national_code": row["national_code"],
+                    "national_description": row["national_description"] or "",
+                    "confidence": row["confidence"]
+                })
+            if row["linked_product"] is not None:
+                self.hsn_to_npcms.setdefault(national_code, []).append({
+                    "product_code": row["product_code"],
+                    "product_description": row["product_description"] or "",
+                    "confidence": row["confidence"]
+                })
+        for postings in (self.npcms_to_hsn, self.hsn_to_npcms):
+            for matches in postings.values():
+                # NULL confidences last, as MySQL's ORDER BY ... DESC did
+                matches.sort(key=lambda m: (m["confidence"] is not None, m["confidence"] or 0), reverse=True)
+
+        # 🔁 NPCMS ↔ NIC (via NPCMS subclass → NIC class)
+        cursor.execute("SELECT product_code, subclass_code FROM npcms_product")
+        self.product_subclass = {str(row["product_code"]): str(row["subclass_code"]) for row in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT map.npcms_subclass_code,
+                   s.section_code, s.section_name, d.division_code, d.division_name,
+                   g.group_code, g.group_name, c.class_code, c.class_name,
+                   sc.subclass_code, sc.subclass_description
+            FROM nic_npcms_asi map
+            JOIN nic_subclass sc ON map.nic_class_code = sc.class_code
+            JOIN nic_class c ON sc.class_code = c.class_code
+            JOIN nic_group g ON c.group_code = g.group_code
+            JOIN nic_division d ON g.division_code = d.division_code
+            JOIN nic_section s ON d.section_code = s.section_code
+        """)
+        for row in cursor.fetchall():
+            npcms_subclass = str(row.pop("npcms_subclass_code"))
+            self.npcms_to_nic.setdefault(npcms_subclass, []).append(row)
+            targets = self.nic_to_npcms.setdefault(str(row["subclass_code"]), [])
+            if npcms_subclass not in targets:
+                targets.append(npcms_subclass)
+        for targets in self.nic_to_npcms.values():
+            targets.sort()
+        return self
+
+    # ---------- lookups ----------
+    def hsn_for_product(self, product_code):
+        return self.npcms_to_hsn.get(str(product_code), [])
+
+    def npcms_for_national(self, national_code):
+        return self.hsn_to_npcms.get(str(national_code), [])
+
+    def nic_for_product(self, product_code):
+        """(subclass_code, nic_rows) or None when the product is unknown."""
+        subclass = self.product_subclass.get(str(product_code))
+        if subclass is None:
+            return None
+        return subclass, self.npcms_to_nic.get(subclass, [])
+
+    def npcms_for_nic(self, nic_subclass_code):
+        return self.nic_to_npcms.get(str(nic_subclass_code), [])
+
+# ========================================
+# Process-wide instance (loaded lazily, swapped atomically on reload)
+# ========================================
+def build_crosswalk():
+    conn = connect()
+    try:
+        return Crosswalk().load(conn.cursor(dictionary=True))
+    finally:
+        conn.close()
+
+def get_crosswalk():
+    global _crosswalk
+    if _crosswalk is None:
+        with _lock:
+            if _crosswalk is None:
+                _crosswalk = build_crosswalk()
+    return _crosswalk
+
+def reload_crosswalk():
+    global _crosswalk
+    fresh = build_crosswalk()
+    with _lock:
+        _crosswalk = fresh
+    return fresh
@@ -0,0 +1,77 @@
+# ========================================
+# 🔌 Shared Database Connection Helpers
+# ========================================
+import queue
+import threading
+from contextlib import contextmanager
+from config import DB_CONFIG, DB_POOL_SIZE, DB_BACKEND, SQLITE_SNAPSHOT
+
+def connect_mysql():
+    import mysql.connector  # not needed at all with the sqlite backend
+    return mysql.connector.connect(
+        host=DB_CONFIG["host"],
+        port=DB_CONFIG["port"],
+        user=DB_CONFIG["user"],
+        password=DB_CONFIG["password"],
+        database=DB_CONFIG["database"],
+        ssl_ca=DB_CONFIG["ssl_ca"]
+    )
+
+def connect():
+    """Connection for the configured DB_BACKEND: remote MySQL or the local read-only snapshot."""
+    if DB_BACKEND == "sqlite":
+        from sqlite_snapshot import connect_sqlite
+        return connect_sqlite(SQLITE_SNAPSHOT)
+    return connect_mysql()
+
+# ========================================
+# 🏊 Connection Pool
+# ========================================
+# Search-time queries take a connection from here for the duration of one
+# query or stage, so concurrent requests (and search-all branches that outlive
+# their timeout) never interleave result sets on a shared connection; it also
+# serves work that needs several at once (speculative cascade stages). Checkout blocks while DB_POOL_SIZE connections are in use; idle
+# connections are reused LIFO and reconnected if the server dropped them.
+
+class ConnectionPool:
+    def __init__(self, size, connect=connect):
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _checkout(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        if not conn.is_connected():
+            conn.reconnect()
+        return conn
+
+    @contextmanager
+    def cursor(self, dictionary=True):
+        with self._slots:
+            conn = self._checkout()
+            try:
+                cur = conn.cursor(dictionary=dictionary)
+                yield cur
+                cur.close()
+                # End the read transaction (autocommit is off): a reused connection
+                # must not keep reading its first REPEATABLE READ snapshot
+                conn.rollback()
+            except BaseException:
+                # State unknown after a failure: don't hand it to the next caller
+                conn.close()
+                raise
+            self._idle.put(conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_POOL_SIZE)
+    return _pool
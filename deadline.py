@@ -0,0 +1,122 @@
+# ========================================
+# ⏱️ Search Latency Budgets
+# ========================================
+# Every search gets a Deadline (X-Search-Budget-Ms header or ?budget_ms=,
+# else SEARCH_BUDGET_MS). Before an optional cascade stage runs, the
+# pipeline asks deadline.allows(stage); the answer compares the time left
+# with a running estimate of what that stage usually costs (EWMA of its
+# observed durations). Skipped or cheapened stages mark the response as
+# degraded so clients can tell a partial answer from a full one.
+#
+# Only stages that run update their estimate, so one slow outlier (a cold
+# model load, a DB stall) could otherwise keep a stage skipped for good.
+# Once per SEARCH_STAGE_PROBE_S, a request that would skip a stage on its
+# estimate runs it anyway as a probe, letting the estimate recover.
+
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from flask import request
+from config import SEARCH_BUDGET_MS, SEARCH_BUDGET_MAX_MS, SEARCH_STAGE_DEFAULT_MS, SEARCH_STAGE_PROBE_S
+
+_costs = {}
+_last_probe = {}
+_running = contextvars.ContextVar("search_deadline", default=None)  # Deadline of the stage running now
+_costs_lock = threading.Lock()
+EWMA_ALPHA = 0.2
+
+def stage_cost_ms(stage):
+    return _costs.get(stage, SEARCH_STAGE_DEFAULT_MS)
+
+def record_stage_cost(stage, ms):
+    with _costs_lock:
+        previous = _costs.get(stage)
+        _costs[stage] = ms if previous is None else (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * ms
+
+def claim_probe(stage):
+    """True for at most one caller per stage every SEARCH_STAGE_PROBE_S."""
+    now = time.monotonic()
+    with _costs_lock:
+        if now - _last_probe.get(stage, float("-inf")) < SEARCH_STAGE_PROBE_S:
+            return False
+        _last_probe[stage] = now
+        return True
+
+def current_deadline():
+    """Deadline whose stage is running in this context (e.g. for the admission queue), or None."""
+    return _running.get()
+
+def stage_costs():
+    with _costs_lock:
+        return {stage: round(ms, 2) for stage, ms in sorted(_costs.items())}
+
+class Deadline:
+    def __init__(self, budget_ms=None):
+        self.budget_ms = budget_ms
+        self.started = time.perf_counter()
+        self.skipped = []
+        self.cheapened = []
+        # Time charged to the budget on top of the clock: stages run concurrently
+        # are charged as if they had run one after another (see npcms run_stages_parallel)
+        self.charged_ms = 0.0
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def remaining_ms(self):
+        if self.budget_ms is None:
+            return float("inf")
+        return self.budget_ms - self.elapsed_ms() - self.charged_ms
+
+    def fits(self, stage):
+        """True if the stage's usual cost fits; unlike allows(), records nothing and claims no probe."""
+        return self.remaining_ms() >= stage_cost_ms(stage)
+
+    def allows(self, stage):
+        """True if the stage's usual cost still fits (or it is due a probe); otherwise records it as skipped."""
+        remaining = self.remaining_ms()
+        if remaining >= stage_cost_ms(stage) or (remaining > 0 and claim_probe(stage)):
+            return True
+        self.skipped.append(stage)
+        return False
+
+    def cheapen(self, stage, headroom=2.0):
+        """True when the stage fits but without headroom, so a cheaper variant should run."""
+        if self.remaining_ms() >= headroom * stage_cost_ms(stage):
+            return False
+        self.cheapened.append(stage)
+        return True
+
+    @contextmanager
+    def stage(self, stage):
+        started = time.perf_counter()
+        token = _running.set(self)
+        try:
+            yield
+        finally:
+            _running.reset(token)
+            record_stage_cost(stage, (time.perf_counter() - started) * 1000)
+
+    @property
+    def degraded(self):
+        return bool(self.skipped or self.cheapened)
+
+    def report(self):
+        return {
+            "degraded": self.degraded,
+            "skipped_stages": self.skipped,
+            "cheapened_stages": self.cheapened,
+            "budget_ms": self.budget_ms,
+            "elapsed_ms": round(self.elapsed_ms(), 2)
+        }
+
+def deadline_from_request():
+    raw = request.headers.get("X-Search-Budget-Ms") or request.args.get("budget_ms")
+    try:
+        budget = float(raw) if raw else SEARCH_BUDGET_MS
+    except ValueError:
+        budget = SEARCH_BUDGET_MS
+    if budget <= 0:
+        return Deadline(None)  # explicit opt-out: run the full cascade
+    return Deadline(min(budget, SEARCH_BUDGET_MAX_MS))
@@ -0,0 +1,257 @@
+# ========================================
+# 🧠 Shared Encoder Service (dynamic micro-batching)
+# ========================================
+# One SentenceTransformer per process, shared by the NIC/NCO/NPCMS/HSN
+# pipelines. Concurrent encode calls are queued for at most
+# ENCODER_BATCH_WINDOW_MS (or until ENCODER_MAX_BATCH texts are waiting) and
+# then encoded in a single batched forward pass on a background thread.
+# With MODEL_SERVER_SOCKET set, encoding is delegated to model_server instead.
+# Recent texts are kept in a small LRU cache; a text already being encoded
+# by another thread is waited for rather than encoded twice.
+
+import threading
+import time
+import queue
+from collections import deque, OrderedDict
+import numpy as np
+from memory_report import measure_load
+from config import ENCODER_MODEL, ENCODER_BATCH_WINDOW_MS, ENCODER_MAX_BATCH, ENCODER_CACHE_SIZE, MODEL_SERVER_SOCKET
+from text_processing import collapse_whitespace
+from admission import admit
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                # Imported here so model-server clients never pull in torch
+                from sentence_transformers import SentenceTransformer
+                with measure_load("encoder.model"):
+                    _model = SentenceTransformer(ENCODER_MODEL)
+    return _model
+
+# ========================================
+# Metrics
+# ========================================
+class EncoderMetrics:
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.max_batch_size = 0
+        self.batch_sizes = deque(maxlen=window)
+        self.queue_delays_ms = deque(maxlen=window)
+        self.encode_ms = deque(maxlen=window)
+
+    def record(self, size, delays_ms, encode_ms):
+        with self._lock:
+            self.batches += 1
+            self.texts += size
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.batch_sizes.append(size)
+            self.queue_delays_ms.extend(delays_ms)
+            self.encode_ms.append(encode_ms)
+
+    def snapshot(self):
+        with self._lock:
+            sizes = list(self.batch_sizes)
+            delays = list(self.queue_delays_ms)
+            encodes = list(self.encode_ms)
+            snap = {
+                "batches": self.batches,
+                "texts": self.texts,
+                "max_batch_size": self.max_batch_size,
+            }
+        snap["recent_mean_batch_size"] = round(float(np.mean(sizes)), 2) if sizes else 0.0
+        snap["recent_queue_delay_ms"] = _percentiles(delays)
+        snap["recent_encode_ms"] = _percentiles(encodes)
+        return snap
+
+def _percentiles(values):
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    p50, p95 = np.percentile(values, [50, 95])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "max": round(float(max(values)), 3)}
+
+# ========================================
+# Micro-batcher
+# ========================================
+class _Pending:
+    __slots__ = ("text", "enqueued", "done", "vector", "error")
+
+    def __init__(self, text):
+        self.text = text
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.vector = None
+        self.error = None
+
+class MicroBatchEncoder:
+    def __init__(self, window_ms, max_batch):
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.metrics = EncoderMetrics()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="encoder-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = first.enqueued + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        started = time.perf_counter()
+        try:
+            vectors = get_model().encode([p.text for p in batch], batch_size=len(batch), convert_to_numpy=True)
+        except Exception as exc:
+            for p in batch:
+                p.error = exc
+                p.done.set()
+            return
+        finished = time.perf_counter()
+        for p, vec in zip(batch, vectors):
+            p.vector = vec.astype("float32", copy=False)
+            p.done.set()
+        self.metrics.record(
+            len(batch),
+            [(started - p.enqueued) * 1000 for p in batch],
+            (finished - started) * 1000
+        )
+
+    def submit(self, texts):
+        self._ensure_worker()
+        pending = [_Pending(t) for t in texts]
+        for p in pending:
+            self._queue.put(p)
+        return pending
+
+    def encode_many(self, texts):
+        pending = self.submit(texts)
+        for p in pending:
+            p.done.wait()
+            if p.error is not None:
+                raise p.error
+        return np.stack([p.vector for p in pending]) if pending else np.zeros((0, 0), dtype="float32")
+
+_batcher = MicroBatchEncoder(ENCODER_BATCH_WINDOW_MS, ENCODER_MAX_BATCH)
+
+# ========================================
+# Encoding cache (LRU + single-flight)
+# ========================================
+class EncodingCache:
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def encode_many(self, texts, encode_fn):
+        texts = list(texts)
+        found, mine, waits = {}, [], {}
+        with self._lock:
+            for text in dict.fromkeys(texts):
+                if text in self._entries:
+                    self._entries.move_to_end(text)
+                    found[text] = self._entries[text]
+                    self.hits += 1
+                elif text in self._inflight:
+                    waits[text] = self._inflight[text]
+                    self.hits += 1
+                else:
+                    self._inflight[text] = threading.Event()
+                    mine.append(text)
+                    self.misses += 1
+
+        if mine:
+            try:
+                vectors = encode_fn(mine)
+                with self._lock:
+                    for text, vec in zip(mine, vectors):
+                        found[text] = self._entries[text] = vec
+                    while len(self._entries) > self.size:
+                        self._entries.popitem(last=False)
+            finally:
+                with self._lock:
+                    for text in mine:
+                        self._inflight.pop(text).set()
+
+        for text, event in waits.items():
+            event.wait()
+            with self._lock:
+                vec = self._entries.get(text)
+            # The other encoder failed or the entry was already evicted
+            found[text] = vec if vec is not None else encode_fn([text])[0]
+
+        return np.stack([found[t] for t in texts]) if texts else np.zeros((0, 0), dtype="float32")
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "capacity": self.size, "hits": self.hits, "misses": self.misses}
+
+_cache = EncodingCache(ENCODER_CACHE_SIZE)
+
+# ========================================
+# Public API used by the pipelines
+# ========================================
+def encode_many_local(texts):
+    texts = list(texts)
+    if ENCODER_BATCH_WINDOW_MS <= 0:
+        started = time.perf_counter()
+        vectors = get_model().encode(texts, convert_to_numpy=True).astype("float32", copy=False)
+        _batcher.metrics.record(len(texts), [0.0] * len(texts), (time.perf_counter() - started) * 1000)
+        return vectors
+    return _batcher.encode_many(texts)
+
+def _encode_uncached(texts):
+    # Cache hits never queue; admission is by texts, so concurrent callers still share a pass
+    with admit(len(texts)):
+        if MODEL_SERVER_SOCKET:
+            from model_server import get_client
+            return get_client().encode(texts)
+        return encode_many_local(texts)
+
+def encode_many(texts):
+    """float32 matrix with one row per text."""
+    texts = [collapse_whitespace(t) for t in texts]
+    if ENCODER_CACHE_SIZE <= 0:
+        return _encode_uncached(texts)
+    return _cache.encode_many(texts, _encode_uncached)
+
+def encode(text):
+    """float32 vector for a single text."""
+    return encode_many([text])[0]
+
+def encoder_metrics():
+    if MODEL_SERVER_SOCKET:
+        return {"model_server": MODEL_SERVER_SOCKET, "cache": _cache.stats()}
+    return {
+        "model": ENCODER_MODEL,
+        "cache": _cache.stats(),
+        "batch_window_ms": ENCODER_BATCH_WINDOW_MS,
+        "max_batch": ENCODER_MAX_BATCH,
+        "queue_depth": _batcher._queue.qsize(),
+        **_batcher.metrics.snapshot()
+    }
@@ -0,0 +1,130 @@
+# export_api.py
+#
+# Streaming NDJSON bulk export of the taxonomies, their flattened hierarchies
+# and the crosswalk tables. Rows are read through an unbuffered (server-side)
+# cursor in EXPORT_CHUNK_ROWS pages and written out as they arrive, so memory
+# stays flat however large the export is. Add ?gzip=1 (or send
+# Accept-Encoding: gzip) for a gzip-compressed stream.
+
+import json
+import zlib
+from flask import Blueprint, Response, request, jsonify
+from config import EXPORT_CHUNK_ROWS
+from db import connect
+from hierarchy_index import HIERARCHY_QUERIES
+
+export_bp = Blueprint("export", __name__)
+
+# Every level of each taxonomy, parent code included so the tree can be rebuilt
+EXPORT_LEVELS = {
+    "nic": [
+        ("section", "SELECT section_code AS code, section_name AS name, NULL AS parent FROM nic_section"),
+        ("division", "SELECT division_code AS code, division_name AS name, section_code AS parent FROM nic_division"),
+        ("group", "SELECT group_code AS code, group_name AS name, division_code AS parent FROM nic_group"),
+        ("class", "SELECT class_code AS code, class_name AS name, group_code AS parent FROM nic_class"),
+        ("subclass", "SELECT subclass_code AS code, subclass_description AS name, class_code AS parent FROM nic_subclass"),
+    ],
+    "nco": [
+        ("division", "SELECT DISTINCT division_code AS code, division_name AS name, NULL AS parent FROM nco_division"),
+        ("subdivision", "SELECT DISTINCT subdivision_code AS code, subdivision_name AS name, division_code AS parent FROM nco_subdivision"),
+        ("group", "SELECT DISTINCT group_code AS code, group_name AS name, subdivision_code AS parent FROM nco_group"),
+        ("family", "SELECT DISTINCT family_code AS code, family_name AS name, group_code AS parent FROM nco_family"),
+        ("nco", "SELECT nco_2015 AS code, nco_description AS name, family_code AS parent FROM nco_code"),
+    ],
+    "npcms": [
+        ("section", "SELECT section_code AS code, section_description AS name, NULL AS parent FROM npcms_section"),
+        ("division", "SELECT division_code AS code, division_description AS name, section_code AS parent FROM npcms_division"),
+        ("group", "SELECT group_code AS code, group_description AS name, division_code AS parent FROM npcms_group"),
+        ("class", "SELECT class_code AS code, class_description AS name, group_code AS parent FROM npcms_class"),
+        ("subclass", "SELECT subclass_code AS code, subclass_description AS name, class_code AS parent FROM npcms_subclass"),
+        ("product", "SELECT product_code AS code, product_description AS name, subclass_code AS parent FROM npcms_product"),
+    ],
+    "hsn": [
+        ("section", "SELECT section_code AS code, section_description AS name, NULL AS parent FROM hsn_section"),
+        ("chapter", "SELECT chapter_code AS code, chapter_description AS name, section_code AS parent FROM hsn_chapter"),
+        ("heading", "SELECT heading_code AS code, heading_description AS name, chapter_code AS parent FROM hsn_heading"),
+        ("subheading", "SELECT subheading_code AS code, subheading_description AS name, heading_code AS parent FROM hsn_subheading"),
+        ("national", "SELECT national_code AS code, national_description AS name, subheading_code AS parent FROM hsn_national"),
+    ],
+}
+
+EXPORT_CROSSWALKS = {
+    "npcms-hsn": "SELECT product_code, national_code, confidence FROM npcms_hsn",
+    "nic-npcms": "SELECT npcms_subclass_code, nic_class_code FROM nic_npcms_asi",
+}
+
+# ========================================
+# Streaming helpers
+# ========================================
+def stream_rows(queries):
+    """NDJSON lines for each (extra_fields, sql) pair, read page by page."""
+    conn = connect()
+    try:
+        for extra, sql in queries:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                yield "".join(json.dumps({**extra, **row}, ensure_ascii=False, default=str) + "\n" for row in rows)
+            cursor.close()
+    finally:
+        # Client may disconnect mid-stream, leaving an unread result behind
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def accepts_gzip():
+    """True when Accept-Encoding names gzip with a non-zero q ("gzip;q=0" refuses it)."""
+    return any(value.lower() in ("gzip", "x-gzip") and quality > 0 for value, quality in request.accept_encodings)
+
+def ndjson_response(queries, filename):
+    use_gzip = request.args.get("gzip") == "1" or accepts_gzip()
+    headers = {"Content-Disposition": f"attachment; filename={filename}.ndjson" + (".gz" if use_gzip else ""),
+               # Either body may be stored by a shared cache: key it on the header that chose it
+               "Vary": "Accept-Encoding"}
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(gzip_chunks(stream_rows(queries)), mimetype="application/x-ndjson", headers=headers)
+    return Response(stream_rows(queries), mimetype="application/x-ndjson", headers=headers)
+
+# ========================================
+# Routes
+# ========================================
+@export_bp.route("/api/export/<taxonomy>", methods=["GET"])
+def export_taxonomy(taxonomy):
+    levels = EXPORT_LEVELS.get(taxonomy)
+    if not levels:
+        return jsonify({"error": "Invalid taxonomy"}), 400
+
+    level = request.args.get("level")
+    if level:
+        levels = [(name, sql) for name, sql in levels if name == level]
+        if not levels:
+            return jsonify({"error": "Invalid level"}), 400
+
+    return ndjson_response([({"level": name}, sql) for name, sql in levels], f"{taxonomy}-{level or 'all'}")
+
+@export_bp.route("/api/export/<taxonomy>/hierarchy", methods=["GET"])
+def export_hierarchy(taxonomy):
+    if taxonomy not in HIERARCHY_QUERIES:
+        return jsonify({"error": "Invalid taxonomy"}), 400
+    _, sql = HIERARCHY_QUERIES[taxonomy]
+    return ndjson_response([({}, sql)], f"{taxonomy}-hierarchy")
+
+@export_bp.route("/api/export/crosswalk/<name>", methods=["GET"])
+def export_crosswalk(name):
+    sql = EXPORT_CROSSWALKS.get(name)
+    if not sql:
+        return jsonify({"error": "Invalid crosswalk"}), 400
+    return ndjson_response([({}, sql)], f"crosswalk-{name}")
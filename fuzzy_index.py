@@ -0,0 +1,147 @@
+# ========================================
+# 🔡 Typo-tolerant Phrase Index (symmetric delete)
+# ========================================
+# Exact-key dictionaries such as the CPM synonyms miss on a single typo
+# ("paracetmol") or a different word order ("acid acetylsalicylic"). Here
+# every key is reduced to its sorted word tokens (text_processing.bag_key),
+# and every distinct word of those keys is indexed by all variants of its
+# first PREFIX_LEN characters with up to its edit budget deleted (SymSpell).
+# A lookup corrects each query word the same way (a few dict probes plus a
+# bounded Damerau-Levenshtein check per candidate), then keeps the keys made
+# of exactly one correction per query word. Indexing words rather than the
+# sorted phrase means a typo that reorders the words ("acetylsalicylic acdi")
+# is still found.
+#
+# Only unknown words are corrected: a word that occurs in some key, or in
+# known_words (e.g. the vocabulary of the product descriptions), is taken as
+# spelled, so "sodium sulfite" is never rewritten to "sodium sulfide".
+# Budgets grow with length: per word 0 below 4 characters, 1 below 8, then
+# max_edits; per phrase 0 below 5 characters, 1 below 10, then max_edits.
+
+from itertools import permutations
+from collections import defaultdict
+from text_processing import bag_key
+
+PREFIX_LEN = 7
+
+def delete_variants(word, max_deletes):
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_deletes):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - variants
+        variants |= frontier
+    return variants
+
+def edit_distance(a, b, limit):
+    """Optimal-string-alignment distance, or limit + 1 once it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev_prev, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], prev_prev[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        prev_prev, prev = prev, row
+    return prev[-1]
+
+def _assignment_cost(corrections, words):
+    """Least total edits pairing each query word with one key word, or None."""
+    best = None
+    orders = permutations(words) if len(words) <= 6 else [words]
+    for order in orders:
+        total = 0
+        for fixes, word in zip(corrections, order):
+            if word not in fixes:
+                break
+            total += fixes[word]
+        else:
+            best = total if best is None else min(best, total)
+    return best
+
+class FuzzyIndex:
+    """Maps phrases to lists of values; lookups tolerate typos and ignore word order."""
+
+    def __init__(self, entries, max_edits=2, known_words=()):
+        self.max_edits = max_edits
+        self.known_words = frozenset(known_words)
+        self.values = {}
+        for text, values in entries.items():
+            key = bag_key(text)
+            if key:
+                self.values[key] = list(dict.fromkeys(self.values.get(key, []) + list(values)))
+        word_keys = defaultdict(set)
+        for key in self.values:
+            for word in key.split():
+                word_keys[word].add(key)
+        self.word_keys = {word: tuple(keys) for word, keys in word_keys.items()}
+        deletes = defaultdict(set)
+        for word in self.word_keys:
+            for variant in delete_variants(word[:PREFIX_LEN], self.word_edits(len(word))):
+                deletes[variant].add(word)
+        self.deletes = {variant: tuple(words) for variant, words in deletes.items()}
+
+    def allowed_edits(self, length):
+        return 0 if length < 5 else min(1, self.max_edits) if length < 10 else self.max_edits
+
+    def word_edits(self, length):
+        return 0 if length < 4 else min(1, self.max_edits) if length < 8 else self.max_edits
+
+    def corrections(self, word):
+        """{known word: edit distance} for one query word; a known word is only itself."""
+        if word in self.word_keys or word in self.known_words:
+            return {word: 0}
+        budget = self.word_edits(len(word))
+        found = {}
+        if not budget:
+            return found
+        for variant in delete_variants(word[:PREFIX_LEN], budget):
+            for candidate in self.deletes.get(variant, ()):
+                if candidate not in found:
+                    limit = min(budget, self.word_edits(len(candidate)))
+                    distance = edit_distance(word, candidate, limit)
+                    if distance <= limit:
+                        found[candidate] = distance
+        return found
+
+    def lookup(self, text):
+        """(matched key, edit distance) of the closest key, or None."""
+        key = bag_key(text)
+        if not key:
+            return None
+        if key in self.values:
+            return key, 0
+        words = key.split()
+        corrections = [self.corrections(word) for word in words]
+        if not all(corrections) or all(len(c) == 1 and 0 in c.values() for c in corrections):
+            return None  # a word with no correction, or nothing to correct
+        candidates = None
+        for fixes in corrections:
+            keys = {k for word in fixes for k in self.word_keys.get(word, ())}
+            candidates = keys if candidates is None else candidates & keys
+        best = None
+        for candidate in candidates:
+            candidate_words = candidate.split()
+            if len(candidate_words) != len(words):
+                continue
+            distance = _assignment_cost(corrections, candidate_words)
+            limit = min(self.allowed_edits(len(key)), self.allowed_edits(len(candidate)))
+            if distance is not None and 0 < distance <= limit and (best is None or (distance, candidate) < best):
+                best = (distance, candidate)
+        return (best[1], best[0]) if best else None
+
+    def match(self, text):
+        """(values, similarity 0..1, matched key) for the closest key, or None."""
+        found = self.lookup(text)
+        if found is None:
+            return None
+        key, distance = found
+        similarity = 1 - distance / max(len(key), len(bag_key(text)))
+        return self.values[key], similarity, key
+
+    def __len__(self):
+        return len(self.values)
@@ -0,0 +1,180 @@
+# ========================================
+# 🌲 Coarse-to-fine Vector Search (HSN / NPCMS)
+# ========================================
+# Flat FAISS search compares the query with every leaf, so its cost grows
+# with each classification revision. Here the leaves are grouped by code
+# prefix (HSN: chapter → heading, NPCMS: division → subclass), each group is
+# represented by the centroid of its leaf embeddings, and a query descends
+# level by level keeping only the HIERARCHICAL_BEAM closest groups. Exact
+# distances are computed only for the leaves under the surviving groups.
+#
+# Results have the flat search's shape and metric (squared L2, row ids of
+# the bundle), so vector_store.search() switches to it per taxonomy with
+# VECTOR_HIERARCHICAL. A query whose beam holds fewer than k leaves is
+# answered by the flat index instead.
+#
+# One index is built per artifact bundle, on first use. Leaf vectors come
+# from the bundle's embedding matrix (memory-mapped) or, for NPCMS, which
+# ships only a FAISS index, are reconstructed from the index into memory.
+#
+#   python hierarchical_search.py hsn --beams 2,4,8,16 --k 5 [--queries FILE]
+# reports recall@k against flat search, latency and the share of leaves
+# scanned, over the most frequent logged queries (or FILE, one per line).
+
+import re
+import time
+import argparse
+import threading
+import weakref
+import numpy as np
+from config import HIERARCHICAL_BEAM
+
+# Code-prefix length of each level, coarsest first (config.VECTOR_HIERARCHICAL accepts these taxonomies)
+LEVELS = {
+    "hsn": (2, 4),     # chapter, heading
+    "npcms": (2, 5),   # division, subclass
+}
+
+class HierarchicalIndex:
+    def __init__(self, codes, vectors, prefix_lengths):
+        self.vectors = vectors
+        self.sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+        digits = [re.sub(r"\D", "", str(c)) for c in codes]
+        self.levels = []  # per level: (keys, centroids, centroid sq norms, members)
+
+        child_keys = None
+        for length in reversed(prefix_lengths):
+            keys = sorted({d[:length] for d in digits})
+            position = {key: i for i, key in enumerate(keys)}
+            rows = [[] for _ in keys]
+            for row, d in enumerate(digits):
+                rows[position[d[:length]]].append(row)
+            rows = [np.asarray(r, dtype="int64") for r in rows]
+            centroids = np.stack([np.asarray(vectors[r], dtype="float32").mean(axis=0) for r in rows])
+            if child_keys is None:
+                members = rows  # finest level: leaf rows
+            else:
+                # Coarser level: indexes of its child groups one level down
+                members = [[] for _ in keys]
+                for i, child in enumerate(child_keys):
+                    members[position[child[:length]]].append(i)
+                members = [np.asarray(m, dtype="int64") for m in members]
+            self.levels.insert(0, (keys, centroids, np.einsum("ij,ij->i", centroids, centroids), members))
+            child_keys = keys
+
+    @property
+    def leaves(self):
+        return len(self.vectors)
+
+    def _beam_rows(self, q, q_sq, beam):
+        selected = np.arange(len(self.levels[0][0]))
+        for keys, centroids, c_sq, members in self.levels:
+            dist = c_sq[selected] - 2 * centroids[selected] @ q + q_sq
+            if len(selected) > beam:
+                selected = selected[np.argpartition(dist, beam - 1)[:beam]]
+            selected = np.concatenate([members[g] for g in selected])
+        return selected
+
+    def search(self, query_vectors, k, beam=HIERARCHICAL_BEAM, fallback=None):
+        """(D, I, scanned) like faiss: squared L2 distances and row ids, best first."""
+        query_vectors = np.asarray(query_vectors, dtype="float32").reshape(-1, self.vectors.shape[1])
+        D = np.full((len(query_vectors), k), np.finfo("float32").max, dtype="float32")
+        I = np.full((len(query_vectors), k), -1, dtype="int64")
+        scanned = []
+        for n, q in enumerate(query_vectors):
+            q_sq = float(q @ q)
+            rows = self._beam_rows(q, q_sq, beam)
+            scanned.append(len(rows))
+            if len(rows) < k and fallback is not None:
+                D[n], I[n] = (a[0] for a in fallback(q.reshape(1, -1), k))
+                continue
+            dist = self.sq_norms[rows] - 2 * (np.asarray(self.vectors[rows]) @ q) + q_sq
+            top = np.argsort(dist)[:k] if len(rows) <= k else np.argpartition(dist, k - 1)[:k]
+            top = top[np.argsort(dist[top])]
+            D[n, :len(top)], I[n, :len(top)] = np.maximum(dist[top], 0), rows[top]
+        return D, I, scanned
+
+# ========================================
+# One index per artifact bundle
+# ========================================
+_indexes = weakref.WeakKeyDictionary()  # bundle → HierarchicalIndex (dropped with the bundle)
+_lock = threading.Lock()
+
+def leaf_vectors(bundle):
+    if bundle.embeddings is not None:
+        return bundle.embeddings
+    return bundle.index.reconstruct_n(0, bundle.index.ntotal)
+
+def get_hierarchical(bundle):
+    index = _indexes.get(bundle)
+    if index is None:
+        with _lock:
+            index = _indexes.get(bundle)
+            if index is None:
+                index = _indexes[bundle] = HierarchicalIndex(
+                    bundle.codes, leaf_vectors(bundle), LEVELS[bundle.taxonomy])
+    return index
+
+def hierarchical_search(bundle, query_vectors, k, beam=HIERARCHICAL_BEAM):
+    D, I, _ = get_hierarchical(bundle).search(query_vectors, k, beam, fallback=bundle.search)
+    return D, I
+
+# ========================================
+# Recall against flat search
+# ========================================
+def evaluate(taxonomy, queries, k=5, beams=(2, 4, 8, 16)):
+    from artifacts import current_bundle
+    from encoder_service import encode_many
+
+    bundle = current_bundle(taxonomy)
+    index = get_hierarchical(bundle)
+    vectors = np.asarray(encode_many(queries), dtype="float32")
+
+    started = time.perf_counter()
+    _, flat = bundle.search(vectors, k)
+    flat_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    report = {"taxonomy": taxonomy, "version": bundle.version, "queries": len(queries), "k": k,
+              "leaves": index.leaves, "flat_ms_per_query": round(flat_ms, 3), "beams": []}
+    for beam in beams:
+        started = time.perf_counter()
+        _, hier, scanned = index.search(vectors, k, beam)
+        hier_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = np.mean([len(set(f[f >= 0]) & set(h[h >= 0])) / max(1, (f >= 0).sum())
+                          for f, h in zip(flat, hier)])
+        report["beams"].append({
+            "beam": beam,
+            f"recall@{k}": round(float(recall), 4),
+            "ms_per_query": round(hier_ms, 3),
+            "scanned_share": round(float(np.mean(scanned)) / index.leaves, 4),
+        })
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall of coarse-to-fine vs flat vector search")
+    parser.add_argument("taxonomy", choices=sorted(LEVELS))
+    parser.add_argument("--beams", default="2,4,8,16")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", help="one query per line (default: most frequent logged queries)")
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()][:args.limit]
+    else:
+        from warmup import mine_top_queries
+        queries = mine_top_queries()[:args.limit]
+    if not queries:
+        raise SystemExit("No queries to evaluate (pass --queries)")
+
+    report = evaluate(args.taxonomy, queries, args.k, [int(b) for b in args.beams.split(",")])
+    print(f"🌲 {report['taxonomy']}@{report['version']}: {report['queries']} queries, {report['leaves']} leaves, "
+          f"flat {report['flat_ms_per_query']}ms/query")
+    recall_key = f"recall@{report['k']}"
+    for row in report["beams"]:
+        print(f"  beam {row['beam']:>3}: {recall_key} {row[recall_key]:.3f}, "
+              f"{row['ms_per_query']}ms/query, {row['scanned_share'] * 100:.1f}% of leaves scanned")
+    return report
+
+if __name__ == "__main__":
+    main()
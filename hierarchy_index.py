@@ -0,0 +1,132 @@
+# ========================================
+# Leaf → Full Path Hierarchy Index
+# ========================================
+# Each taxonomy's hierarchy JOIN is run once (without a WHERE clause) and the
+# flattened rows are kept keyed by leaf code, so lookups are a dict access
+# instead of a 5–6-way JOIN per code. Rows are shared; treat them as read-only.
+# Codes are keyed and looked up as strings, whatever the column type, as the
+# URL codes callers pass are strings.
+
+import threading
+from db import connect
+
+# Leaf code column and the full-path JOIN for each taxonomy
+HIERARCHY_QUERIES = {
+    "nic": ("subclass_code", """
+        SELECT s.section_code, s.section_name, d.division_code, d.division_name,
+               g.group_code, g.group_name, c.class_code, c.class_name,
+               sc.subclass_code, sc.subclass_description
+        FROM nic_subclass sc
+        JOIN nic_class c ON sc.class_code = c.class_code
+        JOIN nic_group g ON c.group_code = g.group_code
+        JOIN nic_division d ON g.division_code = d.division_code
+        JOIN nic_section s ON d.section_code = s.section_code
+    """),
+    "npcms": ("product_code", """
+        SELECT s.section_code, s.section_description, d.division_code, d.division_description,
+               g.group_code, g.group_description, c.class_code, c.class_description,
+               sb.subclass_code, sb.subclass_description, p.product_code, p.product_description
+        FROM npcms_product p
+        JOIN npcms_subclass sb ON p.subclass_code = sb.subclass_code
+        JOIN npcms_class c ON sb.class_code = c.class_code
+        JOIN npcms_group g ON c.group_code = g.group_code
+        JOIN npcms_division d ON g.division_code = d.division_code
+        JOIN npcms_section s ON d.section_code = s.section_code
+    """),
+    "hsn": ("national_code", """
+        SELECT
+            s.section_code, s.section_description,
+            c.chapter_code, c.chapter_description,
+            h.heading_code, h.heading_description,
+            sh.subheading_code, sh.subheading_description,
+            n.national_code, n.national_description
+        FROM hsn_national n
+        JOIN hsn_subheading sh ON n.subheading_code = sh.subheading_code
+        JOIN hsn_heading h ON sh.heading_code = h.heading_code
+        JOIN hsn_chapter c ON h.chapter_code = c.chapter_code
+        JOIN hsn_section s ON c.section_code = s.section_code
+    """),
+}
+
+class HierarchyIndex:
+    def __init__(self, taxonomy, paths):
+        self.taxonomy = taxonomy
+        self.paths = paths  # leaf code -> flat row with every ancestor level
+
+    def lookup(self, code):
+        return self.paths.get(str(code))
+
+    def lookup_many(self, codes):
+        return [self.lookup(code) for code in codes]
+
+class NcoFamilyIndex:
+    """NCO lookups are by family (4 digits) and list the NCO 2015 codes under it."""
+
+    def __init__(self, families, codes_by_family):
+        self.taxonomy = "nco"
+        self.families = families                # family_code -> family_name
+        self.codes_by_family = codes_by_family  # family_code -> [{nco_2015, nco_description}]
+
+    def lookup(self, code):
+        code = str(code)
+        rows = self.codes_by_family.get(code)
+        return {
+            "family_code": code,
+            "family_description": self.families.get(code, "Not found"),
+            "nco_2015_list": rows if rows else "No NCO 2015 codes found under this family."
+        }
+
+    def lookup_many(self, codes):
+        return [self.lookup(code) for code in codes]
+
+# ========================================
+# Builders
+# ========================================
+def _coalesce_text(row):
+    """NULL descriptions / names become "", so every consumer can treat them as text."""
+    for col, value in row.items():
+        if value is None and col.endswith(("_description", "_name")):
+            row[col] = ""
+    return row
+
+def build_hierarchy(taxonomy):
+    conn = connect()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        if taxonomy == "nco":
+            cursor.execute("SELECT family_code, family_name FROM nco_family")
+            families = {str(row["family_code"]): row["family_name"] or "" for row in cursor.fetchall()}
+            cursor.execute("SELECT family_code, nco_2015, nco_description FROM nco_code")
+            codes_by_family = {}
+            for row in cursor.fetchall():
+                family = str(_coalesce_text(row).pop("family_code"))
+                codes_by_family.setdefault(family, []).append(row)
+            return NcoFamilyIndex(families, codes_by_family)
+
+        leaf_col, sql = HIERARCHY_QUERIES[taxonomy]
+        cursor.execute(sql)
+        return HierarchyIndex(taxonomy, {str(row[leaf_col]): _coalesce_text(row) for row in cursor.fetchall()})
+    finally:
+        conn.close()
+
+_lock = threading.Lock()
+_indexes = {}
+
+def get_hierarchy(taxonomy):
+    index = _indexes.get(taxonomy)
+    if index is None:
+        with _lock:
+            index = _indexes.get(taxonomy)
+            if index is None:
+                index = _indexes[taxonomy] = build_hierarchy(taxonomy)
+    return index
+
+def reload_hierarchy(taxonomy):
+    fresh = build_hierarchy(taxonomy)
+    with _lock:
+        _indexes[taxonomy] = fresh
+    return fresh
+
+def reload_loaded_hierarchies():
+    for taxonomy in list(_indexes):
+        reload_hierarchy(taxonomy)
@@ -1,40 +1,69 @@
 # hsn_api.py
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, request, jsonify
 from hsn_search_pipeline import run_hsn_search, get_hsn_hierarchy
-from flask_cors import CORS
-import mysql.connector
-from config import DB_CONFIG
-
-app = Flask(__name__)
-CORS(app)
-
-conn = mysql.connector.connect(
-    host=DB_CONFIG["host"],
-    port=DB_CONFIG["port"],
-    user=DB_CONFIG["user"],
-    password=DB_CONFIG["password"],
-    database=DB_CONFIG["database"],
-    ssl_ca=DB_CONFIG["ssl_ca"]
-)
-
-@app.route("/api/hsn-search", methods=["GET"])
+from hierarchy_index import get_hierarchy
+from api_utils import read_batch_codes, read_limit, read_search_mode, code_validator
+from hybrid import hybrid_search
+from typeahead import get_typeahead
+from deadline import deadline_from_request
+from config import TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT
+from db import connect
+
+hsn_bp = Blueprint("hsn", __name__)
+
+invalid_national_code = code_validator((8,), "HSN/ITCHS code must be 8 digits")
+
+conn = connect()
+
+def hsn_search_results(query, deadline=None, mode="cascade", fusion=None):
+    if mode != "hybrid":
+        return run_hsn_search(query, deadline)
+    results = []
+    for r in hybrid_search("hsn", query, 5, fusion, deadline=deadline):
+        conf = r["confidence"]
+        results.append({
+            "code": r["national_code"],
+            "description": r["national_description"],
+            "confidence": conf,
+            "color": "GREEN" if conf > 65 else "YELLOW" if conf >= 35 else "RED",
+            "source": r["source"],
+            **(get_hsn_hierarchy(r["national_code"]) or {})
+        })
+    return {"results": results}
+
+@hsn_bp.route("/api/hsn-search", methods=["GET"])
 def hsn_search():
     query = request.args.get("query", "").strip()
     if not query:
         return jsonify({"error": "Query is required"}), 400
+    mode, fusion, error = read_search_mode()
+    if error:
+        return jsonify({"error": error}), 400
 
-    output = run_hsn_search(query)
-    return jsonify(output)
+    deadline = deadline_from_request()
+    output = hsn_search_results(query, deadline, mode, fusion)
+    return jsonify({**output, "mode": mode, **deadline.report()})
 
-@app.route("/api/hsn-hierarchy", methods=["GET"])
+@hsn_bp.route("/api/hsn-hierarchy", methods=["GET"])
 def hsn_code_lookup():
     code = request.args.get("code")
     if not code:
         return jsonify({"error": "HSN/ITCHS code required"}), 400
+    error = invalid_national_code(code)
+    if error:
+        return jsonify({"error": error}), 400
     return jsonify(get_hsn_hierarchy(code))
 
-@app.route("/api/hsn-dropdown/<level>", methods=["GET"])
+@hsn_bp.route("/api/hsn-hierarchy/batch", methods=["GET", "POST"])
+def hsn_code_lookup_batch():
+    codes, error = read_batch_codes(invalid_national_code)
+    if error:
+        return jsonify({"error": error}), 400
+    rows = get_hierarchy("hsn").lookup_many(codes)
+    return jsonify({"results": [row or {"national_code": code, "error": "Code not found"} for code, row in zip(codes, rows)]})
+
+@hsn_bp.route("/api/hsn-dropdown/<level>", methods=["GET"])
 def hsn_dropdown(level):
     parent = request.args.get("parent")
     cursor = conn.cursor(dictionary=True)
@@ -55,7 +84,7 @@ def hsn_dropdown(level):
     return jsonify(cursor.fetchall())
 
 
-@app.route("/api/hsn-lookup", methods=["GET"])
+@hsn_bp.route("/api/hsn-lookup", methods=["GET"])
 def hsn_lookup():
     code = request.args.get("code")
     if not code or len(code) not in [6, 8]:
@@ -70,3 +99,10 @@ def hsn_lookup():
     cursor.execute("SELECT national_code, national_description FROM hsn_national WHERE subheading_code = %s", (code,))
     rows = cursor.fetchall()
     return jsonify(rows if rows else {"error": "No national codes found under this 6-digit code"})
+
+
+@hsn_bp.route("/api/hsn-typeahead", methods=["GET"])
+def hsn_typeahead():
+    q = request.args.get("q", "")
+    limit = read_limit(TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT)
+    return jsonify({"query": q, "suggestions": get_typeahead("hsn").complete(q, limit)})
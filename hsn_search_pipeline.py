@@ -3,112 +3,101 @@
 # ========================================
 
 # 📦 Imports
-import os
-import re
-import mysql.connector
+import threading
+import weakref
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer, util
-from sklearn.feature_extraction.text import CountVectorizer
-from config import DB_CONFIG
-
-# 🧠 Load SBERT model (all-mpnet-base-v2)
-model = SentenceTransformer("all-mpnet-base-v2")
-
-FAISS_INDEX = faiss.read_index("hsn_faiss.index")
-
-with open("hsn_concat_descriptions.txt", "r", encoding="utf-8") as f:
-    HSN_LINES = [line.strip() for line in f]
-
-HSN_CODES = [line.split(" ||| ")[0] for line in HSN_LINES]
-HSN_DESCS = [line.split(" ||| ")[1] for line in HSN_LINES]
-
-# 📁 Load precomputed embeddings (assumed cached as .npy and .txt)
-EMBEDDING_FILE = "hsn_embeddings.npy"
-TEXT_FILE = "hsn_concat_descriptions.txt"
-
-# 🔌 MySQL Connection
-def connect_to_mysql():
-    return mysql.connector.connect(
-        host=DB_CONFIG["host"],
-        port=DB_CONFIG["port"],
-        user=DB_CONFIG["user"],
-        password=DB_CONFIG["password"],
-        database=DB_CONFIG["database"],
-        ssl_ca=DB_CONFIG["ssl_ca"]
-    )
-
-# 🔠 Normalize text for Boolean search
-def normalize(text):
-    text = text.lower()
-    text = re.sub(r"[^a-z0-9\s]", "", text)
-    stopwords = set(["of", "and", "the", "with", "for", "in", "on", "to", "from", "by", "or", "not"])
-    return " ".join([word for word in text.split() if word not in stopwords])
-
-# 🧠 Boolean search
-def boolean_search(query, descriptions):
-    query_words = set(normalize(query).split())
-    results = []
-    for i, desc in enumerate(descriptions):
-        desc_words = set(normalize(desc).split())
-        match_score = len(query_words & desc_words) / max(1, len(query_words))
-        if match_score > 0:
-            results.append((i, match_score * 100))
-    return sorted(results, key=lambda x: x[1], reverse=True)
+from hierarchy_index import get_hierarchy
+from encoder_service import encode
+import vector_store
+from artifacts import current_bundle
+from code_index import fast_path, truncation
+from deadline import Deadline
+from text_processing import analyze, normalize_hsn, hsn_terms
+
+# 🔠 Normalize text for Boolean search (memoized, see text_processing)
+normalize = normalize_hsn
+
+# 📇 Word → rows index over one bundle's "<code> ||| <description>" lines, built
+# once per bundle so a request never decodes or re-tokenizes the corpus
+class HsnWordIndex:
+    def __init__(self, bundle):
+        postings = {}
+        for i, (code, desc) in enumerate(zip(bundle.codes, bundle.descs)):
+            for word in set(hsn_terms(f"{code} ||| {desc}")):
+                postings.setdefault(word, []).append(i)
+        self.postings = {word: np.asarray(rows, dtype="int32") for word, rows in postings.items()}
+
+_word_indexes = weakref.WeakKeyDictionary()  # bundle → HsnWordIndex (dropped with the bundle)
+_word_lock = threading.Lock()
+
+def get_word_index(bundle):
+    index = _word_indexes.get(bundle)
+    if index is None:
+        with _word_lock:
+            index = _word_indexes.get(bundle)
+            if index is None:
+                index = _word_indexes[bundle] = HsnWordIndex(bundle)
+    return index
+
+# 🧠 Boolean search: share of the query words found in each line, best first
+def boolean_search(query, bundle):
+    query_words = analyze(query).hsn_words
+    postings = get_word_index(bundle).postings
+    hits = [postings[w] for w in query_words if w in postings]
+    if not hits:
+        return []
+    rows, matched = np.unique(np.concatenate(hits), return_counts=True)
+    order = np.argsort(-matched, kind="stable")  # ties keep row order
+    return [(int(rows[i]), float(matched[i]) / len(query_words) * 100) for i in order]
 
 # 🧠 Semantic search
 def semantic_search(query_embedding, embeddings):
-    cosine_scores = util.cos_sim(query_embedding, embeddings)[0]
+    q = np.asarray(query_embedding, dtype="float32").ravel()
+    cosine_scores = (embeddings @ q) / np.maximum(np.linalg.norm(embeddings, axis=1) * np.linalg.norm(q), 1e-12)
     results = [(i, float(score)) for i, score in enumerate(cosine_scores)]
     return sorted(results, key=lambda x: x[1], reverse=True)
 
-# 📥 Load embeddings and descriptions
-def load_embeddings():
-    if not os.path.exists(EMBEDDING_FILE) or not os.path.exists(TEXT_FILE):
-        raise Exception("Embedding or description file not found.")
-    descriptions = [line.strip() for line in open(TEXT_FILE, "r", encoding="utf-8")]
-    vectors = np.load(EMBEDDING_FILE)
-    return descriptions, vectors
-
-# 🧱 Get full HSN hierarchy by national_code
+# 🧱 Get full HSN hierarchy by national_code (precomputed leaf → path index)
 def get_hsn_hierarchy(code8):
-    conn = connect_to_mysql()
-    cur = conn.cursor(dictionary=True)
-    query = """
-    SELECT 
-        s.section_code, s.section_description,
-        c.chapter_code, c.chapter_description,
-        h.heading_code, h.heading_description,
-        sh.subheading_code, sh.subheading_description,
-        n.national_code, n.national_description
-    FROM hsn_national n
-    JOIN hsn_subheading sh ON n.subheading_code = sh.subheading_code
-    JOIN hsn_heading h ON sh.heading_code = h.heading_code
-    JOIN hsn_chapter c ON h.chapter_code = c.chapter_code
-    JOIN hsn_section s ON c.section_code = s.section_code
-    WHERE n.national_code = %s
-    """
-    cur.execute(query, (code8,))
-    result = cur.fetchone()
-    conn.close()
-    return result
+    return get_hierarchy("hsn").lookup(code8)
 
 # 🎯 Main search function
-def run_hsn_search(query):
+def run_hsn_search(query, deadline=None):
+    deadline = deadline or Deadline()
     results = []
-    descriptions, embeddings = load_embeddings()
+
+    # Step 0: Code prefix / exact description fast path
+    kind, rows, total = fast_path("hsn", query)
+    if kind:
+        for r in rows:
+            code = r["national_code"]
+            results.append({
+                "code": code,
+                "description": r["national_description"],
+                "confidence": 100.0,
+                "color": "GREEN",
+                "source": kind.upper(),
+                **(get_hsn_hierarchy(code) or {})
+            })
+        return {"results": results, **truncation(rows, total)}
+
+    bundle = current_bundle("hsn")
 
     # Step 1: Boolean search on national_description
-    bool_matches = boolean_search(query, descriptions)
+    with deadline.stage("hsn.boolean"):
+        bool_matches = boolean_search(query, bundle)
     top_score = bool_matches[0][1] if bool_matches else 0
 
-    if bool_matches and top_score >= 70:  # ✅ Only accept if confidence is high
+    # ✅ Only accept if confidence is high, unless there is no time left for SBERT
+    # (decided once: a second allows() could say no and drop the boolean matches too)
+    run_semantic = not (bool_matches and top_score >= 70) and deadline.allows("hsn.semantic")
+    if bool_matches and not run_semantic:
         for i, score in bool_matches[:5]:
-            code = descriptions[i].split(" ||| ")[0]
+            code = bundle.codes[i]
             hierarchy = get_hsn_hierarchy(code)
             results.append({
                 "code": code,
-                "description": descriptions[i].split(" ||| ")[1],
+                "description": bundle.descs[i],
                 "confidence": round(score, 2),
                 "color": "GREEN" if score > 65 else "YELLOW" if score >= 35 else "RED",
                 "source": "Boolean",
@@ -118,17 +107,20 @@ def run_hsn_search(query):
 
 
     # Step 2: SBERT search
-    query_embedding = model.encode(normalize(query), convert_to_numpy=True).astype("float32")
-    # 🔍 FAISS Search with Scaled Confidence
-    D, I = FAISS_INDEX.search(np.array([query_embedding]), 5)
+    if not run_semantic:
+        return {"results": results}
+    with deadline.stage("hsn.semantic"):
+        query_embedding = encode(normalize(query))
+        # 🔍 FAISS Search with Scaled Confidence
+        D, I = vector_store.search("hsn", np.array([query_embedding]), 5, bundle.version)
 
     SCALE = 50  # Tune this to shift confidence up/down
     for rank, idx in enumerate(I[0]):
         distance = D[0][rank]
         confidence = max(0.0, 100 - distance * SCALE)  # Convert L2 distance to proxy confidence
 
-        code = HSN_CODES[idx]
-        desc = HSN_DESCS[idx]
+        code = bundle.codes[idx]
+        desc = bundle.descs[idx]
         hierarchy = get_hsn_hierarchy(code)
 
         results.append({
@@ -0,0 +1,132 @@
+# ========================================
+# 🗂️ HTTP Conditional Caching (taxonomy-versioned ETags)
+# ========================================
+# Dropdown, lookup, hierarchy and crosswalk responses only change when the
+# classification tables change, so their ETag is simply the taxonomy version.
+# A matching If-None-Match is answered with 304 from a before_request hook,
+# before the view (or the database) is touched.
+#
+# The version is TAXONOMY_VERSION when set, otherwise derived from the tables'
+# create/update times in information_schema (or, with the sqlite backend, the
+# version recorded in the snapshot when it was exported). It is refreshed on a background
+# timer every TAXONOMY_VERSION_TTL_S seconds, never on the request path. A new
+# version is served only once every on_taxonomy_change() reload succeeded;
+# until then the old one stays, and the failed reloads are retried next tick.
+
+import hashlib
+import threading
+from flask import request, Response
+from config import TAXONOMY_VERSION, TAXONOMY_VERSION_TTL_S, HTTP_CACHE_MAX_AGE_S, DB_BACKEND
+from db import connect_mysql
+
+TAXONOMY_TABLE_PREFIXES = ("nic\\_", "nco\\_", "npcms\\_", "hsn\\_")
+
+_version = None
+_version_lock = threading.Lock()
+_change_callbacks = []
+_reloaded = (None, set())  # (version being switched to, callbacks that already ran for it)
+
+def compute_taxonomy_version():
+    if TAXONOMY_VERSION:
+        return TAXONOMY_VERSION
+    if DB_BACKEND == "sqlite":
+        from sqlite_snapshot import snapshot_version
+        return snapshot_version()
+    return mysql_taxonomy_version()
+
+def mysql_taxonomy_version():
+    conn = connect_mysql()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        like = " OR ".join(["TABLE_NAME LIKE %s"] * len(TAXONOMY_TABLE_PREFIXES))
+        cursor.execute(f"""
+            SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND ({like})
+            ORDER BY TABLE_NAME
+        """, [p + "%" for p in TAXONOMY_TABLE_PREFIXES])
+        stamp = "|".join(f"{r['TABLE_NAME']}:{r['CREATE_TIME']}:{r['UPDATE_TIME']}" for r in cursor.fetchall())
+    finally:
+        conn.close()
+    return hashlib.sha1(stamp.encode("utf-8")).hexdigest()[:16]
+
+def on_taxonomy_change(callback):
+    """Run callback() whenever the computed taxonomy version changes (e.g. to reload in-memory indexes)."""
+    _change_callbacks.append(callback)
+
+def _run_change_callbacks(fresh):
+    """True once every callback has run successfully for version fresh (failed ones are retried next time)."""
+    global _reloaded
+    if _reloaded[0] != fresh:
+        _reloaded = (fresh, set())
+    done = _reloaded[1]
+    for callback in _change_callbacks:
+        if callback in done:
+            continue
+        try:
+            callback()
+            done.add(callback)
+        except Exception as exc:
+            print(f"⚠️ Reload after taxonomy change failed ({getattr(callback, '__name__', callback)}): {exc!r}")
+    return len(done) == len(_change_callbacks)
+
+def _refresh_version():
+    global _version
+    try:
+        fresh = compute_taxonomy_version()
+        previous = _version
+        # Publish the new version only after the in-memory indexes reloaded, so
+        # its ETag is never attached to data of the previous version
+        if previous is None or fresh == previous or _run_change_callbacks(fresh):
+            with _version_lock:
+                _version = fresh
+    except Exception as exc:
+        print(f"⚠️ Taxonomy version refresh failed: {exc!r}")
+    if not TAXONOMY_VERSION:
+        timer = threading.Timer(TAXONOMY_VERSION_TTL_S, _refresh_version)
+        timer.daemon = True
+        timer.start()
+
+def start_taxonomy_version_refresh():
+    """Compute the version once now and keep it fresh in the background."""
+    _refresh_version()
+
+def taxonomy_version():
+    """Current version string, or None if it could not be computed (caching is then skipped)."""
+    return _version
+
+# ========================================
+# Blueprint hooks
+# ========================================
+def _stamp(response, version):
+    response.set_etag(version, weak=True)
+    response.headers["Cache-Control"] = f"public, max-age={HTTP_CACHE_MAX_AGE_S}"
+    # Public responses may be compressed on the way out (proxy / WSGI middleware)
+    response.vary.add("Accept-Encoding")
+    return response
+
+def init_http_cache(bp, *view_names):
+    """Enable version-based conditional caching for the named GET views of a blueprint.
+
+    Must be called before the blueprint is registered on the app.
+    """
+    endpoints = {f"{bp.name}.{view}" for view in view_names}
+
+    @bp.before_request
+    def _answer_not_modified():
+        if request.method != "GET" or request.endpoint not in endpoints:
+            return None
+        version = taxonomy_version()
+        if version and request.if_none_match.contains_weak(version):
+            return _stamp(Response(status=304), version)
+        return None
+
+    @bp.after_request
+    def _add_cache_headers(response):
+        if request.method == "GET" and request.endpoint in endpoints and response.status_code == 200:
+            version = taxonomy_version()
+            if version:
+                _stamp(response, version)
+        return response
+
+    return bp
@@ -0,0 +1,139 @@
+# ========================================
+# 🔀 Hybrid Lexical + Vector Retrieval
+# ========================================
+# Alternative to the FULLTEXT → SBERT cascades (?mode=hybrid on the search
+# routes). The lexical ranking (FULLTEXT natural-language mode; in-memory word
+# overlap for HSN, as in its cascade) runs on a pooled connection while the
+# query is encoded and searched against the vector index, then both candidate
+# lists are fused by code:
+#   - rrf:      Σ w / (HYBRID_RRF_K + rank)
+#   - weighted: Σ w · min-max normalised score
+# Confidence is the fused score as a percentage of the best possible one.
+
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import HYBRID_CANDIDATES, HYBRID_RRF_K, HYBRID_LEXICAL_WEIGHT, HYBRID_FUSION
+from db import get_pool
+from encoder_service import encode
+from code_index import get_code_index
+import vector_store
+from artifacts import current_bundle
+
+LEXICAL_SQL = {
+    "nic": ("nic_subclass", "subclass_code", "subclass_description"),
+    "nco": ("nco_code", "nco_2015", "nco_description"),
+    "npcms": ("npcms_product", "product_code", "product_description"),
+}
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid")
+
+def query_text(taxonomy, query):
+    """The text the taxonomy's cascade encodes, so hybrid hits the same encoder cache entries."""
+    if taxonomy == "nic":
+        from nic_search_pipeline import preprocess_query, expand_semantic_query
+        return expand_semantic_query(preprocess_query(query))
+    if taxonomy == "hsn":
+        from hsn_search_pipeline import normalize
+        return normalize(query)
+    return query
+
+# ========================================
+# Rankings: [(code, score)] best first
+# ========================================
+def lexical_ranking(taxonomy, text, n, is_cpm=None):
+    if taxonomy == "hsn":
+        from hsn_search_pipeline import boolean_search
+        bundle = current_bundle("hsn")
+        return [(bundle.codes[i], score) for i, score in boolean_search(text, bundle)[:n]]
+
+    table, code_col, desc_col = LEXICAL_SQL[taxonomy]
+    category = "is_cpm = %s AND " if is_cpm is not None else ""
+    params = (text,) + ((is_cpm,) if is_cpm is not None else ()) + (text, n)
+    with get_pool().cursor() as cur:
+        cur.execute(f"""
+            SELECT {code_col} AS code, MATCH({desc_col}) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+            FROM {table}
+            WHERE {category}MATCH({desc_col}) AGAINST (%s IN NATURAL LANGUAGE MODE)
+            ORDER BY score DESC LIMIT %s
+        """, params)
+        return [(str(r["code"]), float(r["score"])) for r in cur.fetchall()]
+
+def vector_ranking(taxonomy, text, n, is_cpm=None):
+    bundle = current_bundle(taxonomy)  # row id → code of the version searched
+    codes = bundle.codes
+    query_emb = np.asarray(encode(text), dtype="float32")
+    if taxonomy == "nic":
+        scores = bundle.cosine_scores(query_emb)
+        top = np.argpartition(-scores, min(n, len(scores) - 1))[:n]
+        ranked = sorted(((codes[i], float(scores[i])) for i in top), key=lambda x: x[1], reverse=True)
+    else:
+        # Over-fetch when one NPCMS category is filtered out afterwards
+        k = n * 2 if is_cpm is not None else n
+        D, I = vector_store.search(taxonomy, query_emb.reshape(1, -1), k, bundle.version)
+        ranked = [(codes[i], -float(d)) for i, d in zip(I[0], D[0]) if i >= 0]  # smaller L2 = better
+    if is_cpm is not None:
+        index = get_code_index("npcms")
+        ranked = [(c, s) for c, s in ranked if (index.get(c) or {}).get("is_cpm") == is_cpm]
+    return ranked[:n]
+
+# ========================================
+# Fusion
+# ========================================
+def rrf_fuse(rankings, weights, k=HYBRID_RRF_K):
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, (code, _) in enumerate(ranking, 1):
+            fused[code] = fused.get(code, 0.0) + weight / (k + rank)
+    return fused, sum(weights) / (k + 1)
+
+def weighted_fuse(rankings, weights):
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        scores = [s for _, s in ranking]
+        lo, hi = min(scores), max(scores)
+        for code, s in ranking:
+            fused[code] = fused.get(code, 0.0) + weight * ((s - lo) / (hi - lo) if hi > lo else 1.0)
+    return fused, sum(weights)
+
+def hybrid_search(taxonomy, query, top_k=5, fusion=None, is_cpm=None, deadline=None):
+    """Fused leaf rows (code-index row + confidence / ranks) for one taxonomy."""
+    fusion = fusion or HYBRID_FUSION
+    text = query_text(taxonomy, query)
+    n = HYBRID_CANDIDATES
+
+    def timed(name, fn):
+        if deadline is None:
+            return fn(taxonomy, text, n, is_cpm)
+        with deadline.stage(f"{taxonomy}.hybrid.{name}"):
+            return fn(taxonomy, text, n, is_cpm)
+
+    # With the caller's context: deadline and admission priority carry over to the thread
+    lexical_future = _executor.submit(copy_context().run, timed, "lexical", lexical_ranking)
+    vector = timed("vector", vector_ranking)
+    lexical = lexical_future.result()
+
+    weights = (HYBRID_LEXICAL_WEIGHT, 1.0 - HYBRID_LEXICAL_WEIGHT)
+    fuse = weighted_fuse if fusion == "weighted" else rrf_fuse
+    fused, best = fuse((lexical, vector), weights)
+
+    lexical_rank = {code: rank for rank, (code, _) in enumerate(lexical, 1)}
+    vector_rank = {code: rank for rank, (code, _) in enumerate(vector, 1)}
+    index = get_code_index(taxonomy)
+    results = []
+    for code, score in sorted(fused.items(), key=lambda x: x[1], reverse=True):
+        row = index.get(code)
+        if row is None:
+            continue  # artifact older than the table
+        results.append({
+            **row,
+            "confidence": round(min(100.0, score / best * 100), 2),
+            "lexical_rank": lexical_rank.get(code),
+            "vector_rank": vector_rank.get(code),
+            "source": f"HYBRID_{fusion.upper()}"
+        })
+        if len(results) >= top_k:
+            break
+    return results
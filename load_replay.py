@@ -0,0 +1,312 @@
+# ========================================
+# 🏋️ Load-Replay Harness
+# ========================================
+# Replays a JSONL corpus of requests against the full app.py stack and
+# reports throughput, per-route latency percentiles, status counts and error
+# rates, so server configurations (gunicorn workers / threads, pool sizes,
+# encoder batching) can be compared run against run.
+#
+# Corpus lines (any mix):
+#   {"method": "GET", "path": "/api/nic-search", "params": {"query": "bakery"}}
+#   {"method": "POST", "path": "/api/nic-lookup/batch", "json": {"codes": ["10711"]}}
+#   {"url": "/api/hsn-search?query=steel+pipes"}
+#   {"query": "paracetamol", "category": "chemical"}   ← query-log lines, sent to --route
+#
+# Load models:
+#   --concurrency N   closed loop: N clients, each sending its next request as
+#                     soon as the previous one returns
+#   --rate R          open loop: R requests/s (Poisson arrivals with --poisson);
+#                     latency counts from the scheduled send time, so queueing
+#                     inside an overloaded server is not hidden
+#
+# Targets:
+#   --url http://127.0.0.1:8000   a running server (start it with
+#                                 DB_BACKEND=sqlite for a local DB stand-in)
+#   --in-process                  app.test_client() in this process, on the
+#                                 SQLite snapshot (--snapshot)
+#
+#   python load_replay.py corpus.jsonl --url http://127.0.0.1:8000 --concurrency 16 \
+#       --duration 60 --label "gunicorn -w 4 --threads 8" --json results.json
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+PERCENTILES = (50, 90, 95, 99)
+LOG_CATEGORIES = {"chemical": "chemical", "general": "other", "other": "other"}
+
+# ========================================
+# Corpus
+# ========================================
+def normalize_entry(entry, default_route):
+    if "url" in entry:
+        parsed = urllib.parse.urlsplit(entry["url"])
+        return {"method": entry.get("method", "GET"), "path": parsed.path,
+                "params": dict(urllib.parse.parse_qsl(parsed.query)),
+                "json": entry.get("json"), "headers": entry.get("headers", {}),
+                "route": entry.get("route", parsed.path)}
+    if "path" in entry:
+        return {"method": entry.get("method", "GET"), "path": entry["path"],
+                "params": entry.get("params", {}), "json": entry.get("json"),
+                "headers": entry.get("headers", {}), "route": entry.get("route", entry["path"])}
+    if isinstance(entry.get("query"), str):
+        params = {"query": entry["query"]}
+        if entry.get("category") in LOG_CATEGORIES:
+            params["category"] = LOG_CATEGORIES[entry["category"]]
+        return {"method": "GET", "path": default_route, "params": params, "json": None,
+                "headers": {}, "route": default_route}
+    return None
+
+def load_corpus(path, default_route):
+    corpus = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = normalize_entry(json.loads(line), default_route)
+            except ValueError:
+                continue
+            if entry:
+                corpus.append(entry)
+    if not corpus:
+        raise SystemExit(f"No replayable requests in {path}")
+    return corpus
+
+# ========================================
+# Targets: send(request) -> HTTP status
+# ========================================
+def http_sender(base_url, timeout):
+    base_url = base_url.rstrip("/")
+
+    def send(req):
+        url = base_url + req["path"]
+        if req["params"]:
+            url += "?" + urllib.parse.urlencode(req["params"])
+        body = json.dumps(req["json"]).encode("utf-8") if req["json"] is not None else None
+        headers = dict(req["headers"])
+        if body is not None:
+            headers.setdefault("Content-Type", "application/json")
+        http_req = urllib.request.Request(url, data=body, headers=headers, method=req["method"])
+        try:
+            with urllib.request.urlopen(http_req, timeout=timeout) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            return exc.code
+
+    return send
+
+def in_process_sender(snapshot):
+    # Must be set before app.py (and through it db / config) is imported
+    os.environ.setdefault("DB_BACKEND", "sqlite")
+    if snapshot:
+        os.environ["SQLITE_SNAPSHOT"] = snapshot
+    from app import app
+    local = threading.local()
+
+    def send(req):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        resp = client.open(req["path"], method=req["method"], query_string=req["params"],
+                           json=req["json"], headers=req["headers"])
+        resp.get_data()
+        return resp.status_code
+
+    return send
+
+# ========================================
+# Load generators
+# ========================================
+class Recorder:
+    def __init__(self):
+        self.samples = []  # (route, status | None, latency_ms, error)
+        self.lock = threading.Lock()
+
+    def record(self, route, status, latency_ms, error=None):
+        with self.lock:
+            self.samples.append((route, status, latency_ms, error))
+
+def timed_send(send, req, recorder, scheduled=None):
+    started = time.perf_counter()
+    try:
+        status, error = send(req), None
+    except Exception as exc:
+        status, error = None, type(exc).__name__
+    latency_ms = (time.perf_counter() - (scheduled if scheduled is not None else started)) * 1000
+    recorder.record(req["route"], status, latency_ms, error)
+
+def run_closed_loop(send, corpus, recorder, concurrency, total, duration):
+    stop_at = time.perf_counter() + duration if duration else None
+    counter = iter(range(total)) if total else None
+    counter_lock = threading.Lock()
+    position = [0]
+
+    def next_request():
+        with counter_lock:
+            if stop_at and time.perf_counter() >= stop_at:
+                return None
+            if counter is not None and next(counter, None) is None:
+                return None
+            req = corpus[position[0] % len(corpus)]
+            position[0] += 1
+            return req
+
+    def client():
+        while True:
+            req = next_request()
+            if req is None:
+                return
+            timed_send(send, req, recorder)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def run_open_loop(send, corpus, recorder, rate, total, duration, max_workers, poisson, seed):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    scheduled = started
+    sent = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="replay") as pool:
+        while True:
+            if total and sent >= total:
+                break
+            if duration and scheduled - started >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(timed_send, send, corpus[sent % len(corpus)], recorder, scheduled)
+            sent += 1
+            scheduled += rng.expovariate(rate) if poisson else 1.0 / rate
+
+# ========================================
+# Report
+# ========================================
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))  # nearest-rank
+    return sorted_values[rank - 1]
+
+def summarize_samples(samples, wall_s):
+    latencies = sorted(s[2] for s in samples)
+    statuses = defaultdict(int)
+    errors = 0
+    for _, status, _, error in samples:
+        statuses[str(status) if status is not None else error] += 1
+        if status is None or status >= 500:
+            errors += 1
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / wall_s, 2) if wall_s else None,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            **{f"p{p}": round(percentile(latencies, p), 2) if latencies else None for p in PERCENTILES},
+            "max": round(latencies[-1], 2) if latencies else None,
+        },
+    }
+
+def summarize(samples, wall_s):
+    by_route = defaultdict(list)
+    for sample in samples:
+        by_route[sample[0]].append(sample)
+    return {
+        "overall": summarize_samples(samples, wall_s),
+        "routes": {route: summarize_samples(rows, wall_s) for route, rows in sorted(by_route.items())},
+    }
+
+def print_report(report):
+    cols = ["requests", "rps", "err%"] + [f"p{p}" for p in PERCENTILES] + ["max"]
+    print(f"\n🏋️ {report['config']['label'] or 'load replay'} — {report['config']['model']}, "
+          f"{report['wall_s']:.1f}s")
+    print(f"{'route':<34}" + "".join(f"{c:>10}" for c in cols))
+    for name, summary in [("ALL", report["overall"])] + list(report["routes"].items()):
+        lat = summary["latency_ms"]
+        values = [summary["requests"], summary["throughput_rps"], summary["error_rate"] * 100] + \
+                 [lat[f"p{p}"] for p in PERCENTILES] + [lat["max"]]
+        print(f"{name[:34]:<34}" + "".join(f"{'-' if v is None else round(v, 1):>10}" for v in values))
+    print(f"statuses: {report['overall']['statuses']}")
+
+# ========================================
+# CLI
+# ========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a JSONL request corpus against the app")
+    parser.add_argument("corpus")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument("--in-process", action="store_true", help="drive app.test_client() on the SQLite snapshot")
+    load = parser.add_mutually_exclusive_group(required=True)
+    load.add_argument("--concurrency", type=int, help="closed loop with N concurrent clients")
+    load.add_argument("--rate", type=float, help="open loop at R requests per second")
+    parser.add_argument("--poisson", action="store_true", help="Poisson instead of evenly spaced arrivals")
+    parser.add_argument("--max-workers", type=int, default=256, help="open-loop in-flight request cap")
+    parser.add_argument("--requests", type=int, default=0, help="stop after N requests (corpus is cycled)")
+    parser.add_argument("--duration", type=float, default=0, help="stop after S seconds")
+    parser.add_argument("--warmup", type=int, default=0, help="requests sent (sequentially) and discarded first")
+    parser.add_argument("--route", default="/api/search-all", help="route for query-log lines")
+    parser.add_argument("--snapshot", help="SQLite snapshot for --in-process")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--shuffle", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default="", help="server configuration under test, copied into the report")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    if not args.requests and not args.duration:
+        args.requests = None
+    corpus = load_corpus(args.corpus, args.route)
+    if args.shuffle:
+        random.Random(args.seed).shuffle(corpus)
+    total = args.requests if args.requests is not None else len(corpus)
+    send = in_process_sender(args.snapshot) if args.in_process else http_sender(args.url, args.timeout)
+
+    warmup = Recorder()
+    for req in corpus[:args.warmup]:
+        timed_send(send, req, warmup)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    if args.concurrency:
+        model = f"closed loop, concurrency {args.concurrency}"
+        run_closed_loop(send, corpus, recorder, args.concurrency, total, args.duration)
+    else:
+        model = f"open loop, {args.rate:g} req/s ({'poisson' if args.poisson else 'uniform'})"
+        run_open_loop(send, corpus, recorder, args.rate, total, args.duration,
+                      args.max_workers, args.poisson, args.seed)
+    wall_s = time.perf_counter() - started
+
+    report = {
+        "config": {"label": args.label, "model": model, "target": "in-process" if args.in_process else args.url,
+                   "corpus": args.corpus, "corpus_size": len(corpus), "warmup": args.warmup,
+                   "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "wall_s": round(wall_s, 3),
+        **summarize(recorder.samples, wall_s),
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
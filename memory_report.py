@@ -0,0 +1,223 @@
+# ========================================
+# 🧮 Memory Footprint Report
+# ========================================
+# Where a worker's RSS goes, per loaded resource:
+#   - process:    RSS split into anonymous (heap) and file-backed (mmapped
+#                 FAISS indexes / .npy embeddings) pages, plus the peak
+#   - loads:      RSS delta and time of each heavy load as it happened
+#                 (encoder model, artifact bundles)
+#   - components: bytes reachable from each in-memory structure (model
+#                 parameters, synonym dicts, artifact bundles (description
+#                 lines, embeddings, FAISS index), reference indexes, caches). Shared objects are counted once, for the first
+#                 component that reaches them. Only modules that are already
+#                 imported are inspected; nothing is loaded for the report.
+#   - tracemalloc top allocators, on demand
+# Served on /admin/memory and logged as one line once the worker is warm.
+
+import os
+import gc
+import mmap
+import sys
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+from config import ARTIFACT_MMAP, MEMORY_TRACEMALLOC_FRAMES
+
+MB = 1024 * 1024
+
+if MEMORY_TRACEMALLOC_FRAMES:
+    tracemalloc.start(MEMORY_TRACEMALLOC_FRAMES)
+
+# ========================================
+# Process RSS
+# ========================================
+def process_memory():
+    """VmRSS / RssAnon / RssFile / VmHWM from /proc (Linux), else peak RSS from getrusage."""
+    fields = {"VmRSS": "rss", "RssAnon": "rss_anon", "RssFile": "rss_file", "VmHWM": "rss_peak"}
+    memory = {}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    memory[fields[key] + "_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        import resource
+        memory["rss_peak_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memory
+
+def rss_bytes():
+    return int(process_memory().get("rss_mb", 0) * MB)
+
+_loads = {}
+_loads_lock = threading.Lock()
+
+@contextmanager
+def measure_load(name):
+    """Record the RSS growth and duration of loading one resource (approximate under concurrent loads)."""
+    before, started = rss_bytes(), time.perf_counter()
+    try:
+        yield
+    finally:
+        with _loads_lock:
+            _loads[name] = {
+                "rss_delta_mb": round((rss_bytes() - before) / MB, 1),
+                "seconds": round(time.perf_counter() - started, 2),
+            }
+
+# ========================================
+# Reachable size of in-memory structures
+# ========================================
+def torch_module_bytes(module):
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+def faiss_index_bytes(index):
+    code_size = getattr(index, "code_size", None)
+    return int(index.ntotal * code_size) if code_size else 0
+
+def deep_sizeof(obj, seen):
+    """(heap_bytes, mapped_bytes) reachable from obj, skipping ids already in seen."""
+    heap = mapped = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (type, type(sys), threading.Thread)) or callable(o) and not hasattr(o, "parameters"):
+            continue
+        seen.add(id(o))
+        module = type(o).__module__ or ""
+        if isinstance(o, mmap.mmap):
+            mapped += len(o)  # packed corpus file, reached through the arrays viewing it
+        elif isinstance(o, memoryview):
+            stack.append(o.obj)
+        elif isinstance(o, np.ndarray):
+            if isinstance(o, np.memmap):
+                mapped += o.nbytes
+            elif o.base is not None:
+                stack.append(o.base)  # view: count the array that owns the buffer
+            else:
+                heap += sys.getsizeof(o)
+        elif module.startswith("faiss"):
+            if ARTIFACT_MMAP:
+                mapped += faiss_index_bytes(o)
+            else:
+                heap += faiss_index_bytes(o)
+        elif hasattr(o, "parameters") and hasattr(o, "buffers"):
+            heap += torch_module_bytes(o)
+        else:
+            heap += sys.getsizeof(o)
+            if isinstance(o, dict):
+                stack.extend(o.keys())
+                stack.extend(o.values())
+            elif isinstance(o, (list, tuple, set, frozenset)):
+                stack.extend(o)
+            elif not isinstance(o, (str, bytes, int, float, bool)) and o is not None:
+                if hasattr(o, "__dict__"):
+                    stack.append(vars(o))
+                for slot in getattr(type(o), "__slots__", ()):
+                    if hasattr(o, slot):
+                        stack.append(getattr(o, slot))
+    return heap, mapped
+
+def _loaded(module_name, *attrs):
+    module = sys.modules.get(module_name)
+    if module is None:
+        return None
+    return [getattr(module, a) for a in attrs if getattr(module, a, None) is not None]
+
+def component_objects():
+    """(component, [objects]) for every resource whose module is loaded, heaviest first."""
+    components = []
+
+    def add(name, objs):
+        if objs:
+            components.append((name, objs))
+
+    add("encoder.model", _loaded("encoder_service", "_model"))
+    artifacts = sys.modules.get("artifacts")
+    if artifacts:
+        # Every version still referenced (an old one lingers while requests finish on it)
+        for bundle in artifacts.loaded_bundles():
+            add(f"artifacts.{bundle.taxonomy}@{bundle.version}", [bundle])
+    hsn = sys.modules.get("hsn_search_pipeline")
+    if hsn:
+        for bundle, index in list(hsn._word_indexes.items()):
+            add(f"hsn.word_index@{bundle.version}", [index])
+    hierarchical = sys.modules.get("hierarchical_search")
+    if hierarchical:
+        for bundle, index in list(hierarchical._indexes.items()):
+            add(f"hierarchical.{bundle.taxonomy}@{bundle.version}", [index])
+    add("nic.synonyms", _loaded("nic_search_pipeline", "synonym_dict", "keyword_to_section"))
+    add("npcms.synonyms", _loaded("npcms_search_pipeline", "cpm_synonym", "cpm_synonym_fuzzy", "npcms_except", "npcms_except_p"))
+    for module_name in ("hierarchy_index", "typeahead", "code_index"):
+        module = sys.modules.get(module_name)
+        for taxonomy, index in list(getattr(module, "_indexes", {}).items()):
+            add(f"{module_name}.{taxonomy}", [index])
+    add("crosswalk", _loaded("crosswalk_index", "_crosswalk"))
+    add("encoder.cache", _loaded("encoder_service", "_cache"))
+    return components
+
+def component_sizes():
+    seen = set()
+    sizes = {}
+    for name, objs in component_objects():
+        heap = mapped = 0
+        for obj in objs:
+            h, m = deep_sizeof(obj, seen)
+            heap, mapped = heap + h, mapped + m
+        sizes[name] = {"heap_mb": round(heap / MB, 2), "mapped_mb": round(mapped / MB, 2)}
+    return sizes
+
+# ========================================
+# tracemalloc
+# ========================================
+def top_allocations(limit=25):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(MEMORY_TRACEMALLOC_FRAMES or 1)
+        return {"tracing": True, "note": "tracing started now; only later allocations are attributed"}
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ])
+    traced, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": True,
+        "traced_mb": round(traced / MB, 2),
+        "traced_peak_mb": round(peak / MB, 2),
+        "top": [
+            {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             "size_mb": round(stat.size / MB, 3), "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:limit]
+        ],
+    }
+
+def stop_tracing():
+    tracemalloc.stop()
+    return {"tracing": False}
+
+# ========================================
+# Report
+# ========================================
+def memory_report(tracemalloc_top=0):
+    gc.collect()
+    components = component_sizes()
+    with _loads_lock:
+        loads = dict(_loads)
+    return {
+        "pid": os.getpid(),
+        "process": process_memory(),
+        "accounted_heap_mb": round(sum(c["heap_mb"] for c in components.values()), 1),
+        "accounted_mapped_mb": round(sum(c["mapped_mb"] for c in components.values()), 1),
+        "components": components,
+        "loads": loads,
+        "tracemalloc": top_allocations(tracemalloc_top) if tracemalloc_top else None,
+    }
+
+def log_memory_summary(top=8):
+    process = process_memory()
+    components = sorted(component_sizes().items(), key=lambda c: c[1]["heap_mb"] + c[1]["mapped_mb"], reverse=True)
+    parts = [f"{name} {c['heap_mb']:.0f}MB" + (f" (+{c['mapped_mb']:.0f}MB mapped)" if c["mapped_mb"] else "")
+             for name, c in components[:top]]
+    print(f"🧮 Memory pid {os.getpid()}: RSS {process.get('rss_mb', '?')}MB "
+          f"(anon {process.get('rss_anon_mb', '?')}MB, file {process.get('rss_file_mb', '?')}MB) | " + ", ".join(parts))
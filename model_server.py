@@ -0,0 +1,129 @@
+# ========================================
+# 🛰️ Local Model Server (encoder + FAISS indexes)
+# ========================================
+# Run one per host next to the web workers:
+#
+#     export MODEL_SERVER_AUTHKEY=$(python -c 'import secrets; print(secrets.token_hex(16))')
+#     MODEL_SERVER_SOCKET=/tmp/iiopc-model.sock python model_server.py
+#     MODEL_SERVER_SOCKET=/tmp/iiopc-model.sock gunicorn app:app
+#
+# The server owns the only SentenceTransformer and the FAISS indexes. Web
+# workers started with the same MODEL_SERVER_SOCKET route encode_many() and
+# vector_store.search() here over a Unix socket, so they carry no model memory
+# and never import torch. Requests are pickled, so both sides must share a
+# secret MODEL_SERVER_AUTHKEY (config.py refuses to start without one).
+
+import os
+import threading
+import queue
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from config import MODEL_SERVER_SOCKET, MODEL_SERVER_AUTHKEY, MODEL_SERVER_POOL_SIZE
+
+# ========================================
+# Client shim (used by encoder_service / vector_store)
+# ========================================
+class ModelServerClient:
+    def __init__(self, address, authkey, pool_size):
+        self.address = address
+        self.authkey = authkey
+        # multiprocessing connections are not thread-safe; each call borrows one
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _call(self, *message):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        try:
+            conn.send(message)
+            status, payload = conn.recv()
+        except (EOFError, OSError):
+            # Server restarted: drop the stale connection and retry once
+            conn.close()
+            conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            conn.send(message)
+            status, payload = conn.recv()
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        if status != "ok":
+            raise RuntimeError(f"model server error: {payload}")
+        return payload
+
+    def encode(self, texts):
+        return self._call("encode", list(texts))
+
+    def search(self, name, query_vectors, k, version=None):
+        return self._call("search", name, query_vectors, k, version)
+
+    def ping(self):
+        return self._call("ping")
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ModelServerClient(MODEL_SERVER_SOCKET, MODEL_SERVER_AUTHKEY, MODEL_SERVER_POOL_SIZE)
+    return _client
+
+# ========================================
+# Server
+# ========================================
+def _handle(conn):
+    from encoder_service import encode_many_local
+    from vector_store import search_local
+
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            op, args = message[0], message[1:]
+            try:
+                if op == "encode":
+                    reply = ("ok", encode_many_local(args[0]))
+                elif op == "search":
+                    reply = ("ok", search_local(*args))
+                elif op == "ping":
+                    reply = ("ok", "pong")
+                else:
+                    reply = ("error", f"unknown op {op!r}")
+            except Exception as exc:
+                reply = ("error", repr(exc))
+            conn.send(reply)
+
+def serve(address=MODEL_SERVER_SOCKET):
+    from encoder_service import get_model
+    from vector_store import get_index
+    from artifacts import INDEX_NAMES, start_artifact_watch
+
+    # Load everything up front so the first request does not pay for it
+    get_model()
+    for name in INDEX_NAMES:
+        get_index(name)
+    start_artifact_watch()
+
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address, family="AF_UNIX", authkey=MODEL_SERVER_AUTHKEY)
+    print(f"🛰️ Model server listening on {address}")
+    # Each web-worker connection gets a thread; concurrent encodes meet in the micro-batcher
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError, AuthenticationError) as exc:
+            print(f"⚠️ Rejected model server connection: {exc!r}")
+            continue
+        threading.Thread(target=_handle, args=(conn,), daemon=True).start()
+
+if __name__ == "__main__":
+    if not MODEL_SERVER_SOCKET:
+        raise SystemExit("Set MODEL_SERVER_SOCKET to the Unix socket path to serve on.")
+    serve()
@@ -1,25 +1,24 @@
 # nco_api.py
 
-from flask import Flask, request, jsonify
-from nco_search_pipeline import search
-from flask_cors import CORS
-import mysql.connector
-from config import DB_CONFIG
-
-app = Flask(__name__)
-CORS(app)
-
-# MySQL connection
-conn = mysql.connector.connect(
-    host=DB_CONFIG["host"],
-    port=DB_CONFIG["port"],
-    user=DB_CONFIG["user"],
-    password=DB_CONFIG["password"],
-    database=DB_CONFIG["database"],
-    ssl_ca=DB_CONFIG["ssl_ca"]
-)
-
-@app.route("/api/nco-dropdown/<level>", methods=["GET"])
+from flask import Blueprint, request, jsonify
+from nco_search_pipeline import search, fast_path_results
+from hierarchy_index import get_hierarchy
+from api_utils import read_batch_codes, read_limit, read_search_mode, code_validator
+from hybrid import hybrid_search
+from typeahead import get_typeahead
+from code_index import truncation
+from deadline import deadline_from_request
+from config import TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT
+from db import connect
+
+nco_bp = Blueprint("nco", __name__)
+
+invalid_family_code = code_validator((4,), "Invalid family code")
+
+# Database connection (MySQL or the local snapshot, see DB_BACKEND)
+conn = connect()
+
+@nco_bp.route("/api/nco-dropdown/<level>", methods=["GET"])
 def nco_dropdown(level):
     parent = request.args.get("parent")
     cursor = conn.cursor(dictionary=True)
@@ -39,13 +38,16 @@ def nco_dropdown(level):
 
     return jsonify(cursor.fetchall())
 
-@app.route("/api/nco-search", methods=["GET"])
-def nco_search():
-    query = request.args.get("query", "").strip()
-    if not query:
-        return jsonify({"error": "Query is required"}), 400
-
-    results = search(query)
+def nco_search_results(query, deadline=None, mode="cascade", fusion=None):
+    extra = {}
+    fast = fast_path_results(query) if mode != "hybrid" else None
+    if fast:
+        results, total = fast
+        extra = truncation(results, total)
+    elif mode == "hybrid":
+        results = [{**r, "method": r["source"]} for r in hybrid_search("nco", query, 5, fusion, deadline=deadline)]
+    else:
+        results = search(query, deadline)
     formatted = []
     for r in results:
         conf = r.get("confidence", 0)
@@ -53,26 +55,45 @@ def nco_search():
         formatted.append({
             "nco_2015": r["nco_2015"],
             "nco_description": r["nco_description"],
-            "nco_2004": r.get("nco_2004", ""),
+            "nco_2004": r.get("nco_2004") or "",
             "confidence": conf,
             "method": r["method"],
             "color": color
         })
-    return jsonify({"results": formatted})
+    return {"results": formatted, **extra}
+
+@nco_bp.route("/api/nco-search", methods=["GET"])
+def nco_search():
+    query = request.args.get("query", "").strip()
+    if not query:
+        return jsonify({"error": "Query is required"}), 400
+    mode, fusion, error = read_search_mode()
+    if error:
+        return jsonify({"error": error}), 400
+
+    deadline = deadline_from_request()
+    return jsonify({**nco_search_results(query, deadline, mode, fusion), "mode": mode, **deadline.report()})
 
 
-@app.route("/api/nco-lookup", methods=["GET"])
+@nco_bp.route("/api/nco-lookup", methods=["GET"])
 def nco_lookup():
     code = request.args.get("code")
-    if not code or len(code) != 4:
-        return jsonify({"error": "Invalid family code"}), 400
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT family_name FROM nco_family WHERE family_code = %s", (code,))
-    fam = cursor.fetchone()
-    cursor.execute("SELECT nco_2015, nco_description FROM nco_code WHERE family_code = %s", (code,))
-    rows = cursor.fetchall()
-    return jsonify({
-        "family_code": code,
-        "family_description": fam["family_name"] if fam else "Not found",
-        "nco_2015_list": rows if rows else "No NCO 2015 codes found under this family."
-    })
+    error = invalid_family_code(code)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(get_hierarchy("nco").lookup(code))
+
+
+@nco_bp.route("/api/nco-lookup/batch", methods=["GET", "POST"])
+def nco_lookup_batch():
+    codes, error = read_batch_codes(invalid_family_code)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify({"results": get_hierarchy("nco").lookup_many(codes)})
+
+
+@nco_bp.route("/api/nco-typeahead", methods=["GET"])
+def nco_typeahead():
+    q = request.args.get("q", "")
+    limit = read_limit(TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT)
+    return jsonify({"query": q, "suggestions": get_typeahead("nco").complete(q, limit)})
@@ -1,74 +1,60 @@
-import re
-import mysql.connector
-from sentence_transformers import SentenceTransformer, util
 from collections import defaultdict
 from datetime import datetime
 import numpy as np
-import faiss
-from config import DB_CONFIG
+from db import get_pool
+from encoder_service import encode, encode_many
+import vector_store
+from artifacts import current_bundle
+from code_index import fast_path
+from deadline import Deadline
+from text_processing import analyze, boolean_prefix_query
 
 # =======================================
 # 📦 Load Models and Resources
 # =======================================
-model = SentenceTransformer("all-mpnet-base-v2")
-
-faiss_index = faiss.read_index("nco_faiss.index")
-
 LOG_FILE = "nco_search_logs.jsonl"
 
-# =======================================
-# 🔌 MySQL Connection
-# =======================================
-def connect_mysql():
-    return mysql.connector.connect(
-        host=DB_CONFIG["host"],
-        port=DB_CONFIG["port"],
-        user=DB_CONFIG["user"],
-        password=DB_CONFIG["password"],
-        database=DB_CONFIG["database"],
-        ssl_ca=DB_CONFIG["ssl_ca"]
-    )
-
-conn = connect_mysql()
-cursor = conn.cursor(dictionary=True)
-
 # =======================================
 # Preprocessing
 # =======================================
 def preprocess_query(query):
-    return re.findall(r'\b\w+\b', query.lower())
+    return list(analyze(query).tokens)
 
 # =======================================
 # Expand Query using Synonyms (Simplified)
 # =======================================
 def expand_query(tokens):
-    return " ".join([f"+{word}*" for word in tokens])
+    return boolean_prefix_query(tokens)
 
 # =======================================
 # Contradiction / Negation Detection
 # =======================================
 NEGATION_WORDS = ["not", "non", "except", "other than", "excluding"]
-def is_contradictory(query, desc):
+def is_contradictory(query, desc, emb_query=None, emb_desc=None):
     for neg_word in NEGATION_WORDS:
         if neg_word in query.lower():
             after_neg = query.lower().split(neg_word, 1)[-1].strip().split()[0]
             if after_neg in desc.lower():
                 return True
-    emb_query = model.encode(query, convert_to_tensor=True)
-    emb_desc = model.encode(desc, convert_to_tensor=True)
-    sim = util.pytorch_cos_sim(emb_query, emb_desc)[0][0].item()
+    emb_query = encode(query) if emb_query is None else emb_query
+    emb_desc = encode(desc) if emb_desc is None else emb_desc
+    # numpy rather than sentence_transformers.util: web workers never import torch
+    sim = float(np.dot(emb_query, emb_desc) / max(np.linalg.norm(emb_query) * np.linalg.norm(emb_desc), 1e-12))
     return sim < 0.1
 
 # =======================================
 # Semantic Search
 # =======================================
-def semantic_search_faiss(query, codes, descs, emb_matrix):
-    query_emb = model.encode(query).astype("float32").reshape(1, -1)
-    D, I = faiss_index.search(query_emb, 10)
+def semantic_search_faiss(query, bundle):
+    codes, descs = bundle.codes, bundle.descs
+    query_emb = encode(query)
+    D, I = vector_store.search("nco", query_emb.reshape(1, -1), 10, bundle.version)
+    # One batched pass for every candidate description
+    desc_embs = encode_many([descs[i] for i in I[0]])
 
     results = []
-    for i, dist in zip(I[0], D[0]):
-        if is_contradictory(query, descs[i]):
+    for i, dist, desc_emb in zip(I[0], D[0], desc_embs):
+        if is_contradictory(query, descs[i], query_emb, desc_emb):
             continue
         score = 1 - dist  # FAISS returns L2 distance, convert to similarity
         conf = round(score * 100, 2)
@@ -88,19 +74,34 @@ def semantic_search_faiss(query, codes, descs, emb_matrix):
 # =======================================
 # Main Search
 # =======================================
-def search(query):
+def fast_path_results(query):
+    """(results, total matches) for a code prefix / exact description query, or None."""
+    kind, rows, total = fast_path("nco", query)
+    if not kind:
+        return None
+    return [{**r, "nco_2004": r.get("nco_2004") or "", "confidence": 100.0, "method": kind.upper()} for r in rows], total
+
+def search(query, deadline=None):
+    deadline = deadline or Deadline()
+    # Code prefix / exact description fast path
+    fast = fast_path_results(query)
+    if fast:
+        return fast[0]
+
     tokens = preprocess_query(query)
     boolean_query = expand_query(tokens)
 
-    cursor.execute("""
-        SELECT nco_2015, nco_description, nco_2004,
-        MATCH(nco_description) AGAINST (%s IN BOOLEAN MODE) AS score
-        FROM nco_code
-        WHERE MATCH(nco_description) AGAINST (%s IN BOOLEAN MODE)
-        ORDER BY score DESC LIMIT 20
-    """, (boolean_query, boolean_query))
+    # Pooled connection per call: concurrent requests never share one
+    with deadline.stage("nco.boolean"), get_pool().cursor() as cur:
+        cur.execute("""
+            SELECT nco_2015, nco_description, nco_2004,
+            MATCH(nco_description) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM nco_code
+            WHERE MATCH(nco_description) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY score DESC LIMIT 20
+        """, (boolean_query, boolean_query))
+        rows = cur.fetchall()
 
-    rows = cursor.fetchall()
     if rows:
         for row in rows:
             row["confidence"] = min(100, round(row["score"] * 10, 2))
@@ -108,12 +109,11 @@ def search(query):
         top_conf = rows[0]['confidence']
         return [r for r in rows if abs(r['confidence'] - top_conf) <= 0.5][:5]
 
-    # Fallback to semantic search if no Boolean match
-    desc_lines = [line.strip() for line in open("nco_2015_descriptions.txt", encoding="utf-8")]
-    codes = [line.split(" ||| ")[0] for line in desc_lines]
-    descs = [line.split(" ||| ")[1] for line in desc_lines]
-    embeddings = np.load("nco_2015_embeddings.npy")
-    return semantic_search_faiss(query, codes, descs, embeddings)
+    # Fallback to semantic search if no Boolean match (and the budget still allows it)
+    if not deadline.allows("nco.semantic"):
+        return []
+    with deadline.stage("nco.semantic"):
+        return semantic_search_faiss(query, current_bundle("nco"))
 
 # =======================================
 # Display Result
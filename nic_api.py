@@ -1,60 +1,63 @@
 # nic_api.py
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, request, jsonify
 from nic_search_pipeline import run_search
-from flask_cors import CORS
-import mysql.connector
-from config import DB_CONFIG
+from hierarchy_index import get_hierarchy
+from api_utils import read_batch_codes, read_limit, read_search_mode, code_validator
+from hybrid import hybrid_search
+from typeahead import get_typeahead
+from code_index import fast_path, truncation
+from deadline import Deadline, deadline_from_request
+from config import TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT
+from db import connect
 
-app = Flask(__name__)
-CORS(app)
+nic_bp = Blueprint("nic", __name__)
 
-# Connect to DB
-conn = mysql.connector.connect(
-    host=DB_CONFIG["host"],
-    port=DB_CONFIG["port"],
-    user=DB_CONFIG["user"],
-    password=DB_CONFIG["password"],
-    database=DB_CONFIG["database"],
-    ssl_ca=DB_CONFIG["ssl_ca"]
-)
-
-@app.route("/api/nic-search", methods=["GET"])
-def api_nic_search():
-    query = request.args.get("query", "").strip()
-    if not query:
-        return jsonify({"error": "Query is required"}), 400
+invalid_subclass_code = code_validator((5,), "Invalid subclass code")
 
-    print(f"📥 Received NIC search query: {query}")
+# Connect to DB
+conn = connect()
+
+def nic_hybrid_results(query, fusion=None, deadline=None):
+    results = []
+    for r in hybrid_search("nic", query, 3, fusion, deadline=deadline):
+        conf = r["confidence"]
+        results.append({
+            "code": r["subclass_code"],
+            "description": r["subclass_description"],
+            "confidence": conf,
+            "color": "GREEN" if conf >= 65 else ("YELLOW" if conf >= 35 else "RED"),
+            "source": r["source"]
+        })
+    return {"results": results}
+
+def nic_search_results(query, deadline=None, mode="cascade", fusion=None):
+    if mode == "hybrid":
+        return nic_hybrid_results(query, fusion, deadline)
+    from nic_search_pipeline import preprocess_query, expand_query, expand_semantic_query, boolean_search, semantic_search, keyword_to_section
+    deadline = deadline or Deadline()
     log = {"results": []}
 
-    def capture_results(query):
-        from nic_search_pipeline import preprocess_query, expand_query, boolean_search, semantic_search, synonym_dict, keyword_to_section
-        tokens = preprocess_query(query)
-        boolean_query = expand_query(tokens)
+    kind, rows, total = fast_path("nic", query)
+    if kind:
+        log.update(truncation(rows, total))
+        for r in rows:
+            log["results"].append({
+                "code": r["subclass_code"],
+                "description": r["subclass_description"],
+                "confidence": 100.0,
+                "color": "GREEN",
+                "source": kind.upper()
+            })
+        return log
 
-        boolean_results = boolean_search(boolean_query)
-        if boolean_results:
-            for r in boolean_results:
-                conf_pct = r["confidence"] * 100
-                color = "GREEN" if conf_pct >= 65 else ("YELLOW" if conf_pct >= 35 else "RED")
-                log["results"].append({
-                    "code": r["code"],
-                    "description": r["description"],
-                    "confidence": round(conf_pct, 2),
-                    "color": color,
-                    "source": "BOOLEAN"
-                })
-            return log
-
-        section_hint = next((keyword_to_section[t] for t in tokens if t in keyword_to_section), None)
-        expanded_query = " ".join(set(tokens).union(*[synonym_dict.get(t, []) for t in tokens]))
-        semantic_results = semantic_search(expanded_query, section_hint)
-
-        if not semantic_results and section_hint:
-            semantic_results = semantic_search(expanded_query)
+    tokens = preprocess_query(query)
+    boolean_query = expand_query(tokens)
 
-        for r in semantic_results:
+    with deadline.stage("nic.boolean"):
+        boolean_results = boolean_search(boolean_query)
+    if boolean_results:
+        for r in boolean_results:
             conf_pct = r["confidence"] * 100
             color = "GREEN" if conf_pct >= 65 else ("YELLOW" if conf_pct >= 35 else "RED")
             log["results"].append({
@@ -62,16 +65,51 @@ def api_nic_search():
                 "description": r["description"],
                 "confidence": round(conf_pct, 2),
                 "color": color,
-                "source": "SBERT"
+                "source": "BOOLEAN"
             })
-
         return log
 
-    results = capture_results(query)
-    return jsonify(results)
+    section_hint = next((keyword_to_section[t] for t in tokens if t in keyword_to_section), None)
+    expanded_query = expand_semantic_query(tokens)
+    semantic_results = []
+    if deadline.allows("nic.semantic"):
+        with deadline.stage("nic.semantic"):
+            semantic_results = semantic_search(expanded_query, section_hint)
+
+    if not semantic_results and section_hint and deadline.allows("nic.semantic"):
+        with deadline.stage("nic.semantic"):
+            semantic_results = semantic_search(expanded_query)
 
+    for r in semantic_results:
+        conf_pct = r["confidence"] * 100
+        color = "GREEN" if conf_pct >= 65 else ("YELLOW" if conf_pct >= 35 else "RED")
+        log["results"].append({
+            "code": r["code"],
+            "description": r["description"],
+            "confidence": round(conf_pct, 2),
+            "color": color,
+            "source": "SBERT"
+        })
 
-@app.route("/api/nic-dropdown/<level>", methods=["GET"])
+    return log
+
+
+@nic_bp.route("/api/nic-search", methods=["GET"])
+def api_nic_search():
+    query = request.args.get("query", "").strip()
+    if not query:
+        return jsonify({"error": "Query is required"}), 400
+
+    mode, fusion, error = read_search_mode()
+    if error:
+        return jsonify({"error": error}), 400
+
+    print(f"📥 Received NIC search query: {query}")
+    deadline = deadline_from_request()
+    return jsonify({**nic_search_results(query, deadline, mode, fusion), "mode": mode, **deadline.report()})
+
+
+@nic_bp.route("/api/nic-dropdown/<level>", methods=["GET"])
 def get_dropdown(level):
     parent = request.args.get("parent")
     cursor = conn.cursor(dictionary=True)
@@ -93,7 +131,7 @@ def get_dropdown(level):
     return jsonify(results)
 
 
-@app.route("/api/nic-description", methods=["GET"])
+@nic_bp.route("/api/nic-description", methods=["GET"])
 def get_subclass_description():
     code = request.args.get("code")
     if not code:
@@ -108,22 +146,27 @@ def get_subclass_description():
     return jsonify({"error": "Subclass not found"}), 404
 
 
-@app.route("/api/nic-lookup", methods=["GET"])
+@nic_bp.route("/api/nic-lookup", methods=["GET"])
 def nic_lookup():
     code = request.args.get("code")
-    if not code or len(code) != 5:
-        return jsonify({"error": "Invalid subclass code"}), 400
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT s.section_code, s.section_name, d.division_code, d.division_name,
-               g.group_code, g.group_name, c.class_code, c.class_name,
-               sc.subclass_code, sc.subclass_description
-        FROM nic_subclass sc
-        JOIN nic_class c ON sc.class_code = c.class_code
-        JOIN nic_group g ON c.group_code = g.group_code
-        JOIN nic_division d ON g.division_code = d.division_code
-        JOIN nic_section s ON d.section_code = s.section_code
-        WHERE sc.subclass_code = %s
-    """, (code,))
-    row = cursor.fetchone()
+    error = invalid_subclass_code(code)
+    if error:
+        return jsonify({"error": error}), 400
+    row = get_hierarchy("nic").lookup(code)
     return jsonify(row or {"error": "Code not found"})
+
+
+@nic_bp.route("/api/nic-lookup/batch", methods=["GET", "POST"])
+def nic_lookup_batch():
+    codes, error = read_batch_codes(invalid_subclass_code)
+    if error:
+        return jsonify({"error": error}), 400
+    rows = get_hierarchy("nic").lookup_many(codes)
+    return jsonify({"results": [row or {"subclass_code": code, "error": "Code not found"} for code, row in zip(codes, rows)]})
+
+
+@nic_bp.route("/api/nic-typeahead", methods=["GET"])
+def nic_typeahead():
+    q = request.args.get("q", "")
+    limit = read_limit(TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT)
+    return jsonify({"query": q, "suggestions": get_typeahead("nic").complete(q, limit)})
@@ -1,33 +1,17 @@
 # ========================================
 # 📦 Imports
 # ========================================
-import re
-import torch
-import mysql.connector
 from datetime import datetime
-from sentence_transformers import SentenceTransformer, util
 import numpy as np
-from config import DB_CONFIG
+from db import connect, get_pool
+from encoder_service import encode
+from artifacts import current_bundle
+from text_processing import analyze, boolean_prefix_query
 
 # ========================================
-# 🧠 Load Models and Resources
+# 🔌 Database Connection (MySQL or the local snapshot, see DB_BACKEND)
 # ========================================
-model = SentenceTransformer('all-mpnet-base-v2')
-
-# ========================================
-# 🔌 MySQL Connection
-# ========================================
-def connect_mysql():
-    return mysql.connector.connect(
-        host=DB_CONFIG["host"],
-        port=DB_CONFIG["port"],
-        user=DB_CONFIG["user"],
-        password=DB_CONFIG["password"],
-        database=DB_CONFIG["database"],
-        ssl_ca=DB_CONFIG["ssl_ca"]
-    )
-
-conn = connect_mysql()
+conn = connect()
 cursor = conn.cursor(dictionary=True)
 
 # ========================================
@@ -59,7 +43,7 @@ keyword_to_section = load_keyword_to_section()
 # Preprocessing
 # ========================================
 def preprocess_query(query):
-    return re.findall(r'\b\w+\b', query.lower())
+    return list(analyze(query).tokens)
 
 # ========================================
 # Expand Query with Synonyms
@@ -68,7 +52,11 @@ def expand_query(tokens):
     expanded = set(tokens)
     for token in tokens:
         expanded.update(synonym_dict.get(token, []))
-    return " ".join([f"+{word}*" for word in expanded])
+    return boolean_prefix_query(sorted(expanded))
+
+def expand_semantic_query(tokens):
+    """Synonym-expanded text that the NIC semantic step encodes (sorted, so equal queries share a cache key)."""
+    return " ".join(sorted(set(tokens).union(*[synonym_dict.get(t, []) for t in tokens])))
 
 # ========================================
 # TEMPORARY: For NPCMS → NIC Mapping
@@ -76,14 +64,12 @@ def expand_query(tokens):
 
 def semantic_search_by_class(query, allowed_class_code):
     """Restrict semantic search to a specific NIC class code."""
-    desc_lines = [line.strip() for line in open("nic_subclass_descriptions.txt", encoding="utf-8")]
-    codes = [line.split(" ||| ")[0] for line in desc_lines]
-    descs = [line.split(" ||| ")[1] for line in desc_lines]
-    desc_embs = np.load("nic_subclass_embeddings.npy")
-    query_emb = model.encode(query, convert_to_tensor=True)
+    bundle = current_bundle("nic")
+    codes, descs = bundle.codes, bundle.descs
+    query_emb = encode(query)
 
     results = []
-    for i, score in enumerate(util.pytorch_cos_sim(query_emb, desc_embs)[0]):
+    for i, score in enumerate(bundle.cosine_scores(query_emb)):
         if str(codes[i])[:4] != str(allowed_class_code):
             continue
         results.append({
@@ -107,8 +93,9 @@ def boolean_search(query):
         ORDER BY score DESC
         LIMIT 20
     """
-    cursor.execute(sql, (query, query))
-    results = cursor.fetchall()
+    with get_pool().cursor() as cur:  # per call: concurrent requests never share a connection
+        cur.execute(sql, (query, query))
+        results = cur.fetchall()
 
     formatted = []
     if results:
@@ -129,13 +116,11 @@ def boolean_search(query):
 # Semantic Search
 # ========================================
 def semantic_search(query, section_code=None):
-    desc_lines = [line.strip() for line in open("nic_subclass_descriptions.txt", encoding="utf-8")]
-    codes = [line.split(" ||| ")[0] for line in desc_lines]
-    descs = [line.split(" ||| ")[1] for line in desc_lines]
-    desc_embs = np.load("nic_subclass_embeddings.npy")
-    query_emb = model.encode(query, convert_to_tensor=True)
+    bundle = current_bundle("nic")
+    codes, descs = bundle.codes, bundle.descs
+    query_emb = encode(query)
     
-    scores = util.pytorch_cos_sim(query_emb, desc_embs)[0]
+    scores = bundle.cosine_scores(query_emb)
 
     results = []
     for i, score in enumerate(scores):
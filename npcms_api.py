@@ -1,24 +1,22 @@
 # npcms_api.py
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, request, jsonify
 from npcms_search_pipeline import run_npcms_search
-from flask_cors import CORS
-import mysql.connector
-from config import DB_CONFIG
-
-app = Flask(__name__)
-CORS(app)
-
-conn = mysql.connector.connect(
-    host=DB_CONFIG["host"],
-    port=DB_CONFIG["port"],
-    user=DB_CONFIG["user"],
-    password=DB_CONFIG["password"],
-    database=DB_CONFIG["database"],
-    ssl_ca=DB_CONFIG["ssl_ca"]
-)
-
-@app.route("/api/npcms-dropdown/<level>", methods=["GET"])
+from hierarchy_index import get_hierarchy
+from api_utils import read_batch_codes, read_limit, read_search_mode, code_validator
+from hybrid import hybrid_search
+from typeahead import get_typeahead
+from deadline import deadline_from_request
+from config import TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT
+from db import connect
+
+npcms_bp = Blueprint("npcms", __name__)
+
+invalid_product_code = code_validator((7,), "Invalid product code")
+
+conn = connect()
+
+@npcms_bp.route("/api/npcms-dropdown/<level>", methods=["GET"])
 def npcms_dropdown(level):
     parent = request.args.get("parent")
     cursor = conn.cursor(dictionary=True)
@@ -40,14 +38,12 @@ def npcms_dropdown(level):
 
     return jsonify(cursor.fetchall())
 
-@app.route("/api/npcms-search", methods=["GET"])
-def npcms_search():
-    query = request.args.get("query", "").strip()
-    category = request.args.get("category", "").strip()
-    if not query or category not in {"chemical", "other"}:
-        return jsonify({"error": "Both query and valid category (chemical/other) are required"}), 400
-
-    results = run_npcms_search(query, "1" if category == "chemical" else "2")
+def npcms_search_results(query, category, deadline=None, mode="cascade", fusion=None):
+    if mode == "hybrid":
+        is_cpm = 1 if category == "chemical" else 0
+        results = {"results": hybrid_search("npcms", query, 5, fusion, is_cpm, deadline)}
+    else:
+        results = run_npcms_search(query, "1" if category == "chemical" else "2", deadline)
     formatted = []
     for r in results.get("results", []):
         conf = r.get("confidence", 0)
@@ -55,31 +51,50 @@ def npcms_search():
         formatted.append({
             "code": r.get("product_code"),
             "description": r.get("product_description"),
-            "unit": r.get("unit", ""),
+            "unit": r.get("unit") or "",
             "confidence": conf,
             "color": color,
             "source": r.get("source")
         })
-    return jsonify({"results": formatted})
+    # Fast-path answers say whether they were capped at CODE_PREFIX_MAX_ROWS
+    return {"results": formatted, **{k: results[k] for k in ("total", "truncated") if k in results}}
+
+@npcms_bp.route("/api/npcms-search", methods=["GET"])
+def npcms_search():
+    query = request.args.get("query", "").strip()
+    category = request.args.get("category", "").strip()
+    if not query or category not in {"chemical", "other"}:
+        return jsonify({"error": "Both query and valid category (chemical/other) are required"}), 400
+
+    mode, fusion, error = read_search_mode()
+    if error:
+        return jsonify({"error": error}), 400
 
+    deadline = deadline_from_request()
+    return jsonify({**npcms_search_results(query, category, deadline, mode, fusion), "mode": mode, **deadline.report()})
 
-@app.route("/api/npcms-lookup", methods=["GET"])
+
+@npcms_bp.route("/api/npcms-lookup", methods=["GET"])
 def npcms_lookup():
     code = request.args.get("code")
-    if not code or len(code) != 7:
-        return jsonify({"error": "Invalid product code"}), 400
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT s.section_code, s.section_description, d.division_code, d.division_description,
-               g.group_code, g.group_description, c.class_code, c.class_description,
-               sb.subclass_code, sb.subclass_description, p.product_code, p.product_description
-        FROM npcms_product p
-        JOIN npcms_subclass sb ON p.subclass_code = sb.subclass_code
-        JOIN npcms_class c ON sb.class_code = c.class_code
-        JOIN npcms_group g ON c.group_code = g.group_code
-        JOIN npcms_division d ON g.division_code = d.division_code
-        JOIN npcms_section s ON d.section_code = s.section_code
-        WHERE p.product_code = %s
-    """, (code,))
-    row = cursor.fetchone()
+    error = invalid_product_code(code)
+    if error:
+        return jsonify({"error": error}), 400
+    row = get_hierarchy("npcms").lookup(code)
     return jsonify(row or {"error": "Code not found"})
+
+
+@npcms_bp.route("/api/npcms-lookup/batch", methods=["GET", "POST"])
+def npcms_lookup_batch():
+    codes, error = read_batch_codes(invalid_product_code)
+    if error:
+        return jsonify({"error": error}), 400
+    rows = get_hierarchy("npcms").lookup_many(codes)
+    return jsonify({"results": [row or {"product_code": code, "error": "Code not found"} for code, row in zip(codes, rows)]})
+
+
+@npcms_bp.route("/api/npcms-typeahead", methods=["GET"])
+def npcms_typeahead():
+    q = request.args.get("q", "")
+    limit = read_limit(TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT)
+    return jsonify({"query": q, "suggestions": get_typeahead("npcms").complete(q, limit)})
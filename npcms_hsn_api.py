@@ -1,38 +1,58 @@
-@app.route("/api/npcms-to-hsn", methods=["GET"])
+# npcms_hsn_api.py
+
+from flask import Blueprint, request, jsonify
+from crosswalk_index import get_crosswalk
+from api_utils import read_batch_codes
+
+npcms_hsn_bp = Blueprint("npcms_hsn", __name__)
+
+@npcms_hsn_bp.route("/api/npcms-to-hsn", methods=["GET"])
 def npcms_to_hsn():
     code = request.args.get("code")
     if not code or len(code) != 7:
         return jsonify({"error": "Invalid NPCMS product code"}), 400
 
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT h.national_code, n.national_description, h.confidence
-        FROM npcms_hsn h
-        JOIN hsn_national n ON h.national_code = n.national_code
-        WHERE h.product_code = %s
-        ORDER BY h.confidence DESC
-    """, (code,))
-    rows = cursor.fetchall()
-
+    rows = get_crosswalk().hsn_for_product(code)
     return jsonify({"product_code": code, "matches": rows})
 
 
-@app.route("/api/hsn-to-npcms", methods=["GET"])
+@npcms_hsn_bp.route("/api/hsn-to-npcms", methods=["GET"])
 def hsn_to_npcms():
     code = request.args.get("code")
     if not code or len(code) != 8:
         return jsonify({"error": "Invalid HSN/ITCHS national code"}), 400
 
-    cursor = conn.cursor(dictionary=True)
+    rows = get_crosswalk().npcms_for_national(code)
+    return jsonify({"national_code": code, "matches": rows})
 
-    cursor.execute("""
-        SELECT h.product_code, p.product_description, h.confidence
-        FROM npcms_hsn h
-        JOIN npcms_product p ON h.product_code = p.product_code
-        WHERE h.national_code = %s
-        ORDER BY h.confidence DESC
-    """, (code,))
-    rows = cursor.fetchall()
 
-    return jsonify({"national_code": code, "matches": rows})
+@npcms_hsn_bp.route("/api/npcms-to-hsn/batch", methods=["GET", "POST"])
+def npcms_to_hsn_batch():
+    codes, error = read_batch_codes()
+    if error:
+        return jsonify({"error": error}), 400
+
+    crosswalk = get_crosswalk()
+    results = []
+    for code in codes:
+        if len(code) != 7:
+            results.append({"product_code": code, "error": "Invalid NPCMS product code"})
+        else:
+            results.append({"product_code": code, "matches": crosswalk.hsn_for_product(code)})
+    return jsonify({"results": results})
+
+
+@npcms_hsn_bp.route("/api/hsn-to-npcms/batch", methods=["GET", "POST"])
+def hsn_to_npcms_batch():
+    codes, error = read_batch_codes()
+    if error:
+        return jsonify({"error": error}), 400
+
+    crosswalk = get_crosswalk()
+    results = []
+    for code in codes:
+        if len(code) != 8:
+            results.append({"national_code": code, "error": "Invalid HSN/ITCHS national code"})
+        else:
+            results.append({"national_code": code, "matches": crosswalk.npcms_for_national(code)})
+    return jsonify({"results": results})
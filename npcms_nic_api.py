@@ -1,29 +1,55 @@
-@app.route("/api/npcms-to-nic", methods=["GET"])
+# npcms_nic_api.py
+
+from flask import Blueprint, request, jsonify
+from crosswalk_index import get_crosswalk
+from api_utils import read_batch_codes
+
+npcms_nic_bp = Blueprint("npcms_nic", __name__)
+
+@npcms_nic_bp.route("/api/npcms-to-nic", methods=["GET"])
 def npcms_to_nic():
     code = request.args.get("code")
     if not code or len(code) != 7:
         return jsonify({"error": "Invalid NPCMS product code"}), 400
 
-    cursor = conn.cursor(dictionary=True)
-
-    # Get subclass from product_code
-    cursor.execute("SELECT subclass_code FROM npcms_product WHERE product_code = %s", (code,))
-    prod = cursor.fetchone()
-    if not prod:
+    # Subclass of the product plus the NIC rows mapped to it
+    found = get_crosswalk().nic_for_product(code)
+    if not found:
         return jsonify({"error": "Product not found"}), 404
 
-    cursor.execute("""
-        SELECT s.section_code, s.section_name, d.division_code, d.division_name,
-               g.group_code, g.group_name, c.class_code, c.class_name,
-               sc.subclass_code, sc.subclass_description
-        FROM nic_npcms_asi map
-        JOIN nic_subclass sc ON map.nic_class_code = sc.class_code
-        JOIN nic_class c ON sc.class_code = c.class_code
-        JOIN nic_group g ON c.group_code = g.group_code
-        JOIN nic_division d ON g.division_code = d.division_code
-        JOIN nic_section s ON d.section_code = s.section_code
-        WHERE map.npcms_subclass_code = %s
-    """, (prod["subclass_code"],))
-    nic_rows = cursor.fetchall()
-
-    return jsonify({"product_code": code, "subclass_code": prod["subclass_code"], "nic_mappings": nic_rows})
+    subclass_code, nic_rows = found
+    return jsonify({"product_code": code, "subclass_code": subclass_code, "nic_mappings": nic_rows})
+
+
+@npcms_nic_bp.route("/api/npcms-to-nic/batch", methods=["GET", "POST"])
+def npcms_to_nic_batch():
+    codes, error = read_batch_codes()
+    if error:
+        return jsonify({"error": error}), 400
+
+    crosswalk = get_crosswalk()
+    results = []
+    for code in codes:
+        found = crosswalk.nic_for_product(code) if len(code) == 7 else None
+        if not found:
+            results.append({"product_code": code, "error": "Product not found" if len(code) == 7 else "Invalid NPCMS product code"})
+            continue
+        subclass_code, nic_rows = found
+        results.append({"product_code": code, "subclass_code": subclass_code, "nic_mappings": nic_rows})
+    return jsonify({"results": results})
+
+
+@npcms_nic_bp.route("/api/nic-to-npcms/batch", methods=["GET", "POST"])
+def nic_to_npcms_batch():
+    codes, error = read_batch_codes()
+    if error:
+        return jsonify({"error": error}), 400
+
+    crosswalk = get_crosswalk()
+    results = []
+    for code in codes:
+        if len(code) != 5:
+            results.append({"subclass_code": code, "error": "Invalid NIC subclass code"})
+        else:
+            results.append({"subclass_code": code, "npcms_subclass_codes": crosswalk.npcms_for_nic(code)})
+    return jsonify({"results": results})
@@ -3,38 +3,28 @@
 # ========================================
 
 # 📦 Imports
-import re
 import os
-import mysql.connector
+import time
+import logging
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextvars import copy_context
 from datetime import datetime
-from sentence_transformers import SentenceTransformer, util
-import faiss
 import numpy as np
-from config import DB_CONFIG
-
-# 🧠 Load Model and Resources
-model = SentenceTransformer("all-mpnet-base-v2")
-
-# 📥 Load FAISS + Descriptions
-FAISS_INDEX = faiss.read_index("npcms_product_faiss.index")
-with open("npcms_product_descriptions.txt", "r", encoding="utf-8") as f:
-    PRODUCT_LINES = [line.strip() for line in f if " ||| " in line]
-
-PRODUCT_CODES = [line.split(" ||| ")[0] for line in PRODUCT_LINES]
-PRODUCT_DESCS = [line.split(" ||| ")[1] for line in PRODUCT_LINES]
-
-# 🔌 MySQL Connection
-def connect_to_mysql():
-    return mysql.connector.connect(
-        host=DB_CONFIG["host"],
-        port=DB_CONFIG["port"],
-        user=DB_CONFIG["user"],
-        password=DB_CONFIG["password"],
-        database=DB_CONFIG["database"],
-        ssl_ca=DB_CONFIG["ssl_ca"]
-    )
-
-conn = connect_to_mysql()
+from config import NPCMS_PARALLEL_STAGES, NPCMS_STAGE_WORKERS, CPM_FUZZY_MAX_EDITS
+from db import connect, get_pool
+from encoder_service import encode
+import vector_store
+from artifacts import current_bundle
+from code_index import fast_path, truncation
+from deadline import Deadline
+from fuzzy_index import FuzzyIndex
+from text_processing import analyze, tokenize, stem_tokens, description_tokens, boolean_prefix_query
+
+logger = logging.getLogger(__name__)
+
+# 🔌 Database Connection (MySQL or the local snapshot, see DB_BACKEND)
+conn = connect()
 cursor = conn.cursor(dictionary=True)
 
 # 🔄 Load Synonyms and Exceptions from MySQL Tables
@@ -48,6 +38,12 @@ for row in rows:
     code = row["product_code"]
     cpm_synonym.setdefault(syn, []).append(code)
 
+# Same synonyms, looked up with typos / in any word order when the exact key misses.
+# Words of the CPM product descriptions count as correctly spelled.
+cursor.execute("SELECT product_description FROM npcms_product WHERE is_cpm = 1")
+cpm_synonym_fuzzy = FuzzyIndex(cpm_synonym, CPM_FUZZY_MAX_EDITS,
+                               (word for row in cursor.fetchall() for word in tokenize(row["product_description"] or "")))
+
 # Subclass-level exceptions
 npcms_except = {}
 cursor.execute("SELECT subclass_code, exclude_keyword FROM npcms_except")
@@ -66,6 +62,12 @@ for row in rows:
     kw = row["exclude_keyword"].lower()
     npcms_except_p.setdefault(code_p, set()).add(kw)
 
+# Product-level exclusion rules compiled into stemmed token sets keyed by product code
+npcms_except_p_rules = {
+    str(code_p): [(kw, stem_tokens(tokenize(kw))) for kw in sorted(kws)]
+    for code_p, kws in npcms_except_p.items()
+}
+
 # 🚨 Negation Words
 NEGATION_WORDS = ["not", "non", "except", "other than", "excluding"]
 
@@ -84,53 +86,44 @@ subclass_parts_accessories = {
 
 # 🔧 Helper Functions
 def build_mysql_boolean_query(terms):
-    boolean_terms = []
-    for term in terms:
-        clean = re.sub(r"[^\w\s]", "", term.lower()).strip()
-        if clean and len(clean) > 1:
-            boolean_terms.append(f"+{clean}*")
-    return " ".join(boolean_terms)
+    return boolean_prefix_query(terms, min_len=2)
 
 def expand_keywords_basic(user_query):
-    tokens = re.findall(r"\b\w+\b", user_query.lower())
-    terms = sorted(set(tokens))
+    terms = analyze(user_query).sorted_terms
     return build_mysql_boolean_query(terms), terms
 
+# Negation phrases inside product descriptions that penalize a match
+DESC_NEGATIONS = ["except", "excluding", "other than", "not including"]
+
+@lru_cache(maxsize=65536)
+def desc_negation_terms(desc_low):
+    """Token sets following each negation phrase in a description, in DESC_NEGATIONS order."""
+    return tuple(
+        frozenset(tokenize(desc_low.split(neg, 1)[-1]))
+        for neg in DESC_NEGATIONS if neg in desc_low
+    )
+
 def adjust_score(desc, raw_score, code, query=None):
     desc_low = desc.lower()
     score = raw_score
-    for neg in ["except", "excluding", "other than", "not including"]:
-        if neg in desc_low and query:
-            after = desc_low.split(neg, 1)[-1]
-            terms = re.findall(r"\b\w+\b", after)
-            if any(t in re.findall(r"\b\w+\b", query.lower()) for t in terms):
+    if query:
+        query_tokens = analyze(query).token_set
+        for terms in desc_negation_terms(desc_low):
+            if terms & query_tokens:
                 return score * 0.25
     if any(n in desc_low for n in [" not ", " non "]) and not desc_low.startswith("other ") and not str(code).endswith("9"):
         score *= 0.5
     return score
 
 def should_exclude_product(code, description, query=None):
-    def simple_stem(token):
-        if token in {"its", "this", "was", "is"}:
-            return token
-        return token[:-1] if token.endswith("s") and len(token) > 3 else token
-
-    code = str(code)
-    desc = re.sub(r"[^\w\s]", " ", description.lower())
-    desc_tokens = set(re.findall(r"\b\w+\b", desc))
-
-    if query:
-        query_tokens = set(re.findall(r"\b\w+\b", query.lower()))
-        query_tokens |= set(simple_stem(w) for w in query_tokens)
-    else:
-        query_tokens = set()
-
-    for kw in npcms_except_p.get(code, []):
-        kw_tokens = set(re.findall(r"\b\w+\b", kw.lower()))
-        kw_tokens |= set(simple_stem(w) for w in kw_tokens)
-
-        if kw_tokens & desc_tokens and kw_tokens & query_tokens:
-            print(f"⛔ Excluding {code} — matched keyword: {kw}")
+    rules = npcms_except_p_rules.get(str(code))
+    if not rules or not query:
+        return False
+
+    query_tokens = analyze(query).stemmed
+    for kw, kw_tokens in rules:
+        if kw_tokens & query_tokens and kw_tokens & description_tokens(description):
+            logger.debug("Excluding %s — matched keyword: %s", code, kw)
             return True
     return False
 
@@ -140,16 +133,34 @@ def write_log(entry):
         json.dump(entry, f, ensure_ascii=False)
         f.write("\n")
 
+def fast_path_results(query, is_cpm, log):
+    """Code prefix / exact description matches within the category; True when it answered."""
+    kind, rows, total = fast_path("npcms", query, lambda r: r["is_cpm"] == is_cpm)
+    if not kind:
+        return False
+    log.update(truncation(rows, total))
+    for r in rows:
+        log["results"].append({
+            "product_code": r["product_code"],
+            "product_description": r["product_description"],
+            "unit": r["unit"],
+            "confidence": 100.0,
+            "source": kind
+        })
+    write_log(log)
+    return True
+
 def semantic_search_faiss(query, k=5):
-    query_vec = model.encode(query, convert_to_numpy=True).astype("float32").reshape(1, -1)
-    D, I = FAISS_INDEX.search(query_vec, k)
+    bundle = current_bundle("npcms")
+    query_vec = encode(query).reshape(1, -1)
+    D, I = vector_store.search("npcms", query_vec, k, bundle.version)
 
     SCALE = 50
     results = []
 
     for idx, dist in zip(I[0], D[0]):
-        code = PRODUCT_CODES[idx]
-        desc = PRODUCT_DESCS[idx]
+        code = bundle.codes[idx]
+        desc = bundle.descs[idx]
         conf = max(0.0, 100 - dist * SCALE)
         results.append({
             "product_code": code,
@@ -163,7 +174,7 @@ def semantic_search_faiss(query, k=5):
 # ========================================
 # PHASE-I: Category Selection
 # ========================================
-def run_npcms_search(query=None, category=None):
+def run_npcms_search(query=None, category=None, deadline=None):
     if query is None:
         query = input("🔎 Enter your query: ").strip()
     if category is None:
@@ -171,90 +182,107 @@ def run_npcms_search(query=None, category=None):
         print("2️⃣ General Item (Manufactured goods)")
         category = input("➤ Enter 1 or 2: ").strip()
     if category == "1":
-        return search_cpm_item(query)
+        return search_cpm_item(query, deadline=deadline)
     elif category == "2":
-        return search_general_item(query)
+        return search_general_item(query, deadline=deadline)
     else:
         print("⚠️ Invalid category.")
         return None
+
 # ========================================
-# PHASE-II: Search CPM Items
+# Shared cascade stages
 # ========================================
-def search_cpm_item(query, top_k=5):
-    log = {"query": query, "category": "chemical", "results": []}
-    tokens = re.findall(r"\b\w+\b", query.lower())
-
-    # ✅ Step 1: Direct Synonym Match
-    matching_codes = cpm_synonym.get(query.lower(), [])
-    if matching_codes:
-        code_placeholders = ','.join(['%s'] * len(matching_codes))
-        sql = f"""
-            SELECT product_code, product_description, unit
-            FROM npcms_product
-            WHERE is_cpm = 1 AND product_code IN ({code_placeholders})
-        """
-        cursor.execute(sql, matching_codes)
-        results = cursor.fetchall()
-        for r in results:
-            if not should_exclude_product(r['product_code'], r['product_description'], query):
-                print(f"{r['product_code']} | {r['product_description']} | {r['unit']}")
-                print(f"🤖 Direct Synonym Match [GREEN]")
-                log["results"].append({**r, "confidence": 100.0, "source": "synonym_direct"})
-        write_log(log)
-        return log
-
-    # ✅ Step 2: Boolean Match
-    boolean_query, _ = expand_keywords_basic(query)
-    cursor.execute(
+def boolean_stage(cur, query, boolean_query, terms, top_k, is_cpm):
+    cur.execute(
         """
         SELECT product_code, product_description, unit, 
                MATCH(product_description) AGAINST (%s IN BOOLEAN MODE) AS score
         FROM npcms_product 
-        WHERE is_cpm = 1 
+        WHERE is_cpm = %s 
           AND MATCH(product_description) AGAINST (%s IN BOOLEAN MODE)
         ORDER BY score DESC LIMIT %s
-        """, (boolean_query, boolean_query, top_k)
+        """, (boolean_query, is_cpm, boolean_query, top_k)
     )
-    results = cursor.fetchall()
-
-    if results:
-        max_s = max(r['score'] for r in results) or 1.0
-        scored_results = []
-        for r in results:
-            raw_conf = (r['score'] / max_s) * 100
-            conf = adjust_score(r['product_description'], raw_conf, r['product_code'], query)
-            if not should_exclude_product(r['product_code'], r['product_description'], query):
-                scored_results.append({**r, "confidence": conf, "source": "boolean"})
-
-        scored_results.sort(key=lambda x: x["confidence"], reverse=True)
+    results = cur.fetchall()
+    if not results:
+        return []
+
+    max_s = max(r['score'] for r in results) or 1.0
+    scored_results = []
+    for r in results:
+        raw_conf = (r['score'] / max_s) * 100
+        conf = adjust_score(r['product_description'], raw_conf, r['product_code'], terms)
+        if not should_exclude_product(r['product_code'], r['product_description'], terms):
+            scored_results.append({**r, "confidence": conf, "source": "boolean"})
+
+    scored_results.sort(key=lambda x: x["confidence"], reverse=True)
+
+    for r in scored_results:
+        label = "GREEN" if r["confidence"] > 65 else "YELLOW" if r["confidence"] >= 35 else "RED"
+        print(f"{r['product_code']} | {r['product_description']} | {r['unit']}")
+        print(f"✅ Boolean Match Confidence: {r['confidence']:.2f}% [{label}]")
+    return scored_results
+
+def faiss_neighbours(query, k):
+    """(bundle, D, I) for the query. Encodes: call it without holding a DB connection."""
+    bundle = current_bundle("npcms")
+    emb_query = encode(query).reshape(1, -1)
+    D, I = vector_store.search("npcms", emb_query, k, bundle.version)
+    return bundle, D, I
+
+def filter_category(cur, bundle, D, I, is_cpm):
+    """FAISS neighbours restricted to one category, with a single is_cpm lookup for all of them."""
+    codes = [bundle.codes[idx] for idx in I[0]]
+    placeholders = ','.join(['%s'] * len(codes))
+    cur.execute(f"SELECT product_code, is_cpm FROM npcms_product WHERE product_code IN ({placeholders})", codes)
+    flags = {row['product_code']: row['is_cpm'] for row in cur.fetchall()}
+
+    return [(bundle.codes[idx], bundle.descs[idx], dist)
+            for idx, dist in zip(I[0], D[0]) if flags.get(bundle.codes[idx]) == is_cpm]
 
-        for r in scored_results:
-            label = "GREEN" if r["confidence"] > 65 else "YELLOW" if r["confidence"] >= 35 else "RED"
+# ========================================
+# PHASE-II: Search CPM Items
+# ========================================
+def cpm_synonym_stage(cur, query, terms):
+    matching_codes = cpm_synonym.get(query.lower(), [])
+    if not matching_codes:
+        return None  # not a known synonym: fall through to the next stage
+    return cpm_synonym_products(cur, matching_codes, terms, 100.0, "synonym_direct")
+
+def cpm_fuzzy_synonym_stage(cur, query, terms):
+    """Synonym match tolerating typos / word order; [] unless a matched product survives the exclusions."""
+    fuzzy = cpm_synonym_fuzzy.match(query)
+    if fuzzy is None:
+        return []
+    matching_codes, similarity, matched = fuzzy
+    confidence = round(similarity * 100, 2)
+    print(f"🔡 Fuzzy synonym match: {query!r} → {matched!r} ({confidence}%)")
+    return cpm_synonym_products(cur, matching_codes, terms, confidence, "synonym_fuzzy")
+
+def cpm_synonym_products(cur, matching_codes, terms, confidence, source):
+    code_placeholders = ','.join(['%s'] * len(matching_codes))
+    sql = f"""
+        SELECT product_code, product_description, unit
+        FROM npcms_product
+        WHERE is_cpm = 1 AND product_code IN ({code_placeholders})
+    """
+    cur.execute(sql, matching_codes)
+    results = []
+    for r in cur.fetchall():
+        if not should_exclude_product(r['product_code'], r['product_description'], terms):
             print(f"{r['product_code']} | {r['product_description']} | {r['unit']}")
-            print(f"✅ Boolean Match Confidence: {r['confidence']:.2f}% [{label}]")
-            log["results"].append(r)
-
-        if log["results"]:
-            write_log(log)
-            return log
+            print(f"🤖 Synonym Match ({source}, {confidence:.2f}%)")
+            results.append({**r, "confidence": confidence, "source": source})
+    return results
 
-    # ✅ Step 3: SBERT FAISS Match (is_cpm = 1 only)
+def cpm_faiss_stage(cursor_scope, query, tokens, k=25):
     print("🔍 No strong Boolean match. Trying semantic search (FAISS)...")
-    emb_query = model.encode(query, convert_to_numpy=True).astype("float32").reshape(1, -1)
-    D, I = FAISS_INDEX.search(emb_query, 25)  # Get more candidates for strict filtering
-
     SCALE = 50
-    found_valid = False
-    for idx, dist in zip(I[0], D[0]):
-        code = PRODUCT_CODES[idx]
-        desc = PRODUCT_DESCS[idx]
-
-        # ✅ Check: this product must be is_cpm = 1
-        cursor.execute("SELECT is_cpm FROM npcms_product WHERE product_code = %s", (code,))
-        row = cursor.fetchone()
-        if not row or row['is_cpm'] != 1:
-            continue
-
+    results = []
+    neighbours = faiss_neighbours(query, k)  # encode first: no connection held meanwhile
+    with cursor_scope() as cur:
+        candidates = filter_category(cur, *neighbours, 1)
+    for code, desc, dist in candidates:
         # ✅ Check: all query terms must appear in description
         if not all(t in desc.lower() for t in tokens):
             continue
@@ -262,98 +290,104 @@ def search_cpm_item(query, top_k=5):
         conf = max(0.0, 100 - dist * SCALE)
         print(f"{code} | {desc}")
         print(f"🤖 Semantic Match Confidence: {conf:.2f}%")
-        log["results"].append({
+        results.append({
             "product_code": code,
             "product_description": desc,
             "confidence": round(conf, 2),
             "source": "SBERT_FAISS"
         })
-        found_valid = True
-
-    if found_valid:
-        write_log(log)
-        return log
+    return results
 
-    # ✅ Step 4: Fallback response if no match passed all filters
+def cpm_fallback_results():
     print("🧪 The exact product that you are looking for is not available in NPCMS.")
     fallback_items = [
         ("3423199", "Chemical elements not elsewhere classified.", "Tonne"),
         ("3527099", "Other pharmaceutical products not elsewhere classified", "Kg")
     ]
+    results = []
     for code, desc, unit in fallback_items:
         print(f"{code} | {desc} | {unit}")
-        log["results"].append({
+        results.append({
             "product_code": code,
             "product_description": desc,
             "unit": unit,
             "confidence": 0.0,
             "source": "cpm_fallback"
         })
+    return results
 
-    write_log(log)
-    return log
-# ========================================
-# PHASE-III: Search General Items
-# ========================================
-def search_general_item(query, top_k=5):
-    log = {"query": query, "category": "general", "results": []}
-    boolean_query, terms = expand_keywords_basic(query)
+def search_cpm_item(query, top_k=5, deadline=None):
+    deadline = deadline or Deadline()
+    log = {"query": query, "category": "chemical", "results": []}
+    terms = analyze(query)
+    tokens = terms.token_set
+    pooled = get_pool().cursor  # per-stage connection: requests (and search-all branches) never share one
 
-    # Step 1: Boolean search
-    cursor.execute(
-        """
-        SELECT product_code, product_description, unit, 
-               MATCH(product_description) AGAINST (%s IN BOOLEAN MODE) AS score
-        FROM npcms_product 
-        WHERE is_cpm = 0 
-          AND MATCH(product_description) AGAINST (%s IN BOOLEAN MODE)
-        ORDER BY score DESC LIMIT %s
-        """, (boolean_query, boolean_query, top_k)
-    )
-    results = cursor.fetchall()
+    # ✅ Step 0: Code prefix / exact description
+    if fast_path_results(query, 1, log):
+        return log
 
-    if results:
-        max_s = max(r['score'] for r in results) or 1.0
-        scored_results = []
-        for r in results:
-            raw_conf = (r['score'] / max_s) * 100
-            conf = adjust_score(r['product_description'], raw_conf, r['product_code'], query)
-            if not should_exclude_product(r['product_code'], r['product_description'], query):
-                scored_results.append({**r, "confidence": conf, "source": "boolean"})
+    # ✅ Step 1: Exact Synonym Match (answers even when every match is excluded)
+    with deadline.stage("npcms.cpm.synonym"):
+        synonym_results = with_cursor(pooled, cpm_synonym_stage, query, terms)
+    if synonym_results is not None:
+        log["results"] = synonym_results
+        write_log(log)
+        return log
 
-        scored_results.sort(key=lambda x: x["confidence"], reverse=True)
+    # ✅ Step 2: Boolean Match
+    boolean_query, _ = expand_keywords_basic(query)
+    with deadline.stage("npcms.cpm.boolean"):
+        log["results"] = with_cursor(pooled, boolean_stage, query, boolean_query, terms, top_k, 1)
+    if log["results"]:
+        write_log(log)
+        return log
 
-        for r in scored_results:
-            label = "GREEN" if r["confidence"] > 65 else "YELLOW" if r["confidence"] >= 35 else "RED"
-            print(f"{r['product_code']} | {r['product_description']} | {r['unit']}")
-            print(f"✅ Boolean Match Confidence: {r['confidence']:.2f}% [{label}]")
-            log["results"].append(r)
+    # ✅ Step 3: Typo-tolerant Synonym Match, only once the boolean search found nothing
+    with deadline.stage("npcms.cpm.synonym_fuzzy"):
+        log["results"] = with_cursor(pooled, cpm_fuzzy_synonym_stage, query, terms)
+    if log["results"]:
+        write_log(log)
+        return log
 
+    # ✅ Step 4: SBERT FAISS Match (is_cpm = 1 only)
+    if deadline.allows("npcms.cpm.faiss"):
+        k = 10 if deadline.cheapen("npcms.cpm.faiss") else 25  # fewer candidates when short on time
+        with deadline.stage("npcms.cpm.faiss"):
+            log["results"] = cpm_faiss_stage(pooled, query, tokens, k)
         if log["results"]:
             write_log(log)
             return log
 
-    # Step 2: Relaxed fallback using LIKE
-    cursor.execute("""
+    # ✅ Step 5: Fallback response if no match passed all filters
+    log["results"] = cpm_fallback_results()
+    write_log(log)
+    return log
+
+# ========================================
+# PHASE-III: Search General Items
+# ========================================
+def general_like_stage(cur, query, terms):
+    cur.execute("""
         SELECT product_code, product_description, unit
         FROM npcms_product
         WHERE is_cpm = 0 AND LOWER(product_description) LIKE %s
     """, (f"%{query.lower()}%",))
-    relaxed_results = cursor.fetchall()
+    relaxed_results = cur.fetchall()
+    results = []
     if relaxed_results:
         print("🔁 Found match via relaxed LIKE search:")
         for r in relaxed_results:
             print(f"{r['product_code']} | {r['product_description']} | {r['unit']}")
-            if not should_exclude_product(r['product_code'], r['product_description'], query):
-                log['results'].append({**r, "confidence": 90.0, "source": "like_fallback"})
-        if log["results"]:
-            write_log(log)
-            return log
+            if not should_exclude_product(r['product_code'], r['product_description'], terms):
+                results.append({**r, "confidence": 90.0, "source": "like_fallback"})
+    return results
 
-    # Step 3: Fallback to subclass description
+def general_subclass_lookup(cur, boolean_query):
+    """Best matching subclass (non parts/accessories first), or None."""
     print("🔍 No strong product match. Checking subclass descriptions...")
     excluded = set(npcms_except.keys())
-    cursor.execute(
+    cur.execute(
         """
         SELECT subclass_code, subclass_description, 
                MATCH(subclass_description) AGAINST (%s IN BOOLEAN MODE) AS score
@@ -362,7 +396,7 @@ def search_general_item(query, top_k=5):
         ORDER BY score DESC LIMIT 10
         """, (boolean_query, boolean_query)
     )
-    subclasses = cursor.fetchall()
+    subclasses = cur.fetchall()
     valid = None
 
     for s in subclasses:
@@ -376,65 +410,168 @@ def search_general_item(query, top_k=5):
             if c in subclass_parts_accessories and str(c) not in excluded:
                 valid = s
                 break
+    return valid
 
+def general_subclass_stage(cur, boolean_query, terms):
+    valid = general_subclass_lookup(cur, boolean_query)
+    results = []
     if valid:
         sc = valid['subclass_code']
         print(f"✅ Subclass identified: {sc} - {valid['subclass_description']}")
-        cursor.execute(
+        cur.execute(
             "SELECT product_code, product_description, unit FROM npcms_product WHERE subclass_code = %s",
             (sc,)
         )
-        prods = cursor.fetchall()
+        prods = cur.fetchall()
         for p in prods:
-            conf = adjust_score(p['product_description'], 100.0, p['product_code'], query)
+            conf = adjust_score(p['product_description'], 100.0, p['product_code'], terms)
             label = "GREEN" if conf > 65 else "YELLOW" if conf >= 35 else "RED"
             print(f"{p['product_code']} | {p['product_description']} | {p['unit']}")
             print(f"✅ Subclass Match Confidence: {conf:.2f}% [{label}]")
-            if not should_exclude_product(p['product_code'], p['product_description'], query):
-                log['results'].append({**p, "confidence": conf, "source": "subclass"})
-        if log["results"]:
-            write_log(log)
-            return log
+            if not should_exclude_product(p['product_code'], p['product_description'], terms):
+                results.append({**p, "confidence": conf, "source": "subclass"})
+    return results
 
-    # Step 4: SBERT-FAISS fallback
+def general_faiss_stage(cursor_scope, query, k=25):
     print("🔍 No strong match. Trying semantic fallback via FAISS...")
-    emb_query = model.encode(query, convert_to_numpy=True).astype("float32").reshape(1, -1)
-    D, I = FAISS_INDEX.search(emb_query, 25)  # Get more candidates to allow filtering
-
     SCALE = 50
-    for idx, dist in zip(I[0], D[0]):
-        code = PRODUCT_CODES[idx]
-        desc = PRODUCT_DESCS[idx]
-
-        # ✅ Ensure this product is NOT a CPM item
-        cursor.execute("SELECT is_cpm FROM npcms_product WHERE product_code = %s", (code,))
-        row = cursor.fetchone()
-        if not row or row['is_cpm'] != 0:
-            continue
-
+    results = []
+    neighbours = faiss_neighbours(query, k)  # encode first: no connection held meanwhile
+    with cursor_scope() as cur:
+        candidates = filter_category(cur, *neighbours, 0)
+    for code, desc, dist in candidates:
         conf = max(0.0, 100 - dist * SCALE)
         print(f"{code} | {desc}")
         print(f"🤖 Semantic Match Confidence: {conf:.2f}%")
-        log["results"].append({
+        results.append({
             "product_code": code,
             "product_description": desc,
             "confidence": round(conf, 2),
             "source": "SBERT_FAISS"
         })
+    return results
 
-    if log["results"]:
-        write_log(log)
-    else:
-        print("❌ No matching product found. Please try rephrasing or manual search.")
-        write_log(log)
+def with_cursor(cursor_scope, stage_fn, *args):
+    with cursor_scope() as cur:
+        return stage_fn(cur, *args)
+
+# Cascade order = priority order: the first stage with results answers.
+# Step 1 (boolean) always runs; the fallbacks are subject to the deadline.
+# Each stage takes a cursor_scope() (context manager yielding a cursor) and
+# holds the connection only while it queries.
+def general_stages(query, boolean_query, terms, top_k, deadline):
+    return [
+        # Step 1: Boolean search
+        ("boolean", lambda scope: with_cursor(scope, boolean_stage, query, boolean_query, terms, top_k, 0)),
+        # Step 2: Relaxed fallback using LIKE
+        ("like", lambda scope: with_cursor(scope, general_like_stage, query, terms)),
+        # Step 3: Fallback to subclass description
+        ("subclass", lambda scope: with_cursor(scope, general_subclass_stage, boolean_query, terms)),
+        # Step 4: SBERT-FAISS fallback (fewer candidates when short on time)
+        ("faiss", lambda scope: general_faiss_stage(
+            scope, query, 10 if deadline.cheapen("npcms.general.faiss") else 25)),
+    ]
+
+# Stages that encode: never started speculatively, as a discarded encode still
+# costs a forward pass and an admission slot
+ENCODING_STAGES = {"faiss"}
 
+def run_stages_sequential(stages, deadline, cursor_scope=None):
+    cursor_scope = cursor_scope or get_pool().cursor
+    for name, run in stages:
+        stage = f"npcms.general.{name}"
+        if name != "boolean" and not deadline.allows(stage):
+            continue
+        with deadline.stage(stage):
+            results = run(cursor_scope)
+        if results:
+            return results
+    return []
+
+_stage_executor = ThreadPoolExecutor(max_workers=NPCMS_STAGE_WORKERS, thread_name_prefix="npcms-stage")
+
+def run_stages_parallel(stages, deadline):
+    """
+    Speculative variant of run_stages_sequential: every database stage ahead
+    of the first encoding stage that fits the budget starts at once on its own
+    pooled connection, results are then taken in priority order. The encoding
+    stages run afterwards, only if all of those came back empty.
+
+    The budget decisions are the sequential cascade's: each stage is admitted
+    with deadline.allows() when its result is consumed, with the durations of
+    the stages before it charged to the deadline as if they had run one after
+    another (never less than the time actually spent). So the results are
+    those of the sequential cascade; lower-priority stages that have not
+    started are cancelled and running ones are discarded.
+    """
+    pool = get_pool()
+    split = next((i for i, (name, _) in enumerate(stages) if name in ENCODING_STAGES), len(stages))
+    speculative, deferred = stages[:split], stages[split:]
+
+    def run_pooled(name, run):
+        started = time.perf_counter()
+        with deadline.stage(f"npcms.general.{name}"):
+            results = run(pool.cursor)
+        return results, (time.perf_counter() - started) * 1000
+
+    # Stages that do not fit now never will (only a probe could still admit them, run below on demand)
+    futures = [(name, run, _stage_executor.submit(copy_context().run, run_pooled, name, run)
+                if name == "boolean" or deadline.fits(f"npcms.general.{name}") else None)
+               for name, run in speculative]
+    sequential_ms = deadline.elapsed_ms()  # where the sequential cascade would be now
+    try:
+        for name, run, future in futures:
+            deadline.charged_ms = max(0.0, sequential_ms - deadline.elapsed_ms())
+            stage = f"npcms.general.{name}"
+            if name != "boolean" and not deadline.allows(stage):
+                continue
+            if future is None:
+                results, ms = run_pooled(name, run)
+            elif name == "boolean":
+                results, ms = future.result()
+            else:
+                remaining = deadline.remaining_ms()
+                try:
+                    results, ms = future.result(
+                        timeout=None if remaining == float("inf") else max(0.0, remaining) / 1000)
+                except FutureTimeout:
+                    deadline.skipped.append(stage)
+                    continue
+            sequential_ms += ms
+            if results:
+                return results
+    finally:
+        for _, _, future in futures:
+            if future is not None:
+                future.cancel()
+    deadline.charged_ms = max(0.0, sequential_ms - deadline.elapsed_ms())
+    return run_stages_sequential(deferred, deadline, pool.cursor)
+
+def search_general_item(query, top_k=5, deadline=None, parallel=None):
+    deadline = deadline or Deadline()
+    parallel = NPCMS_PARALLEL_STAGES if parallel is None else parallel
+    log = {"query": query, "category": "general", "results": []}
+    boolean_query, _ = expand_keywords_basic(query)
+    terms = analyze(query)
+
+    # Step 0: Code prefix / exact description
+    if fast_path_results(query, 0, log):
+        return log
+
+    stages = general_stages(query, boolean_query, terms, top_k, deadline)
+    run_stages = run_stages_parallel if parallel else run_stages_sequential
+    log["results"] = run_stages(stages, deadline)
+
+    if not log["results"]:
+        print("❌ No matching product found. Please try rephrasing or manual search.")
+    write_log(log)
     return log
 
 if __name__ == "__main__":
     query = input("Enter your NPCMS query: ").strip()
     print("1️⃣ Chemical / Pharmaceutical / Medicinal")
-      print("2️⃣ General Item (Manufactured goods)")
-      category = input("➤ Enter 1 or 2: ").strip()
+    print("2️⃣ General Item (Manufactured goods)")
+    category = input("➤ Enter 1 or 2: ").strip()
     results = run_npcms_search(query, category)
     if results and results.get("results"):
         for r in results["results"]:
@@ -0,0 +1,182 @@
+# ========================================
+# 📦 Packed Binary Corpus
+# ========================================
+# One file per taxonomy holding what descriptions.txt + embeddings.npy hold,
+# laid out so a worker can mmap it and use it without parsing:
+#
+#   b"IIOPCCP1" | uint32 header length | JSON header | sections (64-byte aligned)
+#     codes         fixed-width UTF-8 code array     (numpy "S<width>", rows)
+#     desc_offsets  uint64 offsets into desc_blob     (rows + 1)
+#     desc_blob     UTF-8 descriptions, concatenated
+#     embeddings    float32 matrix                   (rows × dimension, optional)
+#
+# The header records each section's offset / length plus rows, dimension and
+# code width. Every array is a zero-copy view of the mapping (shared page
+# cache across workers); codes and descriptions are decoded only when indexed.
+#
+#   python packed_corpus.py descriptions.txt [embeddings.npy] -o corpus.bin
+
+import os
+import json
+import mmap
+import struct
+import argparse
+from collections.abc import Sequence
+import numpy as np
+
+MAGIC = b"IIOPCCP1"
+ALIGN = 64
+
+# ========================================
+# Lazy string views
+# ========================================
+class PackedCodes(Sequence):
+    def __init__(self, array):
+        self._array = array
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._array[i].decode("utf-8")
+
+class PackedStrings(Sequence):
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return str(self._blob[int(self._offsets[i]):int(self._offsets[i + 1])], "utf-8")
+
+    def __iter__(self):
+        blob, offsets = self._blob, self._offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield str(blob[start:end], "utf-8")
+
+class PackedLines(Sequence):
+    """"<code> ||| <description>" rows, as in the text files, built on access."""
+
+    def __init__(self, codes, descs):
+        self._codes = codes
+        self._descs = descs
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return f"{self._codes[i]} ||| {self._descs[i]}"
+
+    def __iter__(self):
+        for code, desc in zip(self._codes, self._descs):
+            yield f"{code} ||| {desc}"
+
+# ========================================
+# Reader
+# ========================================
+class PackedCorpus:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a packed corpus")
+        (header_len,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._mmap[start:start + header_len])
+        sections = self.header["sections"]
+        rows = self.header["rows"]
+
+        def view(name, dtype, count):
+            return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=sections[name]["offset"])
+
+        self.codes = PackedCodes(view("codes", f"S{self.header['code_width']}", rows))
+        blob = memoryview(self._mmap)[sections["desc_blob"]["offset"]:
+                                      sections["desc_blob"]["offset"] + sections["desc_blob"]["length"]]
+        self.descs = PackedStrings(blob, view("desc_offsets", "<u8", rows + 1))
+        self.lines = PackedLines(self.codes, self.descs)
+        dim = self.header["dimension"]
+        self.embeddings = view("embeddings", "<f4", rows * dim).reshape(rows, dim) if dim else None
+
+    @property
+    def rows(self):
+        return self.header["rows"]
+
+def read_packed(path):
+    return PackedCorpus(path)
+
+# ========================================
+# Writer / converter
+# ========================================
+def write_packed(path, codes, descs, embeddings=None):
+    codes = [str(c).encode("utf-8") for c in codes]
+    descs = [str(d).encode("utf-8") for d in descs]
+    if len(codes) != len(descs):
+        raise ValueError(f"{len(codes)} codes but {len(descs)} descriptions")
+    if embeddings is not None:
+        embeddings = np.ascontiguousarray(embeddings, dtype="<f4")
+        if embeddings.ndim != 2 or embeddings.shape[0] != len(codes):
+            raise ValueError(f"embeddings shape {embeddings.shape} does not match {len(codes)} rows")
+
+    width = max((len(c) for c in codes), default=1)
+    desc_offsets = np.zeros(len(descs) + 1, dtype="<u8")
+    desc_offsets[1:] = np.cumsum([len(d) for d in descs], dtype="<u8")
+    payloads = [
+        ("codes", np.array(codes, dtype=f"S{width}").tobytes()),
+        ("desc_offsets", desc_offsets.tobytes()),
+        ("desc_blob", b"".join(descs)),
+    ]
+    if embeddings is not None:
+        payloads.append(("embeddings", embeddings.tobytes()))
+
+    def layout(header_len):
+        sections, offset = {}, len(MAGIC) + 4 + header_len
+        for name, payload in payloads:
+            offset += -offset % ALIGN
+            sections[name] = {"offset": offset, "length": len(payload)}
+            offset += len(payload)
+        return sections
+
+    # The header's own length shifts the sections; pad it to a fixed size once it is known
+    header = {"format": 1, "rows": len(codes), "code_width": width,
+              "dimension": int(embeddings.shape[1]) if embeddings is not None else 0, "sections": layout(0)}
+    header_len = len(json.dumps(header).encode("utf-8")) + 256
+    header["sections"] = layout(header_len)
+    header_bytes = json.dumps(header).encode("utf-8").ljust(header_len)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", header_len) + header_bytes)
+        for name, payload in payloads:
+            f.write(b"\0" * (header["sections"][name]["offset"] - f.tell()))
+            f.write(payload)
+    os.replace(tmp, path)
+    return header
+
+def convert(descriptions_path, embeddings_path=None, out_path="corpus.bin"):
+    """Pack a " ||| " descriptions file (and its .npy embeddings) into one corpus file."""
+    with open(descriptions_path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if " ||| " in line]
+    codes = [line.split(" ||| ")[0] for line in lines]
+    descs = [line.split(" ||| ")[1] for line in lines]
+    embeddings = np.load(embeddings_path) if embeddings_path else None
+    return write_packed(out_path, codes, descs, embeddings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a descriptions file (+ embeddings) into a binary corpus")
+    parser.add_argument("descriptions")
+    parser.add_argument("embeddings", nargs="?")
+    parser.add_argument("-o", "--output", default="corpus.bin")
+    args = parser.parse_args()
+    header = convert(args.descriptions, args.embeddings, args.output)
+    print(f"✅ {args.output}: {header['rows']} rows, dimension {header['dimension']}")
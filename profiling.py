@@ -0,0 +1,189 @@
+# ========================================
+# 🔥 On-demand Request Profiling
+# ========================================
+# A sampling profiler for individual search requests. While a request is
+# being profiled, one shared sampler thread reads the request thread's stack
+# through sys._current_frames() every PROFILE_INTERVAL_MS. The request itself
+# runs untouched: no tracing hooks are installed.
+#
+# A request is profiled when either
+#   - it sends X-Profile: 1 (or ?profile=1) together with the admin token
+#     (X-Admin-Token), or
+#   - it is picked at random with probability PROFILE_SAMPLE_RATE
+# Profiled responses carry an X-Profile-Id header. The stacks are queued to a
+# writer thread that stores PROFILE_DIR/<id>.folded in collapsed-stack format
+# (flamegraph.pl, speedscope, inferno) plus a <id>.json with request metadata.
+# Stages that run on pool threads (search-all branches, speculative NPCMS
+# stages, hybrid lexical) show up as the waiting frame in the request thread.
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import threading
+from collections import Counter
+from flask import request, g
+from config import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_SAMPLE_RATE, PROFILE_KEEP
+from api_utils import admin_denied
+
+_active = {}  # thread ident -> Counter of stacks (tuples of code objects, root first)
+_active_lock = threading.Lock()
+_wake = threading.Event()
+_captures = queue.Queue()
+_threads_started = False
+_threads_lock = threading.Lock()
+
+# ========================================
+# Sampler
+# ========================================
+def _sample_loop():
+    interval = PROFILE_INTERVAL_MS / 1000
+    while True:
+        _wake.wait()
+        # Sampling under the lock: once stop_profile() has popped a capture it is never touched again
+        with _active_lock:
+            if not _active:
+                _wake.clear()  # under the lock, so a profile started meanwhile re-sets it
+                continue
+            frames = sys._current_frames()
+            for ident, stacks in _active.items():
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if stack:
+                    stacks[tuple(reversed(stack))] += 1
+            del frames
+        time.sleep(interval)
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def fold(stacks):
+    """Collapsed-stack lines: "root;caller;leaf count"."""
+    folded = Counter()
+    for stack, count in stacks.items():
+        folded[";".join(frame_label(code).replace(";", ":") for code in stack)] += count
+    return "".join(f"{line} {count}\n" for line, count in folded.most_common())
+
+def _write_loop():
+    while True:
+        profile_id, stacks, meta = _captures.get()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(PROFILE_DIR, f"{profile_id}.folded"), "w", encoding="utf-8") as f:
+                f.write(fold(stacks))
+            with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2)
+            _prune()
+        except Exception as exc:
+            print(f"⚠️ Could not write profile {profile_id}: {exc!r}")
+
+def _prune():
+    profiles = sorted(p for p in os.listdir(PROFILE_DIR) if p.endswith(".json"))
+    for name in profiles[:max(0, len(profiles) - PROFILE_KEEP)]:
+        for ext in (".json", ".folded"):
+            path = os.path.join(PROFILE_DIR, name[:-5] + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+def _ensure_threads():
+    global _threads_started
+    if _threads_started:
+        return
+    with _threads_lock:
+        if not _threads_started:
+            threading.Thread(target=_sample_loop, name="profile-sampler", daemon=True).start()
+            threading.Thread(target=_write_loop, name="profile-writer", daemon=True).start()
+            _threads_started = True
+
+def start_profile(ident=None):
+    _ensure_threads()
+    ident = ident or threading.get_ident()
+    with _active_lock:
+        _active[ident] = Counter()
+    _wake.set()
+    return ident
+
+def stop_profile(ident):
+    with _active_lock:
+        return _active.pop(ident, Counter())
+
+# ========================================
+# Stored profiles
+# ========================================
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith(".json"):
+            with open(os.path.join(PROFILE_DIR, name), "r", encoding="utf-8") as f:
+                profiles.append(json.load(f))
+    return profiles
+
+def read_profile(profile_id):
+    path = os.path.join(PROFILE_DIR, f"{os.path.basename(profile_id)}.folded")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+# ========================================
+# Blueprint hooks
+# ========================================
+def _requested():
+    flag = request.headers.get("X-Profile") or request.args.get("profile")
+    return flag in {"1", "true"} and admin_denied() is None
+
+def init_profiling(bp, *view_names):
+    """Profile the named views of a blueprint on demand or at PROFILE_SAMPLE_RATE.
+
+    Must be called before the blueprint is registered on the app.
+    """
+    endpoints = {f"{bp.name}.{view}" for view in view_names}
+
+    @bp.before_request
+    def _start_profile():
+        if request.endpoint not in endpoints:
+            return None
+        trigger = "requested" if _requested() else (
+            "sampled" if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE else None)
+        if trigger:
+            g.profile = {
+                "id": time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8],
+                "ident": start_profile(),
+                "trigger": trigger,
+                "started": time.perf_counter(),
+            }
+        return None
+
+    @bp.after_request
+    def _tag_response(response):
+        profile = g.get("profile")
+        if profile:
+            response.headers["X-Profile-Id"] = profile["id"]
+        return response
+
+    @bp.teardown_request
+    def _stop_profile(exc):
+        profile = g.pop("profile", None)
+        if not profile:
+            return
+        stacks = stop_profile(profile["ident"])
+        _captures.put((profile["id"], stacks, {
+            "id": profile["id"],
+            "endpoint": request.endpoint,
+            "path": request.full_path,
+            "trigger": profile["trigger"],
+            "duration_ms": round((time.perf_counter() - profile["started"]) * 1000, 2),
+            "samples": sum(stacks.values()),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "error": repr(exc) if exc else None,
+        }))
+
+    return bp
@@ -0,0 +1,138 @@
+# search_all_api.py
+#
+# One endpoint that searches NIC, NCO, NPCMS and HSN at once. The four
+# pipelines run concurrently on a shared thread pool, so wall-clock time is
+# the slowest branch rather than the sum. The query texts every semantic step
+# will need are encoded together in one batch up front; the branches then
+# find those vectors in the encoder cache instead of encoding again.
+# Each branch gets its own Deadline over the same budget, capped at the
+# timeout, so a slow branch drops its optional stages instead of hitting the
+# hard timeout. A branch that still times out cannot be interrupted and keeps
+# its worker until it finishes; work is only submitted while a worker is
+# free, so such stragglers make new branches fail fast ("busy") instead of
+# queueing behind them. Branches query on pooled per-call connections
+# (db.get_pool), so a straggler never shares one with later requests.
+
+import time
+import math
+import logging
+import threading
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import Blueprint, request, jsonify
+from config import UNIFIED_SEARCH_WORKERS, UNIFIED_SEARCH_TIMEOUT_S
+from encoder_service import encode_many
+from deadline import Deadline, deadline_from_request
+from nic_api import nic_search_results
+from nco_api import nco_search_results
+from npcms_api import npcms_search_results
+from hsn_api import hsn_search_results
+from hsn_search_pipeline import normalize as hsn_normalize
+from api_utils import read_search_mode
+from nic_search_pipeline import preprocess_query as nic_preprocess, expand_semantic_query as nic_expand
+
+logger = logging.getLogger(__name__)
+
+search_all_bp = Blueprint("search_all", __name__)
+
+TAXONOMIES = ["nic", "nco", "npcms", "hsn"]
+
+_executor = ThreadPoolExecutor(max_workers=UNIFIED_SEARCH_WORKERS, thread_name_prefix="search-all")
+_slots = threading.BoundedSemaphore(UNIFIED_SEARCH_WORKERS)
+
+def _submit(fn, *args):
+    """Future for fn on a free worker (with the caller's context), or None when all are busy."""
+    if not _slots.acquire(blocking=False):
+        return None
+    try:
+        future = _executor.submit(copy_context().run, fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+def shared_encode_texts(query):
+    """Every distinct text the semantic steps of the four pipelines encode for this query."""
+    return list(dict.fromkeys([query, hsn_normalize(query), nic_expand(nic_preprocess(query))]))
+
+def run_branch(taxonomy, query, category, budget_ms=None, mode="cascade", fusion=None):
+    deadline = Deadline(budget_ms)
+    if taxonomy == "nic":
+        section = nic_search_results(query, deadline, mode, fusion)
+    elif taxonomy == "nco":
+        section = nco_search_results(query, deadline, mode, fusion)
+    elif taxonomy == "npcms":
+        section = npcms_search_results(query, category, deadline, mode, fusion)
+    else:
+        section = hsn_search_results(query, deadline, mode, fusion)
+    return {**section, **deadline.report()}
+
+def search_all(query, category="other", taxonomies=TAXONOMIES, timeout=UNIFIED_SEARCH_TIMEOUT_S, budget_ms=None,
+               mode="cascade", fusion=None):
+    started = time.monotonic()
+    deadline = started + timeout
+    # Past the timeout a branch's result is discarded: never budget it for longer
+    budget_ms = timeout * 1000 if budget_ms is None else min(budget_ms, timeout * 1000)
+
+    # Shared encode runs alongside the lexical stages of every branch (all at the route's admission priority)
+    encode_future = _submit(encode_many, shared_encode_texts(query))
+    futures = {t: _submit(run_branch, t, query, category, budget_ms, mode, fusion) for t in taxonomies}
+
+    sections = {}
+    for taxonomy, future in futures.items():
+        if future is None:
+            sections[taxonomy] = {"results": [], "error": "busy"}
+            continue
+        branch_started = time.monotonic()
+        try:
+            sections[taxonomy] = future.result(timeout=max(0.0, deadline - branch_started))
+        except FutureTimeout:
+            # The worker thread cannot be interrupted; its result is simply discarded
+            future.cancel()
+            sections[taxonomy] = {"results": [], "error": "timeout"}
+        except Exception:
+            # Details (DB / internal messages) go to the log, never to the client
+            logger.exception("search-all %s branch failed for %r", taxonomy, query)
+            sections[taxonomy] = {"results": [], "error": "failed"}
+
+    if encode_future is not None and not encode_future.done():
+        encode_future.cancel()
+
+    return {
+        "query": query,
+        "mode": mode,
+        "sections": sections,
+        "degraded": any(s.get("degraded") or "error" in s for s in sections.values()),
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 2)
+    }
+
+@search_all_bp.route("/api/search-all", methods=["GET"])
+def api_search_all():
+    query = request.args.get("query", "").strip()
+    if not query:
+        return jsonify({"error": "Query is required"}), 400
+
+    category = request.args.get("category", "other").strip()
+    if category not in {"chemical", "other"}:
+        return jsonify({"error": "Category must be chemical or other"}), 400
+
+    requested = request.args.get("taxonomies")
+    taxonomies = [t for t in requested.split(",") if t in TAXONOMIES] if requested else TAXONOMIES
+    if not taxonomies:
+        return jsonify({"error": f"Taxonomies must be among {', '.join(TAXONOMIES)}"}), 400
+
+    try:
+        timeout = float(request.args.get("timeout", UNIFIED_SEARCH_TIMEOUT_S))
+    except ValueError:
+        timeout = math.nan
+    if not timeout > 0:
+        return jsonify({"error": "Timeout must be a positive number of seconds"}), 400
+
+    mode, fusion, error = read_search_mode()
+    if error:
+        return jsonify({"error": error}), 400
+
+    budget_ms = deadline_from_request().budget_ms
+    return jsonify(search_all(query, category, taxonomies, min(timeout, UNIFIED_SEARCH_TIMEOUT_S), budget_ms,
+                              mode, fusion))
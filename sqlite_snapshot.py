@@ -0,0 +1,308 @@
+# ========================================
+# 💾 Local Read-only Taxonomy Snapshot (SQLite + FTS5)
+# ========================================
+# Exporter:  python sqlite_snapshot.py [path]
+#   Copies every taxonomy table (nic_/nco_/npcms_/hsn_ prefixes: levels,
+#   synonyms, exceptions, crosswalks) from MySQL into one SQLite file, along
+#   with the tables' MySQL indexes. Each FULLTEXT index becomes a contentless
+#   FTS5 table "<table>__<columns>_fts" whose rowids are the base table's
+#   rowids. The file is written beside the target and renamed into place.
+#
+# Reader:    DB_BACKEND=sqlite (see db.connect)
+#   connect_sqlite() returns a connection whose cursors take the MySQL SQL
+#   the modules already issue: %s placeholders, dictionary=True rows, and
+#   MATCH(col) AGAINST (%s IN BOOLEAN | NATURAL LANGUAGE MODE), which is
+#   rewritten into a JOIN on the FTS5 table (score = -bm25, larger is better).
+#   The modules keep their connections for the life of the process, so a
+#   connection checks the file before each new cursor and reopens it once the
+#   exporter has renamed a new snapshot into place; cursors already open
+#   finish on the old file.
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import threading
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+from config import SQLITE_SNAPSHOT, EXPORT_CHUNK_ROWS
+
+WORD_RE = re.compile(r"\w+")
+MATCH_RE = re.compile(
+    r"MATCH\s*\(\s*([\w\s,]+?)\s*\)\s*AGAINST\s*\(\s*%s\s+IN\s+(BOOLEAN|NATURAL\s+LANGUAGE)\s+MODE\s*\)",
+    re.IGNORECASE)
+FROM_RE = re.compile(r"\bFROM\s+(\w+)", re.IGNORECASE)
+BOOLEAN_TERM_RE = re.compile(r'([+-]?)("[^"]*"\*?|[^\s"]+)')
+NO_MATCH = '"\x01"'  # FTS5 expression that matches nothing (empty MySQL query)
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def fts_table(table, columns):
+    return f"{table}__{'_'.join(columns)}_fts"
+
+# ========================================
+# MySQL FULLTEXT query syntax → FTS5
+# ========================================
+def fts_phrase(text, prefix=False):
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    return '"' + " ".join(words) + '"' + ("*" if prefix else "")
+
+def to_fts_boolean(query):
+    """+required, -excluded, bare optional, word* prefix, "quoted phrase"."""
+    required, optional, excluded = [], [], []
+    for op, raw in BOOLEAN_TERM_RE.findall(query or ""):
+        phrase = fts_phrase(raw.rstrip("*").strip('"'), raw.endswith("*"))
+        if phrase:
+            {"+": required, "-": excluded}.get(op, optional).append(phrase)
+    # With required terms present MySQL only uses optional ones for ranking
+    expr = " AND ".join(required) or " OR ".join(optional)
+    if not expr:
+        return NO_MATCH
+    if excluded:
+        expr = f"({expr}) NOT ({' OR '.join(excluded)})"
+    return expr
+
+def to_fts_natural(query):
+    return " OR ".join(f'"{w}"' for w in WORD_RE.findall((query or "").lower())) or NO_MATCH
+
+_translations = {}
+
+def translate_sql(sql):
+    """(sqlite_sql, indexes of %s parameters to drop) for one MySQL statement."""
+    cached = _translations.get(sql)
+    if cached:
+        return cached
+
+    original = sql
+    matches = list(MATCH_RE.finditer(sql))
+    drop = []
+    if matches:
+        from_match = FROM_RE.search(sql)
+        table = from_match.group(1)
+        columns = [c.strip() for c in matches[0].group(1).split(",")]
+        fts = fts_table(table, columns)
+        placeholder_at = [m.start() for m in re.finditer(r"%s", sql)]
+
+        pieces, last = [], 0
+        for m in matches:
+            param_index = placeholder_at.index(m.start() + m.group(0).index("%s"))
+            pieces.append(sql[last:m.start()])
+            if m.start() < from_match.start():
+                # Relevance in the select list: bm25 of the row matched below
+                pieces.append(f"-bm25({fts})")
+                drop.append(param_index)
+            else:
+                func = "mysql_boolean" if m.group(2).upper() == "BOOLEAN" else "mysql_natural"
+                pieces.append(f"{fts} MATCH {func}(%s)")
+            last = m.end()
+        pieces.append(sql[last:])
+        sql = "".join(pieces)
+        sql = FROM_RE.sub(f"FROM {table} JOIN {fts} ON {fts}.rowid = {table}.rowid", sql, count=1)
+
+    result = _translations[original] = (sql.replace("%s", "?"), frozenset(drop))
+    return result
+
+# ========================================
+# DB-API adapter with the mysql.connector surface the modules use
+# ========================================
+class SqliteCursor:
+    def __init__(self, conn, dictionary=False):
+        self._cur = conn.cursor()
+        self.dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        sql, drop = translate_sql(sql)
+        params = [p for i, p in enumerate(params or ()) if i not in drop]
+        self._cur.execute(sql, params)
+        return self
+
+    def _row(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cur.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cur.fetchall()]
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def close(self):
+        self._cur.close()
+
+class SqliteConnection:
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Taxonomy snapshot {path} not found (run: python sqlite_snapshot.py)")
+        self.path = path
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        stat = os.stat(self.path)
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        conn.create_function("mysql_boolean", 1, to_fts_boolean, deterministic=True)
+        conn.create_function("mysql_natural", 1, to_fts_natural, deterministic=True)
+        conn.execute("PRAGMA mmap_size = 268435456")
+        # The old connection is not closed: cursors still reading it keep it alive
+        self._conn, self._file = conn, (stat.st_ino, stat.st_mtime_ns)
+
+    def _current(self):
+        """The connection, reopened first if a new snapshot replaced the file."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._conn
+        if (stat.st_ino, stat.st_mtime_ns) != self._file:
+            with self._lock:
+                if (stat.st_ino, stat.st_mtime_ns) != self._file:
+                    self._open()
+        return self._conn
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SqliteCursor(self._current(), dictionary)
+
+    def is_connected(self):
+        return True
+
+    def reconnect(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+def connect_sqlite(path=SQLITE_SNAPSHOT):
+    return SqliteConnection(path)
+
+def snapshot_version(path=SQLITE_SNAPSHOT):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT value FROM snapshot_meta WHERE key = 'version'").fetchone()[0]
+    finally:
+        conn.close()
+
+# ========================================
+# Exporter (MySQL → SQLite)
+# ========================================
+INTEGER_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint", "bit", "year"}
+REAL_TYPES = {"decimal", "numeric", "float", "double", "real"}
+
+def sqlite_type(mysql_type):
+    if mysql_type in INTEGER_TYPES:
+        return "INTEGER"
+    if mysql_type in REAL_TYPES:
+        return "REAL"
+    return "TEXT"
+
+def sqlite_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime, timedelta)):
+        return str(value)
+    return value
+
+def export_snapshot(path=SQLITE_SNAPSHOT):
+    from db import connect_mysql
+    from http_cache import TAXONOMY_TABLE_PREFIXES, mysql_taxonomy_version
+
+    started = time.time()
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    src = connect_mysql()
+    dst = sqlite3.connect(tmp_path)
+    try:
+        meta = src.cursor(dictionary=True)
+        like = " OR ".join(["TABLE_NAME LIKE %s"] * len(TAXONOMY_TABLE_PREFIXES))
+        meta.execute(f"""
+            SELECT TABLE_NAME FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE' AND ({like})
+            ORDER BY TABLE_NAME
+        """, [p + "%" for p in TAXONOMY_TABLE_PREFIXES])
+        tables = [r["TABLE_NAME"] for r in meta.fetchall()]
+
+        dst.execute("PRAGMA journal_mode = OFF")
+        dst.execute("PRAGMA synchronous = OFF")
+        for table in tables:
+            meta.execute("""
+                SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION
+            """, (table,))
+            columns = [(r["COLUMN_NAME"], r["DATA_TYPE"].lower()) for r in meta.fetchall()]
+            names = ", ".join(quote(c) for c, _ in columns)
+            dst.execute(f"CREATE TABLE {quote(table)} ({', '.join(f'{quote(c)} {sqlite_type(t)}' for c, t in columns)})")
+
+            rows_cur = src.cursor(buffered=False)
+            rows_cur.execute(f"SELECT {', '.join(f'`{c}`' for c, _ in columns)} FROM `{table}`")
+            insert = f"INSERT INTO {quote(table)} ({names}) VALUES ({', '.join('?' * len(columns))})"
+            copied = 0
+            while True:
+                rows = rows_cur.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                dst.executemany(insert, [tuple(sqlite_value(v) for v in row) for row in rows])
+                copied += len(rows)
+            rows_cur.close()
+
+            meta.execute("""
+                SELECT INDEX_NAME, NON_UNIQUE, INDEX_TYPE, COLUMN_NAME
+                FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                ORDER BY INDEX_NAME, SEQ_IN_INDEX
+            """, (table,))
+            indexes = {}
+            for r in meta.fetchall():
+                index = indexes.setdefault(r["INDEX_NAME"], {"unique": not r["NON_UNIQUE"], "type": r["INDEX_TYPE"], "columns": []})
+                index["columns"].append(r["COLUMN_NAME"])
+            for name, index in indexes.items():
+                cols = index["columns"]
+                if index["type"] == "FULLTEXT":
+                    fts = fts_table(table, cols)
+                    dst.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5(body, content='', prefix='2 3')")
+                    body = " || ' ' || ".join(f"COALESCE({quote(c)}, '')" for c in cols)
+                    dst.execute(f"INSERT INTO {fts}(rowid, body) SELECT rowid, {body} FROM {quote(table)}")
+                else:
+                    unique = "UNIQUE " if index["unique"] else ""
+                    dst.execute(f"CREATE {unique}INDEX {quote(f'{table}__{name.lower()}')} "
+                                f"ON {quote(table)} ({', '.join(quote(c) for c in cols)})")
+            print(f"📦 {table}: {copied} rows, {len(indexes)} indexes")
+
+        dst.execute("CREATE TABLE snapshot_meta (key TEXT PRIMARY KEY, value TEXT)")
+        dst.executemany("INSERT INTO snapshot_meta VALUES (?, ?)", [
+            ("version", mysql_taxonomy_version()),
+            ("created_at", datetime.now().isoformat(timespec="seconds")),
+            ("tables", ",".join(tables)),
+        ])
+        dst.commit()
+        dst.execute("ANALYZE")
+        dst.commit()
+    except BaseException:
+        dst.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        src.close()
+    dst.close()
+    os.replace(tmp_path, path)
+    print(f"✅ Snapshot written to {path} ({len(tables)} tables in {time.time() - started:.1f}s)")
+    return path
+
+if __name__ == "__main__":
+    export_snapshot(sys.argv[1] if len(sys.argv) > 1 else SQLITE_SNAPSHOT)
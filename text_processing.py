@@ -0,0 +1,110 @@
+# ========================================
+# 🔠 Shared Text Normalization
+# ========================================
+# One place for the tokenizing every pipeline does, with the patterns
+# compiled and the word lists frozen at import:
+#   - analyze(query): the per-request QueryAnalysis (tokens, token set,
+#     stemmed set, HSN-normalized text, canonical key). It is memoized by the
+#     query text, so the NIC / NCO / NPCMS / HSN branches of one search-all
+#     request, and the stages inside each pipeline, share one instance.
+#   - description_tokens / normalize_hsn: memoized per corpus description,
+#     so the descriptions scanned on every request are split only once.
+#   - canonical_key(text): case / punctuation / whitespace-insensitive key
+#     for exact-description lookups; collapse_whitespace(text) for the
+#     encoder cache, whose inputs keep their case.
+
+import re
+from functools import lru_cache
+
+WORD_RE = re.compile(r"\b\w+\b")
+NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+
+HSN_STOPWORDS = frozenset({"of", "and", "the", "with", "for", "in", "on", "to", "from", "by", "or", "not"})
+STEM_EXEMPT = frozenset({"its", "this", "was", "is"})
+
+# ========================================
+# Tokens
+# ========================================
+def tokenize(text):
+    """Lower-cased word tokens in query order (duplicates kept)."""
+    return WORD_RE.findall(text.lower()) if text else []
+
+def simple_stem(token):
+    if token in STEM_EXEMPT:
+        return token
+    return token[:-1] if token.endswith("s") and len(token) > 3 else token
+
+def stem_tokens(tokens):
+    tokens = set(tokens)
+    return frozenset(tokens | {simple_stem(w) for w in tokens})
+
+def canonical_key(text):
+    return " ".join(tokenize(text))
+
+def bag_key(text):
+    """Word-order-insensitive key: "Acid, Acetylsalicylic" → "acetylsalicylic acid"."""
+    return " ".join(sorted(tokenize(text)))
+
+def collapse_whitespace(text):
+    """Encoder input key: the model tokenizer ignores runs of whitespace, the cache should too."""
+    return " ".join(text.split())
+
+def boolean_prefix_query(terms, min_len=1):
+    """MySQL BOOLEAN MODE query requiring every term as a prefix: "+steel* +pipe*"."""
+    return " ".join(f"+{t}*" for t in terms if len(t) >= min_len)
+
+def hsn_terms(text):
+    """Words of the HSN word-overlap form, uncached (for one pass over a whole corpus)."""
+    return [word for word in NON_ALNUM_RE.sub("", text.lower()).split() if word not in HSN_STOPWORDS]
+
+@lru_cache(maxsize=65536)
+def normalize_hsn(text):
+    """HSN word-overlap form: ASCII alphanumerics only, HSN_STOPWORDS removed."""
+    return " ".join(hsn_terms(text))
+
+@lru_cache(maxsize=65536)
+def hsn_words(text):
+    return frozenset(normalize_hsn(text).split())
+
+@lru_cache(maxsize=65536)
+def description_tokens(description):
+    return frozenset(tokenize(description))
+
+# ========================================
+# Per-request query analysis
+# ========================================
+class QueryAnalysis:
+    """Everything the pipelines derive from the query text, computed once per request."""
+    __slots__ = ("text", "tokens", "token_set", "stemmed", "key", "_hsn")
+
+    def __init__(self, text):
+        self.text = text or ""
+        self.tokens = tuple(tokenize(self.text))
+        self.token_set = frozenset(self.tokens)
+        self.stemmed = stem_tokens(self.token_set)
+        self.key = " ".join(self.tokens)
+        self._hsn = None
+
+    @property
+    def hsn_normalized(self):
+        if self._hsn is None:
+            self._hsn = normalize_hsn(self.text)
+        return self._hsn
+
+    @property
+    def hsn_words(self):
+        return hsn_words(self.text)
+
+    @property
+    def sorted_terms(self):
+        return sorted(self.token_set)
+
+@lru_cache(maxsize=4096)
+def _analyze(text):
+    return QueryAnalysis(text)
+
+def analyze(query):
+    """QueryAnalysis for a query string (shared across stages); passes an existing analysis through."""
+    if isinstance(query, QueryAnalysis):
+        return query
+    return _analyze(query or "")
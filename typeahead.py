@@ -0,0 +1,168 @@
+# ========================================
+# ⌨️ Typeahead Index (in-memory, no model / DB calls per keystroke)
+# ========================================
+# One index per taxonomy over its leaf codes and descriptions, built from the
+# hierarchy index plus the curated synonyms (nic_synonym, npcms_cpm).
+#
+# Entries are numbered in popularity order (codes seen most in the query
+# logs first, then shorter/more general descriptions), so a lower id always
+# ranks higher. Description tokens are kept in a sorted array for bisect
+# prefix ranges, each with an id-sorted posting list; the top-N completions
+# are the first N ids of a lazy merge of those postings. Work per keystroke is
+# capped by TYPEAHEAD_MAX_KEYS / TYPEAHEAD_MAX_SCAN.
+
+import json
+import os
+import re
+import heapq
+import threading
+from bisect import bisect_left
+from collections import Counter
+from config import TYPEAHEAD_MAX_KEYS, TYPEAHEAD_MAX_SCAN, WARMUP_LOG_FILES
+from hierarchy_index import get_hierarchy
+from text_processing import WORD_RE
+
+CODE_RE = re.compile(r"^\d+$")
+
+# Leaf code / description columns of each taxonomy in the hierarchy index
+LEAF_COLUMNS = {
+    "nic": ("subclass_code", "subclass_description"),
+    "npcms": ("product_code", "product_description"),
+    "hsn": ("national_code", "national_description"),
+}
+
+class TypeaheadIndex:
+    def __init__(self, entries, aliases=(), popularity=None):
+        popularity = popularity or {}
+        entries = [(str(code), desc or "") for code, desc in entries]
+        ranked = sorted(entries, key=lambda e: (-popularity.get(e[0], 0), len(e[1]), e[0]))
+        self.codes = [code for code, _ in ranked]
+        self.descs = [desc for _, desc in ranked]
+
+        doc_tokens = [set(WORD_RE.findall(desc.lower())) for desc in self.descs]
+        code_ids = {}
+        for i, code in enumerate(self.codes):
+            code_ids.setdefault(code, i)
+        # Synonyms complete to the entries they stand for
+        for alias, codes in aliases:
+            alias_tokens = WORD_RE.findall((alias or "").lower())
+            for code in map(str, codes):
+                if code in code_ids:
+                    doc_tokens[code_ids[code]].update(alias_tokens)
+        self.doc_tokens = [tuple(tokens) for tokens in doc_tokens]
+
+        postings = {}
+        for i, tokens in enumerate(self.doc_tokens):
+            for token in tokens:
+                postings.setdefault(token, []).append(i)
+        self.keys = sorted(postings)
+        self.postings = [postings[k] for k in self.keys]  # ids ascending = popularity order
+
+        by_code = sorted(code_ids.items())
+        self.code_keys = [code for code, _ in by_code]
+        self.code_postings = [i for _, i in by_code]
+
+    def _prefix_range(self, keys, prefix):
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + "\uffff")
+        return lo, hi
+
+    def _complete_code(self, prefix, limit):
+        lo, hi = self._prefix_range(self.code_keys, prefix)
+        return sorted(self.code_postings[lo:min(hi, lo + TYPEAHEAD_MAX_SCAN)])[:limit]
+
+    def _complete_text(self, tokens, limit):
+        *leading, last = tokens
+        lo, hi = self._prefix_range(self.keys, last)
+        streams = self.postings[lo:min(hi, lo + TYPEAHEAD_MAX_KEYS)]
+        found, seen, scanned = [], set(), 0
+        for i in heapq.merge(*streams):
+            scanned += 1
+            if scanned > TYPEAHEAD_MAX_SCAN:
+                break
+            if i in seen:
+                continue
+            seen.add(i)
+            # Earlier words must each prefix some token of the entry
+            if all(any(t.startswith(w) for t in self.doc_tokens[i]) for w in leading):
+                found.append(i)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def complete(self, text, limit=10):
+        text = text.strip().lower()
+        if not text:
+            return []
+        if CODE_RE.match(text):
+            ids = self._complete_code(text, limit)
+        else:
+            tokens = WORD_RE.findall(text)
+            ids = self._complete_text(tokens, limit) if tokens else []
+        return [{"code": self.codes[i], "description": self.descs[i]} for i in ids]
+
+# ========================================
+# Builders
+# ========================================
+def code_popularity(log_files=WARMUP_LOG_FILES):
+    """How often each code appeared in logged search results."""
+    counts = Counter()
+    for path in log_files:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                for r in entry.get("results", []) if isinstance(entry, dict) else []:
+                    code = r.get("product_code") or r.get("code") or r.get("nco_2015")
+                    if code:
+                        counts[str(code)] += 1
+    return counts
+
+def build_typeahead(taxonomy, popularity=None):
+    hierarchy = get_hierarchy(taxonomy)
+    aliases = []
+    if taxonomy == "nco":
+        entries = [(r["nco_2015"], r["nco_description"] or "")
+                   for rows in hierarchy.codes_by_family.values() for r in rows]
+    else:
+        code_col, desc_col = LEAF_COLUMNS[taxonomy]
+        entries = [(row[code_col], row[desc_col] or "") for row in hierarchy.paths.values()]
+
+    if taxonomy == "nic":
+        from nic_search_pipeline import synonym_dict
+        # A word completes to the subclasses described by any of its synonyms
+        by_token = {}
+        for code, desc in entries:
+            for token in set(WORD_RE.findall(desc.lower())):
+                by_token.setdefault(token, []).append(code)
+        for word, synonyms in synonym_dict.items():
+            codes = {c for syn in synonyms for c in by_token.get(syn, [])}
+            if codes:
+                aliases.append((word, codes))
+    elif taxonomy == "npcms":
+        from npcms_search_pipeline import cpm_synonym
+        aliases = list(cpm_synonym.items())
+
+    return TypeaheadIndex(entries, aliases, popularity if popularity is not None else code_popularity())
+
+_lock = threading.Lock()
+_indexes = {}
+
+def get_typeahead(taxonomy):
+    index = _indexes.get(taxonomy)
+    if index is None:
+        with _lock:
+            index = _indexes.get(taxonomy)
+            if index is None:
+                index = _indexes[taxonomy] = build_typeahead(taxonomy)
+    return index
+
+def reload_loaded_typeaheads():
+    for taxonomy in list(_indexes):
+        fresh = build_typeahead(taxonomy)
+        with _lock:
+            _indexes[taxonomy] = fresh
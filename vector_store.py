@@ -0,0 +1,45 @@
+# ========================================
+# 📥 FAISS Index + Embedding Store
+# ========================================
+# Vector search over the active artifact bundle of each taxonomy (see
+# artifacts.py). When MODEL_SERVER_SOCKET is set the searches are answered by
+# the shared model server instead, and this process never loads the indexes
+# at all; the bundle version travels with the request so the server answers
+# from the same rows the worker maps the ids back to.
+#
+# Indexes and .npy embedding matrices are opened memory-mapped by default, so
+# every worker on a host shares one page-cache copy instead of a private heap
+# copy, and startup no longer reads whole files.
+#
+# Taxonomies listed in VECTOR_HIERARCHICAL (hsn, npcms) are searched coarse to
+# fine instead (hierarchical_search.py): same (D, I), fewer leaves compared.
+
+from config import MODEL_SERVER_SOCKET, VECTOR_HIERARCHICAL
+from artifacts import current_bundle, get_bundle
+
+def get_index(name):
+    return current_bundle(name).index
+
+def embedding_norms(name):
+    return current_bundle(name).norms
+
+def cosine_scores(name, query_vec):
+    """Cosine similarity of one query vector against every row of the taxonomy's embeddings."""
+    return current_bundle(name).cosine_scores(query_vec)
+
+def search_local(name, query_vectors, k, version=None):
+    bundle = get_bundle(name, version) if version else current_bundle(name)
+    if name in VECTOR_HIERARCHICAL:
+        from hierarchical_search import hierarchical_search
+        return hierarchical_search(bundle, query_vectors, k)
+    return bundle.search(query_vectors, k)
+
+def search(name, query_vectors, k, version=None):
+    """(D, I) for a float32 matrix of query vectors against the named index.
+
+    Pass the version of the bundle whose rows the ids are looked up in.
+    """
+    if MODEL_SERVER_SOCKET:
+        from model_server import get_client
+        return get_client().search(name, query_vectors, k, version)
+    return search_local(name, query_vectors, k, version)
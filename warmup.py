@@ -0,0 +1,145 @@
+# ========================================
+# 🔥 Startup Warm-up
+# ========================================
+# Runs once per process on a background thread after a deploy:
+#   1. dummy forward passes so torch finishes its lazy initialization
+#   2. opens the FAISS indexes / embedding matrices and the in-memory
+#      hierarchy, typeahead, code and crosswalk indexes
+#   3. mines the most frequent recent queries from the pipeline query logs
+#      (plus WARMUP_QUERY_FILE if given), encodes them into the encoder cache
+#      and runs them against the vector indexes so their pages are resident
+# Progress is reported through warmup_status(), which backs /ready; the
+# worker's memory footprint is logged once it is done.
+
+import os
+import json
+import time
+import threading
+from collections import Counter, deque
+import numpy as np
+from memory_report import log_memory_summary
+from admission import priority
+from config import (WARMUP_ENABLED, WARMUP_LOG_FILES, WARMUP_QUERY_FILE, WARMUP_LOG_TAIL,
+                    WARMUP_TOP_QUERIES, ENCODER_MAX_BATCH)
+
+_status = {"state": "pending", "step": None, "queries_total": 0, "queries_done": 0,
+           "started_at": None, "finished_at": None, "error": None}
+_status_lock = threading.Lock()
+
+def _update(**fields):
+    with _status_lock:
+        _status.update(fields)
+
+def warmup_status():
+    with _status_lock:
+        return dict(_status)
+
+def is_ready():
+    return not WARMUP_ENABLED or warmup_status()["state"] in {"ready", "failed"}
+
+# ========================================
+# Query mining
+# ========================================
+def read_queries(path, tail=None):
+    """Queries from a JSONL log ({"query": ...}) or a plain one-query-per-line file."""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        lines = deque(f, maxlen=tail) if tail else list(f)
+    queries = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            entry = line
+        if isinstance(entry, dict):
+            # Log entry: its query, if it has one
+            if isinstance(entry.get("query"), str):
+                queries.append(entry["query"])
+        elif isinstance(entry, str):
+            queries.append(entry)  # plain line, or a quoted one ("steel pipes")
+        else:
+            queries.append(line)  # plain line that happens to parse as JSON (a code: 8471)
+    return [q.strip() for q in queries if q.strip()]
+
+def mine_top_queries(log_files=WARMUP_LOG_FILES, query_file=WARMUP_QUERY_FILE, top=WARMUP_TOP_QUERIES):
+    counts = Counter()
+    for path in log_files:
+        counts.update(read_queries(path, tail=WARMUP_LOG_TAIL))
+    # Supplied queries count once each, on top of any logged occurrences
+    counts.update(set(read_queries(query_file)))
+    return [q for q, _ in counts.most_common(top)]
+
+# ========================================
+# Warm-up stages
+# ========================================
+def _warm_model():
+    from encoder_service import encode_many_local, encode_many
+    from config import MODEL_SERVER_SOCKET
+    # Dummy passes at batch size 1 and full batch size, bypassing the cache
+    for size in (1, ENCODER_MAX_BATCH):
+        texts = [f"warmup sentence {i}" for i in range(size)]
+        if MODEL_SERVER_SOCKET:
+            encode_many(texts)
+        else:
+            encode_many_local(texts)
+
+def _warm_indexes():
+    import vector_store
+    from hierarchy_index import get_hierarchy
+    from crosswalk_index import get_crosswalk
+    from typeahead import get_typeahead
+    from code_index import get_code_index
+
+    vector_store.embedding_norms("nic")  # also loads + validates the NIC bundle
+    for taxonomy in ("nic", "nco", "npcms", "hsn"):
+        get_hierarchy(taxonomy)
+        get_typeahead(taxonomy)
+        get_code_index(taxonomy)
+    get_crosswalk()
+
+def _warm_queries(queries):
+    import vector_store
+    from artifacts import INDEX_NAMES
+    from encoder_service import encode_many
+    from search_all_api import shared_encode_texts
+
+    _update(queries_total=len(queries), queries_done=0)
+    for start in range(0, len(queries), ENCODER_MAX_BATCH):
+        chunk = queries[start:start + ENCODER_MAX_BATCH]
+        texts = list(dict.fromkeys(t for q in chunk for t in shared_encode_texts(q)))
+        vectors = np.asarray(encode_many(texts), dtype="float32")
+        for name in INDEX_NAMES:
+            vector_store.search(name, vectors, 25)
+        _update(queries_done=min(len(queries), start + len(chunk)))
+
+def run_warmup():
+    _update(state="running", started_at=time.time())
+    try:
+        # Lowest admission priority: live searches arriving meanwhile encode first
+        with priority("background"):
+            _update(step="model")
+            _warm_model()
+            _update(step="indexes")
+            _warm_indexes()
+            _update(step="queries")
+            _warm_queries(mine_top_queries())
+        _update(state="ready", step=None, finished_at=time.time())
+    except Exception as exc:
+        # A failed warm-up only means a colder start; the worker still serves
+        _update(state="failed", error=repr(exc), finished_at=time.time())
+        print(f"⚠️ Warm-up failed: {exc!r}")
+    status = warmup_status()
+    print(f"🔥 Warm-up {status['state']}: {status['queries_done']}/{status['queries_total']} queries "
+          f"in {status['finished_at'] - status['started_at']:.1f}s")
+    log_memory_summary()
+
+def start_warmup():
+    if not WARMUP_ENABLED:
+        return None
+    thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread